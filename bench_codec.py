@@ -0,0 +1,72 @@
+import json
+import time
+import uuid
+from datetime import datetime
+import codec
+
+# compara o caminho antigo (dict + json.dumps + uuid4 + isoformat) com o codec central
+# uso: python bench_codec.py
+
+ROUNDS = 200_000
+
+def oldPing():
+    packet = {"type": "PING", "msg_id": str(uuid.uuid4()), "timestamp": time.time(), "ttl": 1}
+    return (json.dumps(packet) + '\n').encode('UTF-8')
+
+def newPing():
+    return codec.encodePing(codec.newPingId(), time.time())
+
+def oldAck(msg_id):
+    packet = {"type": "ACK", "msg_id": msg_id, "timestamp": datetime.now().isoformat(), "ttl": 1}
+    return (json.dumps(packet) + '\n').encode('UTF-8')
+
+def newAck(msg_id):
+    return codec.encodeAck(msg_id)
+
+def oldSend():
+    payload = {
+        "type": "SEND", "msg_id": str(uuid.uuid4()), "src": "alice@UnB", "dst": "bob@UnB",
+        "payload": "Olá! Mensagem de teste para o benchmark.", "require_ack": True, "ttl": 1
+    }
+    return (json.dumps(payload) + '\n').encode('UTF-8')
+
+def newSend():
+    payload = {
+        "type": "SEND", "msg_id": codec.newMsgId(), "src": "alice@UnB", "dst": "bob@UnB",
+        "payload": "Olá! Mensagem de teste para o benchmark.", "require_ack": True, "ttl": 1
+    }
+    return codec.encode(payload)
+
+def oldDecode(line):
+    return json.loads(line.decode('UTF-8').strip())
+
+def newDecode(line):
+    return codec.decode(line)
+
+def timeIt(func, *args):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(*args)
+    return (time.perf_counter() - start) / ROUNDS * 1e9
+
+def main():
+    msg_id = str(uuid.uuid4())
+    line = oldSend()
+
+    cases = [
+        ("PING (encode)", oldPing, newPing, ()),
+        ("ACK (encode)", oldAck, newAck, (msg_id,)),
+        ("SEND (encode)", oldSend, newSend, ()),
+        ("SEND (decode)", oldDecode, newDecode, (line,)),
+    ]
+
+    print(f"backend JSON: {codec.BACKEND} | {ROUNDS} iterações por caso")
+    print(f"{'CASO':<16} | {'ANTIGO (ns)':>12} | {'CODEC (ns)':>12} | {'GANHO':>7}")
+    print("-" * 57)
+    for name, old, new, args in cases:
+        old_ns = timeIt(old, *args)
+        new_ns = timeIt(new, *args)
+        print(f"{name:<16} | {old_ns:>12.0f} | {new_ns:>12.0f} | {old_ns / new_ns:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
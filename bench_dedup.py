@@ -0,0 +1,71 @@
+import sys
+import time
+import tracemalloc
+import codec
+from dedup import DedupCache
+
+# memória e custo por consulta do cache de duplicatas com milhões de msg_ids, comparado com um
+# conjunto simples de tuplas (src, msg_id) sem limite
+# uso: python bench_dedup.py [milhões de ids] [capacidade do cache limitado]
+
+class TupleSet:
+    def __init__(self):
+        self.seen_ids = set()
+
+    def seen(self, src, msg_id):
+        key = (src, msg_id)
+        if key in self.seen_ids:
+            return True
+        self.seen_ids.add(key)
+        return False
+
+def buildIds(count):
+    # ids de alguns remetentes, como chegariam de vários peers
+    srcs = [f"peer{i}@UnB" for i in range(64)]
+    return [(srcs[i % 64], codec.newMsgId()) for i in range(count)]
+
+def measure(make_cache, ids):
+    # memória medida em uma passada separada: o tracemalloc deixa as inserções bem mais lentas
+    tracemalloc.start()
+    cache = make_cache()
+    for src, msg_id in ids:
+        cache.seen(src, msg_id)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del cache
+
+    cache = make_cache()
+    start = time.perf_counter()
+    for src, msg_id in ids:
+        cache.seen(src, msg_id)
+    insert = (time.perf_counter() - start) / len(ids)
+
+    # duplicatas das mensagens mais recentes (ainda lembradas também pelo cache limitado)
+    recent = ids[-min(len(ids), 100_000):]
+    start = time.perf_counter()
+    hits = sum(1 for src, msg_id in recent if cache.seen(src, msg_id))
+    lookup = (time.perf_counter() - start) / len(recent)
+    return memory, insert, lookup, hits / len(recent)
+
+def main():
+    millions = [float(sys.argv[1])] if len(sys.argv) > 1 else [1, 2, 4]
+    capacity = int(sys.argv[2]) if len(sys.argv) > 2 else 131072
+
+    print(f"{'IDS':>9} | {'ESTRUTURA':<24} | {'MEMÓRIA (MB)':>12} | {'B/ID':>6} | {'INSERÇÃO (ns)':>13} | {'DUPLICATA (ns)':>14} | {'ACERTOS':>7}")
+    print("-" * 104)
+    for m in millions:
+        ids = buildIds(int(m * 1_000_000))
+        cases = (
+            ("tuplas (sem limite)", TupleSet),
+            ("DedupCache (sem limite)", lambda: DedupCache(capacity=len(ids), window=3600)),
+            (f"DedupCache ({capacity})", lambda: DedupCache(capacity=capacity, window=3600)),
+        )
+        for name, make_cache in cases:
+            memory, insert, lookup, hit_rate = measure(make_cache, ids)
+            print(
+                f"{len(ids):>9} | {name:<24} | {memory / 2**20:>12.1f} | {memory / len(ids):>6.1f} | "
+                f"{insert * 1e9:>13.0f} | {lookup * 1e9:>14.0f} | {hit_rate:>7.1%}"
+            )
+
+if __name__ == "__main__":
+    main()
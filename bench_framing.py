@@ -0,0 +1,75 @@
+import asyncio
+import sys
+import time
+import codec
+from peer_protocol import PeerProtocol
+
+# compara o framing JSON por linha com o framing binário (tamanho + cabeçalho + payload cru)
+# enviando frames SEND por um socket local e decodificando do outro lado
+# uso: python bench_framing.py [quantidade de mensagens] [tamanho do payload]
+
+def buildFrames(count, payload_size, binary):
+    text = ("Olá, mensagem de teste com \"aspas\" e acentuação! " * (payload_size // 50 + 1))[:payload_size]
+    return [
+        codec.encode({
+            "type": "SEND", "msg_id": codec.newMsgId(), "src": "alice@UnB", "dst": "bob@UnB",
+            "payload": text, "require_ack": True, "ttl": 1
+        }, binary)
+        for _ in range(count)
+    ]
+
+async def runCase(count, payload_size, binary):
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    # recebe pelo mesmo caminho do cliente: PeerProtocol.data_received -> FrameBuffer -> handler por frame
+    def onConnect(conn):
+        received = 0
+
+        def handler(msg):
+            nonlocal received
+            received += 1
+            if received == count and not done.done():
+                done.set_result(received)
+
+        def onClose():
+            if not done.done():
+                done.set_result(received)
+
+        conn.start("bench", handler, onClose, binary)
+
+    server = await loop.create_server(lambda: PeerProtocol(onConnect), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+    # o tempo inclui a codificação dos frames, a escrita no socket e a leitura + decodificação
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    frames = buildFrames(count, payload_size, binary)
+    for i in range(0, count, 256):
+        writer.writelines(frames[i:i + 256])
+        await writer.drain()
+    received = await done
+
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return received, wall, cpu, sum(len(frame) for frame in frames)
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    payload_size = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    print(f"backend JSON: {codec.BACKEND} | {count} mensagens SEND | payload de {payload_size} caracteres")
+    print(f"{'FRAMING':<10} | {'MSGS/S':>10} | {'CPU/MSG (us)':>13} | {'BYTES/MSG':>10}")
+    print("-" * 53)
+    for name, binary in (("json", False), ("binário", True)):
+        received, wall, cpu, total_bytes = await runCase(count, payload_size, binary)
+        print(f"{name:<10} | {received / wall:>10.0f} | {cpu / received * 1e6:>13.2f} | {total_bytes / received:>10.0f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
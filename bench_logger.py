@@ -0,0 +1,65 @@
+import logging
+import os
+import sys
+import tempfile
+import time
+import logger
+
+# mede o custo de cada chamada de log vista pelo código que loga (a latência que entra nos laços do event loop):
+# console + um FileHandler por nível (layout antigo) contra o handler único do logger.py, que formata uma vez
+# uso: python bench_logger.py [quantidade de chamadas]
+
+def syncLogger(directory):
+    # o layout antigo: console + um FileHandler por nível, com filtros, tudo na thread que loga
+    sync = logging.getLogger("bench-sync")
+    sync.setLevel(logging.DEBUG)
+    sync.propagate = False
+    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    console = logging.StreamHandler(open(os.devnull, "w"))
+    console.setFormatter(formatter)
+    sync.addHandler(console)
+    for level in ("INFO", "ERROR", "DEBUG", "WARNING"):
+        handler = logging.FileHandler(os.path.join(directory, f"{level}.log"), encoding="utf-8")
+        handler.setLevel(getattr(logging, level))
+        handler.addFilter(lambda record, lvl=level: record.levelname == lvl)
+        handler.setFormatter(formatter)
+        sync.addHandler(handler)
+    return sync
+
+def latencies(func, count):
+    samples = []
+    for i in range(count):
+        start = time.perf_counter_ns()
+        func(i)
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    return samples
+
+def report(name, samples):
+    def pick(p):
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] / 1000
+    print(f"{name:<34} | {pick(50):>8.2f} | {pick(99):>8.2f} | {pick(99.9):>9.2f} | {samples[-1] / 1000:>9.1f}")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    directory = tempfile.mkdtemp()
+    os.chdir(directory)
+
+    # o console do logger.py vai para o stderr; aqui ele vai para /dev/null
+    sys.stderr = open(os.devnull, "w")
+    logger.setupLogger()
+    sync = syncLogger(directory)
+    peer_id, rtt_ms = "alice@UnB", 12.345
+
+    print(f"{count} chamadas | latência por chamada em microssegundos", file=sys.stdout)
+    print(f"{'CASO':<34} | {'P50':>8} | {'P99':>8} | {'P99.9':>9} | {'MÁX':>9}")
+    print("-" * 80)
+    report("antigo: 5 handlers (info)", latencies(lambda i: sync.info(f"Mensagem {i} enviada para {peer_id}"), count))
+    report("handler único (info)", latencies(lambda i: logger.loggerInfo("Mensagem %d enviada para %s", i, peer_id), count))
+    report("debug desligado, f-string", latencies(lambda i: logger.loggerDebug(f"RTT atualizado para {peer_id}: {rtt_ms:.2f}ms"), count))
+    report("debug desligado, argumentos", latencies(lambda i: logger.loggerDebug("RTT atualizado para %s: %.2fms", peer_id, rtt_ms), count))
+    logger.stopLogger()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+import argparse
+import asyncio
+import contextlib
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import codec
+from client import Client
+from config import loadConfig, getConfig
+from dedup import DedupCache
+from keep_alive import KeepAliveScheduler
+from message_router import pubMessage
+from metrics import registry, FRAMES_OUT, BYTES_OUT, HANDSHAKE_SECONDS
+from p2p_client import registerPeer, discoverPeers, closeSession
+from peer_connection import acceptPeer, connectPeers, MESSAGE_HANDLERS
+from peer_list import updatePeerList
+from reliable_send import ReliableSender
+from rendezvous_server import RendezvousServer
+from state import percentile
+
+# benchmark da malha P2P em 127.0.0.1: sobe N peers (em um processo ou divididos entre vários) que usam o
+# caminho real de conexão (sendHello / handle_incoming_connection / listenToPeer) e o Rendezvous local,
+# e mede formação da malha, handshake, vazão de SEND/ACK, latência do fan-out de PUB e custo do PING/PONG.
+# o resultado sai em JSON para comparar entre commits
+# uso: python bench_mesh.py [--peers N] [--procs K] [--output resultado.json] (ver --help)
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da malha P2P em localhost")
+    parser.add_argument("--peers", type=int, default=16, help="quantidade de peers (padrão: 16)")
+    parser.add_argument("--procs", type=int, default=1, help="processos entre os quais os peers são divididos (padrão: 1)")
+    parser.add_argument("--namespaces", type=int, default=2, help="quantidade de namespaces (padrão: 2)")
+    parser.add_argument("--messages", type=int, default=5000, help="SENDs no teste de vazão (padrão: 5000)")
+    parser.add_argument("--pubs", type=int, default=50, help="PUBs por destino no teste de fan-out (padrão: 50)")
+    parser.add_argument("--payload", type=int, default=100, help="tamanho do payload em caracteres (padrão: 100)")
+    parser.add_argument("--ping-interval", type=float, default=0.05, help="intervalo de PING no teste de keep-alive (padrão: 0.05s)")
+    parser.add_argument("--ping-duration", type=float, default=3.0, help="duração do teste de keep-alive (padrão: 3s)")
+    parser.add_argument("--features", default="ack,binary,zlib,ackbatch", help="features anunciadas pelos peers")
+    parser.add_argument("--output", default=None, help="arquivo JSON de saída (padrão: só imprime)")
+    parser.add_argument("--worker", type=int, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def summarize(values, scale=1000.0):
+    # resumo em ms (por padrão) de uma lista de durações em segundos
+    values = sorted(v * scale for v in values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1],
+    }
+
+def framesOut(msg_types):
+    frames = sum(v for (t, _), v in registry.counters.get(FRAMES_OUT, {}).items() if t in msg_types)
+    sent_bytes = sum(v for (t, _), v in registry.counters.get(BYTES_OUT, {}).items() if t in msg_types)
+    return frames, sent_bytes
+
+# ---- peers de um processo ----
+
+class BenchWorker:
+    def __init__(self, index, options):
+        self.index = index
+        self.options = options
+        self.clients = {}
+        self.servers = []
+        self.tasks = []
+        self.received = []
+        self.config_path = None
+
+    def peerIds(self):
+        options = self.options
+        return [f"p{i:04d}@ns{i % options.namespaces}" for i in range(self.index, options.peers, options.procs)]
+
+    async def start(self, rendezvous_port):
+        options = self.options
+        fd, self.config_path = tempfile.mkstemp(suffix=".json", prefix="bench_mesh_")
+        with os.fdopen(fd, "w") as file:
+            json.dump({
+                "name": "bench", "port": 1024, "namespace": "bench",
+                "server_address": "127.0.0.1", "server_port": rendezvous_port,
+                # o keep-alive fica praticamente desligado fora do teste de PING
+                "ping_timer": 3600, "timeout_timer": 3600,
+                "features": [f for f in options.features.split(",") if f],
+                "max_concurrent_connections": 64,
+            }, file)
+        loadConfig(self.config_path)
+
+        # registra a chegada de cada PUB antes do handler real
+        original = MESSAGE_HANDLERS["PUB"]
+
+        def recordPub(client, peer_id, outq, msg):
+            self.received.append((msg.get("dst"), msg.get("payload"), time.time()))
+            return original(client, peer_id, outq, msg)
+
+        MESSAGE_HANDLERS["PUB"] = recordPub
+
+        loop = asyncio.get_running_loop()
+        for peer_id in self.peerIds():
+            name, namespace = peer_id.split("@")
+            # a porta efêmera só é conhecida depois que o servidor abre
+            client = Client(name, 0, namespace)
+            server = await loop.create_server(functools.partial(acceptPeer, client), "127.0.0.1", 0)
+            client.port = server.sockets[0].getsockname()[1]
+            client.keepalive = KeepAliveScheduler(client)
+            client.sender = ReliableSender(client)
+            client.dedup = DedupCache()
+            self.clients[peer_id] = client
+            self.servers.append(server)
+            self.tasks.append(asyncio.create_task(client.keepalive.run()))
+
+            if not await registerPeer(name, namespace, client.port):
+                raise RuntimeError(f"Falha ao registrar {peer_id} no Rendezvous local")
+
+        return {"peers": list(self.clients)}
+
+    async def mesh(self, timeout=60.0):
+        # uma rodada do clientLoop por peer (DISCOVER + deltas + conexões), todas ao mesmo tempo
+        start = time.perf_counter()
+
+        async def discoverAndConnect(client):
+            peers = await discoverPeers([])
+            added, changed, _ = await updatePeerList(client, peers or [])
+            targets = [p for p in added + changed if p in client.peersConnected and client.peersConnected[p].status != "CONNECTED"]
+            for peer in targets:
+                client.peersConnected[peer].status = "WAITING"
+            await connectPeers(client, targets)
+
+        await asyncio.gather(*(discoverAndConnect(client) for client in self.clients.values()))
+
+        # as conexões recebidas de outros peers (e de outros processos) completam a malha
+        expected = self.options.peers - 1
+        while time.perf_counter() - start < timeout:
+            if all(len(c.peersConnected.by_status["CONNECTED"]) >= expected for c in self.clients.values()):
+                break
+            await asyncio.sleep(0.005)
+
+        connected = [len(c.peersConnected.by_status["CONNECTED"]) for c in self.clients.values()]
+        sockets = sum(len(c.inbound) + len(c.outbound) for c in self.clients.values())
+        return {"seconds": time.perf_counter() - start, "complete": min(connected) >= expected, "connections": sockets}
+
+    def handshakes(self):
+        result = {}
+        for (direction,), histogram in registry.histograms.get(HANDSHAKE_SECONDS, {}).items():
+            result[direction] = {"count": histogram.count, "sum": histogram.sum}
+        return result
+
+    async def send(self, sender_id, target_id, count, payload):
+        sender = self.clients[sender_id].sender
+        text = "x" * payload
+        latencies = []
+
+        def record(start):
+            return lambda future: latencies.append(time.perf_counter() - start)
+
+        frames_before = framesOut(("SEND",))
+        start = time.perf_counter()
+        futures = [sender.send(target_id, text, record(time.perf_counter())) for _ in range(count)]
+        results = await asyncio.gather(*futures)
+        elapsed = time.perf_counter() - start
+        frames_after = framesOut(("SEND",))
+
+        return {
+            "seconds": elapsed, "acked": sum(results), "sent_frames": frames_after[0] - frames_before[0],
+            "latency": latencies,
+        }
+
+    def resetReceived(self):
+        self.received = []
+        return {}
+
+    async def pub(self, sender_id, destination, count, payload):
+        client = self.clients[sender_id]
+        filler = "x" * payload
+        sent_at = []
+        for i in range(count):
+            sent_at.append(time.time())
+            await pubMessage(destination, f"{i} {filler}", client)
+        return {"sent_at": sent_at}
+
+    def collect(self):
+        return {"received": [(dst, int(text.split(" ", 1)[0]), at) for dst, text, at in self.received]}
+
+    async def ping(self, interval, duration):
+        # mede a CPU do processo em repouso e depois com PING a cada 'interval' segundos em todas as conexões
+        configs = getConfig()
+        cpu_start = time.process_time()
+        await asyncio.sleep(duration)
+        idle_cpu = time.process_time() - cpu_start
+
+        frames_before, bytes_before = framesOut(("PING", "PONG"))
+        configs.ping_timer = interval
+        for client in self.clients.values():
+            for record in client.peersConnected.select(status="CONNECTED"):
+                client.keepalive.track(record.peer_id)
+
+        cpu_start = time.process_time()
+        await asyncio.sleep(duration)
+        ping_cpu = time.process_time() - cpu_start
+        configs.ping_timer = 3600
+
+        frames_after, bytes_after = framesOut(("PING", "PONG"))
+        srtts = [stats.srtt for client in self.clients.values() for stats in client.rtt_table.values() if stats.count]
+        return {
+            "idle_cpu": idle_cpu, "ping_cpu": ping_cpu,
+            "frames": frames_after - frames_before, "bytes": bytes_after - bytes_before,
+            "srtt_ms": srtts,
+        }
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        for client in self.clients.values():
+            for record in client.peersConnected.values():
+                if record.outq is not None:
+                    record.outq.close()
+        for server in self.servers:
+            server.close()
+        await closeSession()
+        if self.config_path:
+            os.unlink(self.config_path)
+        return {}
+
+    async def call(self, command, args):
+        handler = getattr(self, command)
+        result = handler(**args)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+class RemoteWorker:
+    # peers em outro processo: este mesmo script com --worker, comandado por linhas JSON no stdin / stdout
+    def __init__(self, index, options, argv):
+        self.index = index
+        self.argv = argv + ["--worker", str(index)]
+        self.process = None
+
+    async def launch(self):
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), *self.argv,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, limit=64 * 1024 * 1024
+        )
+
+    async def call(self, command, args):
+        self.process.stdin.write((json.dumps({"cmd": command, "args": args}) + "\n").encode())
+        await self.process.stdin.drain()
+        line = await self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Worker {self.index} encerrou inesperadamente")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError(f"Worker {self.index}: {reply['error']}")
+        return reply["result"]
+
+    async def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            await self.process.wait()
+
+async def workerMain(options):
+    # laço do processo worker: o stdout original é o canal de respostas (os prints dos handlers são descartados)
+    protocol_out = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    worker = BenchWorker(options.worker, options)
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        request = json.loads(line)
+        try:
+            reply = {"result": await worker.call(request["cmd"], request.get("args", {}))}
+        except Exception as e:
+            reply = {"error": repr(e)}
+        protocol_out.write(json.dumps(reply) + "\n")
+        protocol_out.flush()
+
+async def callAll(workers, command, args=None):
+    return await asyncio.gather(*(worker.call(command, args or {}) for worker in workers))
+
+async def runBenchmark(options, argv):
+    rendezvous = RendezvousServer()
+    await rendezvous.start("127.0.0.1", 0)
+    rendezvous_port = rendezvous.address()[1]
+    options.procs = max(1, min(options.procs, options.peers))
+
+    if options.procs == 1:
+        workers = [BenchWorker(0, options)]
+    else:
+        workers = [RemoteWorker(i, options, argv) for i in range(options.procs)]
+        await asyncio.gather(*(worker.launch() for worker in workers))
+
+    results = {}
+    try:
+        started = await callAll(workers, "start", {"rendezvous_port": rendezvous_port})
+        owner = {peer_id: worker for worker, reply in zip(workers, started) for peer_id in reply["peers"]}
+        peer_ids = sorted(owner)
+        sender_id, target_id = peer_ids[0], peer_ids[1]
+
+        # formação da malha: do início das rodadas de conexão até todos os peers verem os outros N-1
+        start = time.perf_counter()
+        meshes = await callAll(workers, "mesh")
+        results["mesh"] = {
+            "seconds": time.perf_counter() - start,
+            "complete": all(m["complete"] for m in meshes),
+            # com o desempate de conexões duplicadas, cada par fica com um socket (2 pontas)
+            "connection_ends": sum(m["connections"] for m in meshes),
+            "expected_connection_ends": options.peers * (options.peers - 1),
+        }
+
+        handshakes = {}
+        for reply in await callAll(workers, "handshakes"):
+            for direction, h in reply.items():
+                total = handshakes.setdefault(direction, {"count": 0, "sum": 0.0})
+                total["count"] += h["count"]
+                total["sum"] += h["sum"]
+        results["handshake_ms"] = {
+            direction: {"count": h["count"], "mean": h["sum"] / h["count"] * 1000 if h["count"] else 0.0}
+            for direction, h in handshakes.items()
+        }
+
+        reply = await owner[sender_id].call("send", {
+            "sender_id": sender_id, "target_id": target_id, "count": options.messages, "payload": options.payload
+        })
+        results["send_ack"] = {
+            "messages": options.messages, "acked": reply["acked"], "seconds": reply["seconds"],
+            "msgs_per_s": options.messages / reply["seconds"], "sent_frames": reply["sent_frames"],
+            "latency_ms": summarize(reply["latency"]),
+        }
+
+        results["pub"] = {}
+        sender_ns = sender_id.split("@")[1]
+        for destination in ("*", f"#{sender_ns}"):
+            await callAll(workers, "resetReceived")
+            sent = await owner[sender_id].call("pub", {
+                "sender_id": sender_id, "destination": destination, "count": options.pubs, "payload": options.payload
+            })
+            await asyncio.sleep(0.5)
+            received = [r for reply in await callAll(workers, "collect") for r in reply["received"]]
+
+            expected = len(peer_ids) - 1 if destination == "*" else sum(1 for p in peer_ids if p.endswith("@" + sender_ns)) - 1
+            deliveries = []
+            per_pub = {}
+            for _, index, at in received:
+                latency = at - sent["sent_at"][index]
+                deliveries.append(latency)
+                per_pub[index] = max(per_pub.get(index, 0.0), latency)
+            fanout = list(per_pub.values())
+
+            results["pub"][destination] = {
+                "pubs": options.pubs, "recipients": expected,
+                "delivered": len(received), "expected_deliveries": expected * options.pubs,
+                "delivery_latency_ms": summarize(deliveries),
+                "fanout_complete_ms": summarize(fanout),
+            }
+
+        pings = await callAll(workers, "ping", {"interval": options.ping_interval, "duration": options.ping_duration})
+        frames = sum(p["frames"] for p in pings)
+        extra_cpu = sum(p["ping_cpu"] - p["idle_cpu"] for p in pings)
+        srtts = [s for p in pings for s in p["srtt_ms"]]
+        results["ping_pong"] = {
+            "interval": options.ping_interval, "seconds": options.ping_duration, "frames": frames,
+            "bytes": sum(p["bytes"] for p in pings),
+            "bytes_per_frame": sum(p["bytes"] for p in pings) / frames if frames else 0.0,
+            "idle_cpu_s": sum(p["idle_cpu"] for p in pings), "ping_cpu_s": sum(p["ping_cpu"] for p in pings),
+            "cpu_us_per_frame": extra_cpu / frames * 1e6 if frames else 0.0,
+            "srtt_ms_mean": sum(srtts) / len(srtts) if srtts else 0.0,
+        }
+    finally:
+        await callAll(workers, "stop")
+        for worker in workers:
+            if isinstance(worker, RemoteWorker):
+                await worker.close()
+        await rendezvous.close()
+
+    return results
+
+def gitCommit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def printSummary(report):
+    r = report["results"]
+    print(f"\n📊 Malha de {report['params']['peers']} peers em {report['params']['procs']} processo(s) | commit {report['commit']}")
+    mesh = r["mesh"]
+    print(f"Malha formada em {mesh['seconds'] * 1000:.1f}ms ({'completa' if mesh['complete'] else 'INCOMPLETA'}, "
+          f"{mesh['connection_ends']}/{mesh['expected_connection_ends']} pontas de conexão)")
+    for direction, h in r["handshake_ms"].items():
+        print(f"Handshake {direction}: {h['count']} | média {h['mean']:.2f}ms")
+    send = r["send_ack"]
+    print(f"SEND/ACK: {send['msgs_per_s']:.0f} msgs/s ({send['acked']}/{send['messages']} confirmadas) | "
+          f"latência p50 {send['latency_ms'].get('p50', 0):.2f}ms p99 {send['latency_ms'].get('p99', 0):.2f}ms")
+    for destination, pub in r["pub"].items():
+        print(f"PUB {destination}: {pub['delivered']}/{pub['expected_deliveries']} entregas | "
+              f"entrega p50 {pub['delivery_latency_ms'].get('p50', 0):.2f}ms | "
+              f"fan-out completo p50 {pub['fanout_complete_ms'].get('p50', 0):.2f}ms p99 {pub['fanout_complete_ms'].get('p99', 0):.2f}ms")
+    ping = r["ping_pong"]
+    print(f"PING/PONG: {ping['frames']} frames | {ping['bytes_per_frame']:.0f} bytes/frame | "
+          f"{ping['cpu_us_per_frame']:.1f}us de CPU por frame | SRTT médio {ping['srtt_ms_mean']:.2f}ms")
+
+def main():
+    argv = sys.argv[1:]
+    options = parseArgs(argv)
+    if options.worker is not None:
+        asyncio.run(workerMain(options))
+        return
+
+    # os prints dos handlers (DMs, PUBs) de todos os peers são descartados durante o benchmark
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = asyncio.run(runBenchmark(options, argv))
+
+    report = {
+        "benchmark": "mesh",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": gitCommit(),
+        "python": platform.python_version(),
+        "json_backend": codec.BACKEND,
+        "params": {k: v for k, v in vars(options).items() if k not in ("output", "worker")},
+        "results": results,
+    }
+
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(report, file, indent=2)
+    printSummary(report)
+    if options.output:
+        print(f"\nResultado salvo em {options.output}")
+
+if __name__ == "__main__":
+    main()
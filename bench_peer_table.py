@@ -0,0 +1,70 @@
+import sys
+import time
+import tracemalloc
+from peer_table import PeerTable
+
+# mede memória por peer e custo de consulta da PeerTable contra o antigo dicionário de dicionários
+# uso: python bench_peer_table.py [quantidade de peers ...]
+
+NAMESPACES = 100
+
+def buildDicts(count):
+    table = {}
+    for i in range(count):
+        table[f"peer{i}@NS{i % NAMESPACES}"] = {
+            "address": "10.0.0.1",
+            "port": 7000 + i % 1000,
+            "status": "CONNECTED" if i % 2 else "WAITING",
+            "writer": None,
+            "outq": None,
+            "last_seen": 0.0
+        }
+    return table
+
+def buildTable(count):
+    table = PeerTable()
+    for i in range(count):
+        table.add(f"peer{i}@NS{i % NAMESPACES}", "10.0.0.1", 7000 + i % 1000, "CONNECTED" if i % 2 else "WAITING")
+    return table
+
+def measure(builder, count):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    table = builder(count)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return table, size
+
+def scanNamespace(table, namespace):
+    # o custo antigo: percorrer todos os peers e separar o peer_id a cada chamada
+    return [
+        peer_id for peer_id, data in table.items()
+        if peer_id.split("@")[1] == namespace and data["status"] == "CONNECTED"
+    ]
+
+def timeIt(func, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 50_000, 100_000]
+
+    print(f"{'PEERS':>8} | {'DICT B/PEER':>12} | {'TABELA B/PEER':>14} | {'SCAN #NS (us)':>14} | {'SELECT #NS (us)':>16}")
+    print("-" * 78)
+    for count in counts:
+        dicts, dict_size = measure(buildDicts, count)
+        table, table_size = measure(buildTable, count)
+
+        scan_us = timeIt(lambda: scanNamespace(dicts, "NS7"), repeat=20)
+        select_us = timeIt(lambda: table.select(namespace="NS7", status="CONNECTED"))
+
+        print(
+            f"{count:>8} | {dict_size / count:>12.1f} | {table_size / count:>14.1f} | "
+            f"{scan_us:>14.1f} | {select_us:>16.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
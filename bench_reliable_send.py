@@ -0,0 +1,82 @@
+import asyncio
+import random
+import sys
+import time
+import codec
+from client import Client
+from config import getConfig
+from outbound_queue import OutboundQueue
+from peer_protocol import PeerProtocol
+from peer_connection import handleAck
+from reliable_send import ReliableSender
+
+# vazão de SENDs confiáveis para um único peer por um socket local, variando o tamanho da janela
+# (janela 1 equivale ao envio antigo, que esperava o ACK de cada mensagem antes da próxima).
+# o receptor pode descartar uma fração dos SENDs para forçar retransmissões e responder com um ACK
+# por SEND ou com ACKs em lote (feature "ackbatch"); a coluna FRAMES ACK conta o caminho de volta
+# uso: python bench_reliable_send.py [quantidade de mensagens] [fração descartada]
+
+async def startReceiver(drop_rate, features, receivers):
+    def onConnect(conn):
+        outq = OutboundQueue(conn, "sender@bench", features=features).start()
+        receivers.append(outq)
+
+        def handler(msg):
+            if msg.get("type") != "SEND" or random.random() < drop_rate:
+                return None
+            if outq.acks is not None:
+                return outq.acks.add(msg["msg_id"])
+            outq.sendNowait(codec.encodeAck(msg["msg_id"]), msg_type="ACK")
+
+        conn.start("sender@bench", handler, outq.close)
+
+    return await asyncio.get_running_loop().create_server(lambda: PeerProtocol(on_connect=onConnect), "127.0.0.1", 0)
+
+async def runCase(count, window, drop_rate, features):
+    getConfig().send_window = window
+    receivers = []
+    server = await startReceiver(drop_rate, features, receivers)
+    port = server.sockets[0].getsockname()[1]
+
+    client = Client("sender", 0, "bench")
+    client.sender = ReliableSender(client)
+    _, conn = await asyncio.get_running_loop().create_connection(PeerProtocol, "127.0.0.1", port)
+    outq = OutboundQueue(conn, "receiver@bench", getConfig().outbound_queue_size).start()
+    record = client.peersConnected.add("receiver@bench", "127.0.0.1", port, status="CONNECTED")
+    record.outq = outq
+
+    def handler(msg):
+        handleAck(client, "receiver@bench", outq, msg)
+
+    conn.start("receiver@bench", handler, lambda: None)
+
+    start = time.perf_counter()
+    futures = [client.sender.send("receiver@bench", f"mensagem {i}") for i in range(count)]
+    results = await asyncio.gather(*futures)
+    wall = time.perf_counter() - start
+
+    ack_stats = receivers[0].snapshot()
+    outq.close()
+    server.close()
+    await server.wait_closed()
+    return sum(results), wall, ack_stats
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    drop_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+
+    print(f"{count} SENDs para um peer | {drop_rate:.1%} descartados pelo receptor | até {getConfig().max_retransmits} retransmissões")
+    print(f"{'ACKS':<8} | {'JANELA':>6} | {'MSGS/S':>10} | {'CONFIRMADAS':>11} | {'FRAMES ACK':>10} | {'ESCRITAS':>8}")
+    print("-" * 70)
+    # com ACKs em lote a janela precisa comportar um lote inteiro (ack_batch_size), senão cada
+    # janela espera o ack_delay; por isso os lotes só rodam com as janelas maiores
+    for mode, features, windows in (("um/SEND", (), (1, 8, 64, 256)), ("em lote", (codec.ACK_BATCH_FEATURE,), (64, 256))):
+        for window in windows:
+            acked, wall, ack_stats = await runCase(count, window, drop_rate, features)
+            print(
+                f"{mode:<8} | {window:>6} | {count / wall:>10.0f} | {acked:>5}/{count:<5} | "
+                f"{ack_stats['frames']:>10} | {ack_stats['flushes']:>8}"
+            )
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import socket
+import sys
+import time
+import codec
+from rendezvous_server import RendezvousRegistry
+
+# desempenho do servidor Rendezvous local: tabela em memória (REGISTER, DISCOVER e expiração com 100k
+# registros) e servidor real em outro processo (REGISTER/s com pedidos em pipeline e latência do DISCOVER)
+# uso: python bench_rendezvous.py [registros] [conexões]
+
+NAMESPACES = 100
+
+def registryBench(count):
+    registry = RendezvousRegistry()
+    now = time.monotonic()
+    start = time.perf_counter()
+    for i in range(count):
+        registry.register(f"ns{i % NAMESPACES}", f"peer{i}", 4000 + i % 60000, 60 + i % 600, "10.0.0.1", 40000 + i % 20000, now)
+    register = time.perf_counter() - start
+    print(f"REGISTER na tabela: {count / register:,.0f}/s ({count} registros)")
+
+    for label, namespace in (("global", None), ("namespace", "ns0")):
+        # segundos diferentes a cada rodada para não reaproveitar a resposta em cache
+        rounds = 20
+        start = time.perf_counter()
+        for r in range(rounds):
+            response = registry.discover(namespace, now + r + 1)
+        elapsed = (time.perf_counter() - start) / rounds
+        start = time.perf_counter()
+        for _ in range(1000):
+            registry.discover(namespace, now + rounds)
+        cached = (time.perf_counter() - start) / 1000
+        print(f"DISCOVER {label}: {elapsed * 1000:.2f}ms ({len(response) / 2**20:.1f} MB) | mesma resposta no mesmo segundo: {cached * 1e6:.1f}us")
+
+    start = time.perf_counter()
+    expired = registry.expire(now + 10_000)
+    print(f"Expiração de {expired} registros: {(time.perf_counter() - start) * 1000:.1f}ms | restantes: {len(registry)}")
+
+async def startServer():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "rendezvous_server.py"),
+        "--host", "127.0.0.1", "--port", str(port), stdout=asyncio.subprocess.DEVNULL
+    )
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return process, port
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("Servidor Rendezvous não iniciou")
+
+async def registerMany(port, first, count, pipeline=256):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=2**30)
+    done = 0
+    while done < count:
+        batch = min(pipeline, count - done)
+        writer.write(b"".join(
+            codec.encode({"type": "REGISTER", "namespace": f"ns{i % NAMESPACES}", "name": f"peer{i}", "port": 4000 + i % 60000, "ttl": 7200})
+            for i in range(first + done, first + done + batch)
+        ))
+        for _ in range(batch):
+            response = codec.decode(await reader.readline())
+            if response.get("status") != "OK":
+                raise RuntimeError(response)
+        done += batch
+    return reader, writer
+
+async def networkBench(count, connections):
+    process, port = await startServer()
+    try:
+        per_connection = count // connections
+        start = time.perf_counter()
+        streams = await asyncio.gather(*(registerMany(port, c * per_connection, per_connection) for c in range(connections)))
+        elapsed = time.perf_counter() - start
+        total = per_connection * connections
+        print(f"REGISTER pela rede: {total / elapsed:,.0f}/s ({connections} conexões, pedidos em pipeline)")
+
+        reader, writer = streams[0]
+        for label, message in (("global", {"type": "DISCOVER"}), ("namespace", {"type": "DISCOVER", "namespace": "ns0"})):
+            latencies = []
+            for _ in range(10):
+                start = time.perf_counter()
+                writer.write(codec.encode(message))
+                peers = codec.decode(await reader.readline())["peers"]
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            print(f"DISCOVER {label} pela rede: {len(peers)} peers | mediana {latencies[len(latencies) // 2] * 1000:.1f}ms | pior {latencies[-1] * 1000:.1f}ms")
+
+        for _, writer in streams:
+            writer.close()
+    finally:
+        process.terminate()
+        await process.wait()
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    print(f"Backend JSON: {codec.BACKEND}\n")
+    registryBench(count)
+    print()
+    asyncio.run(networkBench(count, connections))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+from client import Client
+from config import loadConfig
+from peer_connection import connectPeers
+from reliable_send import ReliableSender
+from rendezvous_server import RendezvousServer
+
+# vazão de um peer "hub" com --workers 1, 2, 4...: vários processos de carga abrem conexões com o hub e
+# mandam SENDs com ACK ao mesmo tempo; mede as mensagens confirmadas por segundo somando todas as conexões.
+# o ganho com mais workers depende de haver núcleos livres para eles (os processos de carga também usam CPU)
+# uso: python bench_shards.py [--workers 1,2,4] [--loaders 2] [--peers 16] [--messages 2000]
+
+HUB_ID = "hub@bench"
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do modo multiprocesso (--workers) de um hub")
+    parser.add_argument("--workers", default="1,2,4", help="quantidades de workers do hub (padrão: 1,2,4)")
+    parser.add_argument("--loaders", type=int, default=2, help="processos de carga (padrão: 2)")
+    parser.add_argument("--peers", type=int, default=16, help="conexões com o hub por processo de carga (padrão: 16)")
+    parser.add_argument("--messages", type=int, default=2000, help="SENDs por conexão (padrão: 2000)")
+    parser.add_argument("--features", default="ack,binary,ackbatch", help="features anunciadas no HELLO")
+    parser.add_argument("--loader", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--hub-port", type=int, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def writeConfig(directory, name, port, rendezvous_port, features):
+    path = os.path.join(directory, "config.json")
+    with open(path, "w") as file:
+        json.dump({
+            "name": name, "port": port, "namespace": "bench",
+            "server_address": "127.0.0.1", "server_port": rendezvous_port,
+            "ping_timer": 3600, "timeout_timer": 3600,
+            "discovery_min_interval": 60, "discovery_max_interval": 60,
+            "features": features,
+        }, file)
+    return path
+
+def freePort():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+# ---- processo de carga: --peers conexões com o hub, cada uma com a sua janela de envio ----
+
+async def loaderMain(options):
+    protocol_out = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    directory = tempfile.mkdtemp(prefix="bench_shards_")
+    loadConfig(writeConfig(directory, "loader", 1024, 1, [f for f in options.features.split(",") if f]))
+
+    clients = []
+    for i in range(options.peers):
+        client = Client(f"l{options.loader}p{i}", 0, "bench")
+        client.sender = ReliableSender(client)
+        client.peersConnected.add(HUB_ID, "127.0.0.1", options.hub_port, "WAITING")
+        clients.append(client)
+    connected = sum(await asyncio.gather(*(connectPeers(client, [HUB_ID]) for client in clients)))
+
+    # espera o sinal de largada do processo pai para todos os processos de carga começarem juntos
+    protocol_out.write(json.dumps({"ready": connected}) + "\n")
+    protocol_out.flush()
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, sys.stdin.readline)
+
+    async def blast(client):
+        futures = [client.sender.send(HUB_ID, f"msg {n}") for n in range(options.messages)]
+        return sum(await asyncio.gather(*futures))
+
+    start = time.time()
+    acked = sum(await asyncio.gather(*(blast(client) for client in clients)))
+    end = time.time()
+
+    for client in clients:
+        record = client.peersConnected.get(HUB_ID)
+        if record is not None and record.outq is not None:
+            record.outq.close()
+    protocol_out.write(json.dumps({"start": start, "end": end, "acked": acked}) + "\n")
+    protocol_out.flush()
+
+# ---- processo pai ----
+
+async def waitForSocket(path, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if time.monotonic() > deadline:
+            raise RuntimeError("O hub não abriu o socket de controle")
+        await asyncio.sleep(0.05)
+
+async def runHub(options, workers, rendezvous_port):
+    directory = tempfile.mkdtemp(prefix="bench_shards_hub_")
+    port = freePort()
+    writeConfig(directory, "hub", port, rendezvous_port, [f for f in options.features.split(",") if f])
+    control = os.path.join(directory, "hub.sock")
+    main_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+    hub = await asyncio.create_subprocess_exec(
+        sys.executable, main_script, "--daemon", "--workers", str(workers), "--control-socket", control,
+        cwd=directory, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        # o socket de controle abre depois que os workers se conectam ao processo principal
+        await waitForSocket(control)
+
+        loaders = []
+        for index in range(options.loaders):
+            loaders.append(await asyncio.create_subprocess_exec(
+                sys.executable, os.path.abspath(__file__), "--loader", str(index), "--hub-port", str(port),
+                "--peers", str(options.peers), "--messages", str(options.messages), "--features", options.features,
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE
+            ))
+
+        ready = [json.loads(await loader.stdout.readline())["ready"] for loader in loaders]
+        for loader in loaders:
+            loader.stdin.write(b"go\n")
+            await loader.stdin.drain()
+        results = [json.loads(await loader.stdout.readline()) for loader in loaders]
+        for loader in loaders:
+            loader.stdin.close()
+            await loader.wait()
+
+        elapsed = max(r["end"] for r in results) - min(r["start"] for r in results)
+        acked = sum(r["acked"] for r in results)
+        return sum(ready), acked, elapsed
+    finally:
+        # /quit pelo socket de controle encerra o hub e os seus workers
+        try:
+            reader, writer = await asyncio.open_unix_connection(control)
+            writer.write(b"/quit\n")
+            await writer.drain()
+            await asyncio.wait_for(reader.read(), timeout=10)
+            writer.close()
+        except (OSError, asyncio.TimeoutError):
+            pass
+        try:
+            await asyncio.wait_for(hub.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            hub.kill()
+
+async def runBenchmark(options):
+    rendezvous = RendezvousServer()
+    await rendezvous.start("127.0.0.1", 0)
+    total = options.loaders * options.peers * options.messages
+    print(f"{os.cpu_count()} CPU(s) | {options.loaders} processos de carga x {options.peers} conexões x {options.messages} SENDs = {total} mensagens\n")
+    print(f"{'WORKERS':>7} | {'CONEXÕES':>8} | {'CONFIRMADAS':>11} | {'TEMPO (s)':>9} | {'MSGS/S':>9} | {'GANHO':>6}")
+    print("-" * 67)
+    baseline = None
+    try:
+        for workers in [int(w) for w in options.workers.split(",")]:
+            connections, acked, elapsed = await runHub(options, workers, rendezvous.address()[1])
+            rate = acked / elapsed if elapsed > 0 else 0.0
+            baseline = baseline or rate
+            print(f"{workers:>7} | {connections:>8} | {acked:>11} | {elapsed:>9.2f} | {rate:>9.0f} | {rate / baseline:>5.2f}x")
+    finally:
+        await rendezvous.close()
+
+def main():
+    options = parseArgs()
+    if options.loader is not None:
+        asyncio.run(loaderMain(options))
+    else:
+        asyncio.run(runBenchmark(options))
+
+if __name__ == "__main__":
+    main()
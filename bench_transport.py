@@ -0,0 +1,80 @@
+import asyncio
+import sys
+import time
+import codec
+from peer_protocol import PeerProtocol
+
+# compara o laço antigo de leitura (StreamReader.readline + decode) com o transporte PeerProtocol
+# sob uma enxurrada de frames pequenos (PINGs) por um socket local
+# uso: python bench_transport.py [quantidade de frames]
+
+def buildFrames(count):
+    return [codec.encodePing(codec.newPingId(), time.time()) for _ in range(count)]
+
+async def readlineServer(count, done):
+    async def handler(reader, writer):
+        received = 0
+        while received < count:
+            line = await reader.readline()
+            if not line:
+                break
+            if len(line) <= 2 and not line.strip():
+                continue
+            msg = codec.decode(line)
+            if msg.get("type") == "PING":
+                received += 1
+        done.set_result(received)
+        writer.close()
+
+    return await asyncio.start_server(handler, "127.0.0.1", 0)
+
+async def protocolServer(count, done):
+    received = 0
+
+    def onConnect(conn):
+        def handler(msg):
+            nonlocal received
+            if msg.get("type") == "PING":
+                received += 1
+                if received == count:
+                    done.set_result(received)
+
+        conn.start("bench", handler, lambda: None)
+
+    return await asyncio.get_running_loop().create_server(lambda: PeerProtocol(on_connect=onConnect), "127.0.0.1", 0)
+
+async def runCase(make_server, frames):
+    done = asyncio.get_running_loop().create_future()
+    server = await make_server(len(frames), done)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    for i in range(0, len(frames), 256):
+        writer.writelines(frames[i:i + 256])
+        await writer.drain()
+    received = await done
+
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return received, wall, cpu
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    frames = buildFrames(count)
+
+    print(f"backend JSON: {codec.BACKEND} | {count} frames PING de {len(frames[0])} bytes")
+    print(f"{'TRANSPORTE':<16} | {'FRAMES/S':>10} | {'CPU/FRAME (us)':>15}")
+    print("-" * 47)
+    for name, make_server in (("readline", readlineServer), ("PeerProtocol", protocolServer)):
+        received, wall, cpu = await runCase(make_server, frames)
+        print(f"{name:<16} | {received / wall:>10.0f} | {cpu / received * 1e6:>15.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
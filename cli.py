@@ -11,6 +11,7 @@ async def initialScreen():
     print("'/pub #<namespace> <mensagem>' : mensagem para o namespace")
     print("'/pub * <mensagem>' : mensagem de broadcast")
     print("'/rtt' : mostra latências (RTT) para peers conectados")
+    print("'/metrics' : mostra as métricas do cliente (tráfego, latências, conexões)")
     print("'/logon <nivel>' : habilitar log")
     print("'/logoff <nivel>' : desabilitar log")
     print("'/quit' : sair do cliente")
@@ -1,4 +1,5 @@
 import asyncio
+from peer_table import PeerTable
 
 class Client:
     # definicção da classe 'Cliente' para uso no pyp2p (nome, porta, namespace, lista de peers, e métricas)
@@ -6,19 +7,44 @@ class Client:
         self.name = name
         self.port = port
         self.namespace = namespace
-        self.peersConnected = {} 
-        self.pending_acks = {}    
-        self.inbound = set()      
-        self.outbound = set()     
+        self.peersConnected = PeerTable()
+        self.pending_acks = {}
         self.rtt_table = {}
-        self.rtt_lock = asyncio.Lock()
-        self.ping_timestamps = {}  
+        self.connecting = set()
+        self.connect_semaphore = None
+        self.mesh_formation_time = None
+        self.keepalive = None
+        self.sender = None
+        self.dedup = None
+        self.reconnector = None
+        self.shard = None
+        self.discovered = {}
+        self.peer_expiry = {}
+        self.discovery_wakeup = asyncio.Event()
+
+    # conexões recebidas e iniciadas (índices por direção mantidos pela tabela de peers)
+    @property
+    def inbound(self):
+        return self.peersConnected.by_direction["inbound"]
+
+    @property
+    def outbound(self):
+        return self.peersConnected.by_direction["outbound"]
 
     # funções de atualização da lista de peers quando da desconexão
+    # (a queda de um peer antecipa o próximo discover)
     def removePeerPing(self, peer_id: str):
         if peer_id in self.peersConnected:
-            self.peersConnected[peer_id]["status"] = "LOST"
+            self.peersConnected[peer_id].status = "LOST"
+            self.peersConnected[peer_id].direction = None
+            self.discovery_wakeup.set()
+            if self.shard:
+                self.shard.peerLost(peer_id)
 
     def removePeer(self, peer_id: str):
         if peer_id in self.peersConnected:
-            self.peersConnected[peer_id]["status"] = "CLOSED"
+            self.peersConnected[peer_id].status = "CLOSED"
+            self.peersConnected[peer_id].direction = None
+            self.discovery_wakeup.set()
+            if self.shard:
+                self.shard.peerLost(peer_id)
@@ -0,0 +1,302 @@
+import base64
+import json
+import os
+import struct
+import time
+import zlib
+from datetime import datetime
+
+# codec central do protocolo: toda mensagem enviada ou recebida passa por aqui.
+# usa o backend JSON mais rápido disponível (orjson > ujson > json da biblioteca padrão)
+
+try:
+    import orjson
+
+    BACKEND = "orjson"
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    _loads = orjson.loads
+
+except ImportError:
+    try:
+        import ujson
+
+        BACKEND = "ujson"
+
+        def _dumps(obj) -> bytes:
+            return ujson.dumps(obj, ensure_ascii=False).encode('UTF-8')
+
+        _loads = ujson.loads
+
+    except ImportError:
+        BACKEND = "json"
+        _encoder = json.JSONEncoder(separators=(",", ":"))
+
+        def _dumps(obj) -> bytes:
+            return _encoder.encode(obj).encode('UTF-8')
+
+        _loads = json.loads
+
+# todos os backends lançam subclasses de ValueError para entradas inválidas
+DecodeError = ValueError
+
+def dumps(obj) -> bytes:
+    # JSON compacto em UTF-8 pelo backend escolhido, sem o '\n' do framing (para montar respostas em pedaços)
+    return _dumps(obj)
+
+# tamanho máximo de um frame definido na especificação (32 KiB)
+MAX_FRAME_SIZE = 32768
+
+# framing binário (feature "binary", negociada no HELLO / HELLO_OK):
+#   [tamanho do corpo: uint32][tamanho do cabeçalho: uint16][cabeçalho JSON][payload UTF-8 cru]
+# payloads grandes de SEND / PUB vão fora do JSON, sem escape; payloads pequenos ficam no cabeçalho
+# (cabeçalho == corpo), onde o backend JSON em C é mais barato que separar os pedaços
+BINARY_FEATURE = "binary"
+BINARY_HEADER = struct.Struct("!IH")
+RAW_PAYLOAD_MIN = 512
+
+# compressão de payload (feature "zlib", negociada no HELLO / HELLO_OK): o frame leva "encoding": "zlib"
+# e o payload comprimido vai cru no framing binário ou em base64 no JSON por linha
+COMPRESSION_FEATURE = "zlib"
+compression_stats = {"payloads": 0, "raw_bytes": 0, "compressed_bytes": 0, "seconds": 0.0, "skipped": 0}
+
+# ACKs em lote (feature "ackbatch"): um único ACK confirma vários SENDs pela lista "msg_ids"
+ACK_BATCH_FEATURE = "ackbatch"
+
+def compressPayload(payload, threshold: int, level=6, binary=True):
+    # comprime o payload quando ele passa do limiar e a compressão compensa; retorna None caso contrário.
+    # no JSON por linha o payload comprimido vai em base64 (4 bytes a cada 3), e é esse tamanho que conta
+    if not isinstance(payload, str) or len(payload) < threshold:
+        return None
+
+    raw = payload.encode('UTF-8')
+    start = time.perf_counter()
+    compressed = zlib.compress(raw, level)
+    compression_stats["seconds"] += time.perf_counter() - start
+
+    size = len(compressed) if binary else 4 * ((len(compressed) + 2) // 3)
+    if size >= len(raw):
+        compression_stats["skipped"] += 1
+        return None
+
+    compression_stats["payloads"] += 1
+    compression_stats["raw_bytes"] += len(raw)
+    compression_stats["compressed_bytes"] += len(compressed)
+    return compressed
+
+def decompressPayload(data: bytes) -> str:
+    # descomprime limitando a saída ao tamanho máximo de frame (protege contra "zip bombs")
+    try:
+        inflater = zlib.decompressobj()
+        raw = inflater.decompress(data, MAX_FRAME_SIZE)
+        if inflater.unconsumed_tail or not inflater.eof:
+            raise DecodeError(f"Payload comprimido excede o limite de {MAX_FRAME_SIZE} bytes ou está incompleto.")
+        return raw.decode('UTF-8')
+    except zlib.error as e:
+        raise DecodeError(f"Payload comprimido inválido: {e}")
+
+def encode(msg: dict, binary=False, compressed=None) -> bytes:
+    # serializa uma mensagem no formato da conexão: JSON UTF-8 terminado em '\n' ou frame binário;
+    # 'compressed' é o payload já comprimido por compressPayload() (reaproveitado entre conexões)
+    if compressed is not None:
+        header = {key: value for key, value in msg.items() if key != "payload"}
+        header["encoding"] = COMPRESSION_FEATURE
+        if not binary:
+            header["payload"] = base64.b64encode(compressed).decode('ascii')
+            return _dumps(header) + b'\n'
+        header_bytes = _dumps(header)
+        return BINARY_HEADER.pack(len(header_bytes) + len(compressed), len(header_bytes)) + header_bytes + compressed
+
+    if not binary:
+        return _dumps(msg) + b'\n'
+
+    payload = msg.get("payload")
+    if not isinstance(payload, str) or len(payload) < RAW_PAYLOAD_MIN:
+        body = _dumps(msg)
+        return BINARY_HEADER.pack(len(body), len(body)) + body
+
+    header = {key: value for key, value in msg.items() if key != "payload"}
+    header_bytes = _dumps(header)
+    payload_bytes = payload.encode('UTF-8')
+    return BINARY_HEADER.pack(len(header_bytes) + len(payload_bytes), len(header_bytes)) + header_bytes + payload_bytes
+
+def decode(line: bytes) -> dict:
+    # desserializa uma linha recebida (com ou sem '\n' no final)
+    msg = _loads(line)
+    if not isinstance(msg, dict):
+        raise DecodeError("Mensagem do protocolo deve ser um objeto JSON.")
+    return msg
+
+def decodeFrame(line: bytes) -> dict:
+    # desserializa um frame JSON por linha de um peer, descomprimindo o payload se necessário
+    msg = decode(line)
+    if "encoding" in msg:
+        if msg.pop("encoding") != COMPRESSION_FEATURE or not isinstance(msg.get("payload"), str):
+            raise DecodeError("Codificação de payload desconhecida.")
+        # base64 inválido lança binascii.Error, que também é um ValueError (DecodeError)
+        msg["payload"] = decompressPayload(base64.b64decode(msg["payload"], validate=True))
+    return msg
+
+def decodeBinary(body: bytes, header_len: int) -> dict:
+    # desserializa o corpo de um frame binário, recolocando o payload cru na mensagem
+    if header_len == len(body):
+        return decode(body)
+    if header_len > len(body):
+        raise DecodeError("Cabeçalho maior que o frame binário.")
+
+    msg = decode(body[:header_len])
+    if "encoding" in msg:
+        if msg.pop("encoding") != COMPRESSION_FEATURE:
+            raise DecodeError("Codificação de payload desconhecida.")
+        msg["payload"] = decompressPayload(body[header_len:])
+    else:
+        msg["payload"] = body[header_len:].decode('UTF-8')
+    return msg
+
+class FrameBuffer:
+    # separa frames (JSON por linha ou binários) de um único bytearray reaproveitado: os frames
+    # consumidos só avançam 'pos' e o buffer é compactado quando chega um bloco novo
+    def __init__(self, binary=False):
+        self.binary = binary
+        self.buffer = bytearray()
+        self.pos = 0
+        self.skip = 0
+        self.skip_line = False
+        # tamanho em bytes (com framing) do último frame retornado por parse()
+        self.frame_size = 0
+
+    def feed(self, data):
+        if self.pos:
+            del self.buffer[:self.pos]
+            self.pos = 0
+        self.buffer += data
+
+    def parse(self):
+        # retorna a próxima mensagem completa do buffer, ou None se ainda faltam bytes;
+        # frames acima do limite lançam DecodeError, mas a conexão continua alinhada no frame seguinte
+        buffer = self.buffer
+        size = len(buffer)
+
+        # restos de um frame binário acima do limite que ainda estão chegando são descartados
+        if self.skip:
+            dropped = min(self.skip, size - self.pos)
+            self.pos += dropped
+            self.skip -= dropped
+
+        while True:
+            pos = self.pos
+            if not self.binary:
+                end = buffer.find(b"\n", pos)
+                if end < 0:
+                    if size - pos > MAX_FRAME_SIZE:
+                        # descarta o que já chegou da linha longa demais e o resto dela, até o próximo '\n'
+                        self.pos = size
+                        if not self.skip_line:
+                            self.skip_line = True
+                            raise DecodeError(f"Linha excede o limite de {MAX_FRAME_SIZE} bytes.")
+                    return None
+                self.pos = end + 1
+                if self.skip_line:
+                    self.skip_line = False
+                    continue
+                if end - pos > MAX_FRAME_SIZE:
+                    raise DecodeError(f"Linha excede o limite de {MAX_FRAME_SIZE} bytes.")
+                if end - pos <= 1 and not buffer[pos:end].strip():
+                    continue
+                self.frame_size = end + 1 - pos
+                return decodeFrame(bytes(buffer[pos:end]))
+
+            if size - pos < BINARY_HEADER.size:
+                return None
+            body_len, header_len = BINARY_HEADER.unpack_from(buffer, pos)
+            start = pos + BINARY_HEADER.size
+            end = start + body_len
+
+            # frames acima do limite da especificação são descartados sem ficar em memória
+            if body_len > MAX_FRAME_SIZE:
+                self.pos = min(end, size)
+                self.skip = end - self.pos
+                raise DecodeError(f"Frame de {body_len} bytes excede o limite de {MAX_FRAME_SIZE} bytes.")
+
+            if size < end:
+                return None
+            self.pos = end
+            self.frame_size = end - pos
+            return decodeBinary(bytes(buffer[start:end]), header_len)
+
+# ids de SEND / PUB / BYE: UUID v4 aleatório (como na especificação), imprevisível porque o dedup e os ACKs
+# confiam nele; os bytes vêm do os.urandom em blocos de 4 KB, sem uma syscall por id
+_random_hex = ""
+_random_pos = 0
+
+def newMsgId() -> str:
+    global _random_hex, _random_pos
+    if _random_pos >= len(_random_hex):
+        _random_hex = os.urandom(4096).hex()
+        _random_pos = 0
+    h = _random_hex[_random_pos:_random_pos + 32]
+    _random_pos += 32
+    return f"{h[:8]}-{h[8:12]}-4{h[13:16]}-{'89ab'[int(h[16], 16) & 3]}{h[17:20]}-{h[20:]}"
+
+# ids de PING: prefixo aleatório por processo + contador (formato de UUID, sem syscall por id); só servem para
+# casar o PONG com o PING, então não precisam ser imprevisíveis
+_PING_PREFIX_ID = os.urandom(10).hex()
+_PING_PREFIX_ID = f"{_PING_PREFIX_ID[:8]}-{_PING_PREFIX_ID[8:12]}-4{_PING_PREFIX_ID[13:16]}-{_PING_PREFIX_ID[16:20]}-"
+_ping_counter = 0
+
+def newPingId() -> str:
+    global _ping_counter
+    _ping_counter += 1
+    return f"{_PING_PREFIX_ID}{_ping_counter:012x}"
+
+# o timestamp ISO só muda a cada segundo, então é reaproveitado dentro do mesmo segundo
+_iso_second = None
+_iso_cache = ""
+
+def isoNow() -> str:
+    global _iso_second, _iso_cache
+    second = int(time.time())
+    if second != _iso_second:
+        _iso_second = second
+        _iso_cache = datetime.fromtimestamp(second).isoformat()
+    return _iso_cache
+
+# templates pré-codificados para os frames de controle mais frequentes (PING, PONG e ACK)
+_PING_PREFIX = b'{"type":"PING","msg_id":"'
+_PONG_PREFIX = b'{"type":"PONG","msg_id":"'
+_ACK_PREFIX = b'{"type":"ACK","msg_id":"'
+_TIMESTAMP_RAW = b'","timestamp":'
+_TIMESTAMP_STR = b'","timestamp":"'
+_TTL_SUFFIX = b',"ttl":1}'
+_TTL_SUFFIX_STR = b'","ttl":1}'
+
+_SAFE_ID_CHARS = frozenset("0123456789abcdefABCDEF-_.:")
+
+def _safeId(msg_id) -> bool:
+    # só ids simples (como UUIDs) entram direto no template; o resto passa pelo backend JSON
+    return isinstance(msg_id, str) and 0 < len(msg_id) <= 128 and _SAFE_ID_CHARS.issuperset(msg_id)
+
+def _frame(json_bytes: bytes, binary: bool) -> bytes:
+    if binary:
+        return BINARY_HEADER.pack(len(json_bytes), len(json_bytes)) + json_bytes
+    return json_bytes + b'\n'
+
+def encodePing(msg_id: str, timestamp: float, binary=False) -> bytes:
+    if not _safeId(msg_id):
+        return encode({"type": "PING", "msg_id": msg_id, "timestamp": timestamp, "ttl": 1}, binary)
+    return _frame(b"".join((_PING_PREFIX, msg_id.encode(), _TIMESTAMP_RAW, repr(timestamp).encode(), _TTL_SUFFIX)), binary)
+
+def encodePong(msg_id: str, timestamp: float, binary=False) -> bytes:
+    if not _safeId(msg_id):
+        return encode({"type": "PONG", "msg_id": msg_id, "timestamp": timestamp, "ttl": 1}, binary)
+    return _frame(b"".join((_PONG_PREFIX, msg_id.encode(), _TIMESTAMP_RAW, repr(timestamp).encode(), _TTL_SUFFIX)), binary)
+
+def encodeAck(msg_id: str, binary=False) -> bytes:
+    if not _safeId(msg_id):
+        return encode({"type": "ACK", "msg_id": msg_id, "timestamp": isoNow(), "ttl": 1}, binary)
+    return _frame(b"".join((_ACK_PREFIX, msg_id.encode(), _TIMESTAMP_STR, isoNow().encode(), _TTL_SUFFIX_STR)), binary)
+
+def encodeAcks(msg_ids, binary=False) -> bytes:
+    return encode({"type": "ACK", "msg_ids": msg_ids, "timestamp": isoNow(), "ttl": 1}, binary)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+from logger import *
+
+CONFIG_PATH = "config.json"
+CONFIG_CHECK_INTERVAL = 2.0
+
+class Config:
+    # parâmetros do cliente carregados do 'config.json', validados uma única vez
+    def __init__(self, data: dict, mtime: float = 0.0):
+        self.name: str = data["name"]
+        self.port: int = data["port"]
+        self.namespace: str = data["namespace"]
+        self.ping_timer: float = data.get("ping_timer", 30)
+        self.timeout_timer: float = data.get("timeout_timer", 50)
+        self.server_address: str = data["server_address"]
+        self.server_port: int = data["server_port"]
+        self.version = data.get("version", 1.0)
+        self.features: list = list(data.get("features", []))
+        self.max_reconnect_attempts: int = data.get("max_reconnect_attempts", 2)
+        self.max_concurrent_connections: int = data.get("max_concurrent_connections", 32)
+        self.pub_deadline: float = data.get("pub_deadline", 2.0)
+        self.pub_max_buffered: int = data.get("pub_max_buffered", 256 * 1024)
+        self.outbound_queue_size: int = data.get("outbound_queue_size", 1024)
+        self.discovery_min_interval: float = data.get("discovery_min_interval", 1.0)
+        self.discovery_max_interval: float = data.get("discovery_max_interval", 60.0)
+        self.compress_threshold: int = data.get("compress_threshold", 1024)
+        self.compress_level: int = data.get("compress_level", 6)
+        self.send_window: int = data.get("send_window", 64)
+        self.max_retransmits: int = data.get("max_retransmits", 3)
+        self.ack_timeout: float = data.get("ack_timeout", 5.0)
+        self.ack_delay: float = data.get("ack_delay", 0.01)
+        self.ack_batch_size: int = data.get("ack_batch_size", 64)
+        self.dedup_capacity: int = data.get("dedup_capacity", 131072)
+        self.dedup_window: float = data.get("dedup_window", 300.0)
+        self.metrics_address: str = data.get("metrics_address", "127.0.0.1")
+        self.metrics_port = data.get("metrics_port")
+        self.mtime = mtime
+
+def parseConfig(data: dict, mtime: float = 0.0) -> Config:
+    # valida os tipos e valores do 'config.json' antes de criar o objeto de configuração
+    if (not isinstance(data.get("name"), str) or
+        not isinstance(data.get("port"), int) or
+        not isinstance(data.get("namespace"), str) or
+        not isinstance(data.get("server_address"), str) or
+        not isinstance(data.get("server_port"), int)):
+        raise ValueError("Configuração inválida no arquivo 'config.json'.")
+
+    if (
+        not data["name"] or
+        not (1024 <= data["port"] <= 65535) or
+        not data["namespace"]
+    ):
+        raise ValueError("Valores inválidos no arquivo 'config.json'.")
+
+    for key in ("ping_timer", "timeout_timer", "pub_deadline", "ack_timeout", "ack_delay", "dedup_window", "discovery_min_interval", "discovery_max_interval"):
+        if key in data and (not isinstance(data[key], (int, float)) or data[key] <= 0):
+            raise ValueError(f"Valor inválido para '{key}' no arquivo 'config.json'.")
+
+    for key in ("max_reconnect_attempts", "max_concurrent_connections", "pub_max_buffered", "outbound_queue_size", "compress_threshold", "max_retransmits", "dedup_capacity"):
+        if key in data and (not isinstance(data[key], int) or data[key] < 0):
+            raise ValueError(f"Valor inválido para '{key}' no arquivo 'config.json'.")
+
+    if "send_window" in data and (not isinstance(data["send_window"], int) or data["send_window"] < 1):
+        raise ValueError("Valor inválido para 'send_window' no arquivo 'config.json'.")
+
+    if "ack_batch_size" in data and (not isinstance(data["ack_batch_size"], int) or data["ack_batch_size"] < 1):
+        raise ValueError("Valor inválido para 'ack_batch_size' no arquivo 'config.json'.")
+
+    if "compress_level" in data and (not isinstance(data["compress_level"], int) or not (1 <= data["compress_level"] <= 9)):
+        raise ValueError("Valor inválido para 'compress_level' no arquivo 'config.json'.")
+
+    if data.get("metrics_port") is not None and (
+        not isinstance(data["metrics_port"], int) or not (1 <= data["metrics_port"] <= 65535)
+    ):
+        raise ValueError("Valor inválido para 'metrics_port' no arquivo 'config.json'.")
+
+    if not isinstance(data.get("metrics_address", ""), str):
+        raise ValueError("Valor inválido para 'metrics_address' no arquivo 'config.json'.")
+
+    if not isinstance(data.get("features", []), list):
+        raise ValueError("Valor inválido para 'features' no arquivo 'config.json'.")
+
+    return Config(data, mtime)
+
+def readConfigFile(path=CONFIG_PATH) -> Config:
+    with open(path, "r") as configFile:
+        mtime = os.fstat(configFile.fileno()).st_mtime
+        data = json.load(configFile)
+    return parseConfig(data, mtime)
+
+_config = None
+
+def loadConfig(path=CONFIG_PATH) -> Config:
+    # carrega (ou recarrega) a configuração compartilhada por todos os módulos
+    global _config
+    _config = readConfigFile(path)
+    return _config
+
+def getConfig() -> Config:
+    if _config is None:
+        return loadConfig()
+    return _config
+
+async def watchConfig(path=CONFIG_PATH, interval=CONFIG_CHECK_INTERVAL):
+    # recarrega a configuração em segundo plano quando o mtime do arquivo muda (I/O fora do event loop)
+    global _config
+    loop = asyncio.get_running_loop()
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            mtime = (await loop.run_in_executor(None, os.stat, path)).st_mtime
+            if _config is not None and mtime == _config.mtime:
+                continue
+
+            new_config = await loop.run_in_executor(None, readConfigFile, path)
+
+            # nome, porta e namespace identificam o peer e não mudam com o cliente em execução
+            if _config is not None and (new_config.name, new_config.port, new_config.namespace) != (
+                _config.name, _config.port, _config.namespace
+            ):
+                loggerWarning("Alteração de name/port/namespace no 'config.json' só vale após reiniciar o cliente.")
+
+            _config = new_config
+            loggerInfo("Configuração recarregada do 'config.json'.")
+
+        except (OSError, ValueError) as e:
+            # mantém a configuração anterior quando o arquivo está ausente ou inválido
+            loggerWarning(f"Falha ao recarregar 'config.json', mantendo a configuração anterior: {e}")
@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import errno
+import functools
+import io
+import json
+import os
+import stat
+import sys
+from logger import *
+
+# socket de controle do modo daemon: cada linha recebida é um comando do CLI ('/peers', '/msg bob@UnB oi', ...)
+# ou um JSON {"id": ..., "cmd": "..."}; cada comando roda na sua própria tarefa e a resposta sai como uma
+# linha JSON {"id", "ok", "output", "quit"} assim que ele termina, então vários comandos ficam em voo ao mesmo tempo
+
+DEFAULT_CONTROL_SOCKET = "control.sock"
+
+# buffer de saída do comando em execução; cada tarefa de comando tem o seu (contextvars é por tarefa)
+_command_output = contextvars.ContextVar("command_output", default=None)
+
+# conexões abertas no socket de controle, fechadas junto com o servidor
+_connections = set()
+
+class CommandStdout:
+    # substitui o sys.stdout no modo daemon: os prints feitos por um comando do socket vão para o buffer do
+    # comando, e o resto (DMs recebidas, por exemplo) continua indo para a saída do processo
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        buffer = _command_output.get()
+        if buffer is not None:
+            return buffer.write(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        if _command_output.get() is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+async def startControlServer(path, execute):
+    # execute(comando) -> awaitable; o resultado 1 indica que o cliente deve encerrar (/quit)
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            # só remove o socket que sobrou de uma execução anterior: se outro daemon atende nele, não sobe
+            if await socketAnswers(path):
+                raise OSError(errno.EADDRINUSE, f"Outro daemon já atende no socket de controle {path}")
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+    installCommandStdout()
+
+    # o socket já nasce só com acesso do dono (sem janela entre o bind e um chmod)
+    old_umask = os.umask(0o077)
+    try:
+        server = await asyncio.start_unix_server(functools.partial(handleControl, execute), path)
+    finally:
+        os.umask(old_umask)
+    loggerInfo(f"Socket de controle aberto em {path}")
+    return server
+
+def installCommandStdout():
+    if not isinstance(sys.stdout, CommandStdout):
+        sys.stdout = CommandStdout(sys.stdout)
+
+async def runCaptured(awaitable):
+    # roda o awaitable numa tarefa própria com os prints dela (e das tarefas que ela criar) num buffer só seu;
+    # o resto do processo continua imprimindo normalmente. Retorna (resultado, texto impresso)
+    installCommandStdout()
+    buffer = io.StringIO()
+
+    async def run():
+        _command_output.set(buffer)
+        return await awaitable
+
+    result = await asyncio.create_task(run())
+    return result, buffer.getvalue()
+
+async def socketAnswers(path):
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_unix_connection(path), timeout=1.0)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+async def stopControlServer(server, path):
+    # fecha também as conexões ainda abertas (ex.: a do cliente que mandou o /quit, já respondido), para as
+    # tarefas de leitura terminarem antes do event loop e não serem canceladas no meio do readline
+    server.close()
+    writers = list(_connections)
+    for writer in writers:
+        writer.close()
+    await asyncio.gather(*(asyncio.wait_for(writer.wait_closed(), timeout=2.0) for writer in writers), return_exceptions=True)
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+async def handleControl(execute, reader, writer):
+    tasks = set()
+    _connections.add(writer)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+
+            task = asyncio.create_task(runRequest(execute, line, writer))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        # a conexão fechou a escrita: responde os comandos que ainda estão rodando antes de fechar
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    except ConnectionError:
+        pass
+    finally:
+        _connections.discard(writer)
+        writer.close()
+
+async def runRequest(execute, line: bytes, writer):
+    request_id = None
+    command = line.decode("utf-8", errors="replace").strip()
+    if command.startswith("{"):
+        try:
+            request = json.loads(command)
+            request_id = request.get("id")
+            command = str(request.get("cmd", ""))
+        except (ValueError, AttributeError):
+            await respond(writer, {"id": None, "ok": False, "output": "Pedido JSON inválido.", "quit": False})
+            return
+
+    buffer = io.StringIO()
+    _command_output.set(buffer)
+
+    ok = True
+    result = 0
+    try:
+        result = await execute(command)
+    except Exception as e:
+        ok = False
+        loggerError(f"Erro no comando de controle '{command}'", e)
+        buffer.write(f"Erro: {e}\n")
+
+    await respond(writer, {"id": request_id, "ok": ok, "output": buffer.getvalue(), "quit": result == 1})
+
+async def respond(writer, response: dict):
+    if writer.is_closing():
+        return
+    writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+
+async def sendCommands(path, commands):
+    # cliente mínimo do socket de controle: envia os comandos de uma vez e imprime as respostas
+    reader, writer = await asyncio.open_unix_connection(path)
+    for index, command in enumerate(commands):
+        writer.write(json.dumps({"id": index, "cmd": command}).encode("utf-8") + b"\n")
+    await writer.drain()
+    writer.write_eof()
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        response = json.loads(line)
+        print(f"[{response['id']}] {commands[response['id']]}")
+        print(response["output"], end="" if response["output"].endswith("\n") else "\n")
+    writer.close()
+
+if __name__ == "__main__":
+    # uso: python control.py [--socket caminho] "<comando>" ["<comando>" ...]
+    args = sys.argv[1:]
+    path = DEFAULT_CONTROL_SOCKET
+    if len(args) >= 2 and args[0] == "--socket":
+        path, args = args[1], args[2:]
+    if not args:
+        print("Uso: python control.py [--socket caminho] \"<comando>\" [\"<comando>\" ...]")
+        sys.exit(1)
+    asyncio.run(sendCommands(path, args))
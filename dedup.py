@@ -0,0 +1,47 @@
+import collections
+import time
+
+# quantidade de gerações do cache; a mais antiga é descartada inteira a cada rotação
+DEDUP_BUCKETS = 4
+
+class DedupCache:
+    # supressão de mensagens duplicadas (retransmissões, entrega por mais de uma conexão) com memória limitada.
+    # guarda o hash de (peer, msg_id) em um único conjunto (uma consulta por mensagem) e a ordem de chegada em
+    # DEDUP_BUCKETS gerações; a geração atual fecha a cada window / DEDUP_BUCKETS segundos ou ao encher
+    # (capacity / DEDUP_BUCKETS ids) e a mais antiga sai do conjunto. Um id é lembrado por pelo menos ~3/4
+    # da janela, a menos que cheguem mais de 'capacity' ids nesse tempo
+    def __init__(self, capacity=131072, window=300.0):
+        self.bucket_capacity = max(1, capacity // DEDUP_BUCKETS)
+        self.span = window / DEDUP_BUCKETS
+        self.ids = set()
+        self.buckets = collections.deque([[]])
+        self.started = time.monotonic()
+        self.duplicates = 0
+
+    def seen(self, peer_id: str, msg_id: str, now=None):
+        # retorna True se (peer_id, msg_id) já foi visto; senão registra o id e retorna False.
+        # o hash de 64 bits ocupa menos que a tupla de strings (colisão ~1e-8 com milhões de ids)
+        key = hash((peer_id, msg_id))
+        if key in self.ids:
+            self.duplicates += 1
+            return True
+
+        current = self.buckets[-1]
+        if len(current) >= self.bucket_capacity or (now or time.monotonic()) - self.started >= self.span:
+            current = self.rotate(now or time.monotonic())
+
+        self.ids.add(key)
+        current.append(key)
+        return False
+
+    def rotate(self, now: float):
+        current = []
+        self.buckets.append(current)
+        if len(self.buckets) > DEDUP_BUCKETS:
+            # cada id entra em uma única geração, então basta tirar os da mais antiga do conjunto
+            self.ids.difference_update(self.buckets.popleft())
+        self.started = now
+        return current
+
+    def __len__(self):
+        return len(self.ids)
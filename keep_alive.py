@@ -0,0 +1,119 @@
+import asyncio
+import heapq
+import time
+import codec
+from logger import *
+from client import Client
+from config import getConfig
+from state import rttStatsFor
+
+class KeepAliveScheduler:
+    # escalonador de PING / PONG baseado em um heap de prazos (um prazo por peer), independente do discover
+    def __init__(self, client: Client):
+        self.client = client
+        self.heap = []
+        self.peers = {}
+        self.wakeup = asyncio.Event()
+
+    def track(self, peer_id: str):
+        # começa a acompanhar um peer recém conectado (o primeiro PING sai imediatamente)
+        now = time.monotonic()
+        entry = self.peers.get(peer_id)
+        generation = entry["generation"] + 1 if entry else 0
+
+        self.peers[peer_id] = {"next_ping": now, "generation": generation}
+        self.client.peersConnected[peer_id].last_seen = now
+        self.schedule(peer_id, now)
+
+    def untrack(self, peer_id: str):
+        # as entradas antigas no heap são descartadas quando chegarem ao topo
+        self.peers.pop(peer_id, None)
+
+    def schedule(self, peer_id: str, deadline):
+        heapq.heappush(self.heap, (deadline, self.peers[peer_id]["generation"], peer_id))
+
+        # acorda o laço caso o novo prazo seja o mais próximo
+        if self.heap[0][2] == peer_id:
+            self.wakeup.set()
+
+    async def run(self):
+        while True:
+            if not self.heap:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            delay = self.heap[0][0] - time.monotonic()
+            if delay > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, generation, peer_id = heapq.heappop(self.heap)
+            entry = self.peers.get(peer_id)
+            if entry is None or entry["generation"] != generation:
+                continue
+
+            try:
+                self.checkPeer(peer_id, entry)
+            except Exception as e:
+                loggerError(f"Erro no keep-alive de {peer_id}", e)
+
+    def checkPeer(self, peer_id: str, entry):
+        record = self.client.peersConnected.get(peer_id)
+        if record is None or not record.connected():
+            self.untrack(peer_id)
+            return
+
+        configs = getConfig()
+        now = time.monotonic()
+        last_seen = record.last_seen or now
+
+        # nenhum tráfego (PONG ou qualquer outra mensagem) dentro do timeout_timer: peer perdido
+        if now - last_seen >= configs.timeout_timer:
+            loggerWarning(f"Peer {peer_id} sem resposta há {now - last_seen:.1f}s. Marcando como LOST.")
+            self.untrack(peer_id)
+            markPeerLost(self.client, peer_id)
+            return
+
+        # envia PING apenas nas conexões outbound (o outro lado pinga as inbound)
+        if now >= entry["next_ping"]:
+            if record.direction == "outbound":
+                asyncio.create_task(sendPing(self.client, peer_id, record.outq))
+            entry["next_ping"] = now + configs.ping_timer
+
+        self.schedule(peer_id, min(entry["next_ping"], last_seen + configs.timeout_timer))
+
+async def sendPing(client: Client, peer_id: str, outq):
+    msg_id = codec.newPingId()
+    current_time = time.time()
+
+    # registra o ping nas estatísticas do par para cálculo de RTT (e de perda) ao receber o PONG
+    stats = rttStatsFor(client, peer_id)
+    stats.pingSent(msg_id, current_time, getConfig().timeout_timer)
+
+    try:
+        await outq.send(codec.encodePing(msg_id, current_time, outq.binary), msg_type="PING")
+    except Exception as e:
+        loggerWarning(f"Falha ao enviar PING para {peer_id}: {e}")
+        stats.pingFailed(msg_id)
+
+def markPeerLost(client: Client, peer_id: str):
+    # marca o peer como LOST e fecha o socket, o que também encerra a escuta da conexão; peers que já
+    # saíram (BYE enviado ou recebido) não são tratados como perdidos
+    record = client.peersConnected.get(peer_id)
+    if record is None or record.status != "CONNECTED":
+        return
+
+    client.removePeerPing(peer_id)
+    if client.reconnector:
+        client.reconnector.peerLost(peer_id)
+
+    outq = record.outq
+    record.writer = None
+    record.outq = None
+    if outq:
+        outq.close()
@@ -1,9 +1,10 @@
+import atexit
 import logging
 import os
-from datetime import datetime
+import sys
+import time
 
 LOG_DIR = "logs"
-TODAY = datetime.now().strftime("%Y%m%d")
 
 LOG_PATHS = {
     "INFO": os.path.join(LOG_DIR, "info"),
@@ -14,13 +15,9 @@ LOG_PATHS = {
 
 logLevels = ["INFO"]
 
-class GlobalLevelFilter(logging.Filter):
-    def filter(self, record):
-        return record.levelname in logLevels
-
 def removeLevel(level: str):
     level_upper = level.upper().strip()
-    
+
     if level_upper in logLevels:
         logLevels.remove(level_upper)
         print(f"[-] Nível de log removido: {level_upper}")
@@ -30,7 +27,7 @@ def removeLevel(level: str):
 def addLevel(level: str):
     level_upper = level.upper().strip()
     valid_levels = LOG_PATHS.keys()
-    
+
     if level_upper not in valid_levels:
         print(f"Nível inválido: {level_upper}. Use: {list(valid_levels)}")
         return
@@ -41,51 +38,104 @@ def addLevel(level: str):
     else:
         print(f"Nível {level_upper} já está ativo.")
 
+class LevelFileHandler(logging.Handler):
+    # um único handler síncrono: formata o registro uma vez e escreve a mesma linha no console e no arquivo
+    # do nível (no lugar do console + quatro FileHandlers com filtros, que formatavam a linha duas vezes).
+    # o nome do arquivo segue a data de cada registro, então vira à meia-noite
+    def __init__(self, formatter):
+        super().__init__()
+        self.setFormatter(formatter)
+        self.files = {}
+        self.second = None
+        self.day = None
+
+    def emit(self, record):
+        try:
+            line = self.format(record) + "\n"
+            sys.stderr.write(line)
+            sys.stderr.flush()
+            if record.levelname in LOG_PATHS:
+                file = self.fileFor(record.levelname, self.dayOf(record.created))
+                file.write(line)
+                file.flush()
+        except Exception:
+            self.handleError(record)
+
+    def dayOf(self, created):
+        # a data local só é recalculada quando muda o segundo do registro
+        second = int(created)
+        if second != self.second:
+            self.second = second
+            self.day = time.strftime("%Y%m%d", time.localtime(second))
+        return self.day
+
+    def fileFor(self, level, day):
+        current = self.files.get(level)
+        if current is not None and current[0] == day:
+            return current[1]
+
+        # virada do dia: fecha o arquivo anterior e abre o do dia do registro
+        if current is not None:
+            current[1].close()
+        # a pasta do nível só é criada no primeiro registro dele, e não na inicialização do cliente
+        os.makedirs(LOG_PATHS[level], exist_ok=True)
+        file = open(os.path.join(LOG_PATHS[level], f"app_{day}.log"), "a", encoding="utf-8")
+        self.files[level] = (day, file)
+        return file
+
+    def close(self):
+        for _, file in self.files.values():
+            file.close()
+        self.files.clear()
+        super().close()
+
+_handler = None
+
 def setupLogger():
-    for path in LOG_PATHS.values():
-        os.makedirs(path, exist_ok=True)
+    global _handler
 
     logger = logging.getLogger("app")
-    logger.setLevel(logging.DEBUG) 
-    
+    logger.setLevel(logging.DEBUG)
+
     if logger.hasHandlers():
         logger.handlers.clear()
 
     formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
-    
-    level_filter = GlobalLevelFilter()
-
-    console = logging.StreamHandler()
-    console.setLevel(logging.DEBUG)
-    console.setFormatter(formatter)
-    console.addFilter(level_filter)
-    logger.addHandler(console)
-
-    for level, path in LOG_PATHS.items():
-        handler = logging.FileHandler(
-            os.path.join(path, f"app_{TODAY}.log"),
-            encoding="utf-8"
-        )
-        handler.setLevel(getattr(logging, level))
-        handler.addFilter(lambda record, lvl=level: record.levelname == lvl)
-        handler.addFilter(level_filter)
-        handler.setFormatter(formatter)
-
-        logger.addHandler(handler)
+    if _handler is None:
+        _handler = LevelFileHandler(formatter)
+        atexit.register(stopLogger)
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+def stopLogger():
+    # fecha os arquivos de log abertos
+    global _handler
+    if _handler is not None:
+        logging.getLogger("app").removeHandler(_handler)
+        _handler.close()
+        _handler = None
 
 logger = logging.getLogger("app")
 
-def loggerInfo(msg: str):
-    logger.info(msg)
+# os níveis desligados são descartados antes de criar o registro; argumentos extras só são formatados
+# quando o nível está ligado (ex.: loggerDebug("RTT de %s: %.2fms", peer_id, rtt_ms))
+
+def loggerInfo(msg: str, *args):
+    if "INFO" in logLevels:
+        logger.info(msg, *args)
 
-def loggerWarning(msg: str):
-    logger.warning(msg)
+def loggerWarning(msg: str, *args):
+    if "WARNING" in logLevels:
+        logger.warning(msg, *args)
 
 def loggerError(msg: str, exception: Exception | None = None):
+    if "ERROR" not in logLevels:
+        return
     if exception:
-        logger.error(f"{msg}: {exception}", exc_info=True)
+        logger.error("%s: %s", msg, exception, exc_info=exception)
     else:
         logger.error(msg)
 
-def loggerDebug(msg: str):
-    logger.debug(msg)
\ No newline at end of file
+def loggerDebug(msg: str, *args):
+    if "DEBUG" in logLevels:
+        logger.debug(msg, *args)
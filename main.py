@@ -1,24 +1,81 @@
+import time
+
+# início da importação dos módulos do cliente (base do perfil de inicialização)
+_imports_started = time.perf_counter()
+
+import argparse
 import asyncio
 import json
 import functools
-from logger import *
-from cli import *
-from message_router import *
-from peer_connection import *
-from p2p_client import *
-from peer_list import *
-from state import *
+from logger import setupLogger, loggerInfo, loggerError, addLevel, removeLevel
+from cli import initialScreen, clearOSScreen
+from message_router import sendMessage, pubMessage
+from peer_connection import acceptPeer, connectPeers, reconnectPeers, sendBye
+from keep_alive import KeepAliveScheduler
+from reliable_send import ReliableSender
+from dedup import DedupCache
+from reconnect import ReconnectManager
+from p2p_client import registerPeer, unregister, discoverPeers, closeSession
+from peer_list import updatePeerList, nextExpiry
+from state import showPeers, showConns, showRtt
 from client import Client
+from config import loadConfig, getConfig, watchConfig
+from metrics import registry, watchClient, showMetrics, startMetricsServer
+from startup import StartupProfile
+from shards import ShardCoordinator, ShardWorker, shardSend, shardPub, shardPeers, shardRtt, shardShow, shardReconnect, shardBye
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="Cliente P2P (pyp2p)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="roda sem o CLI interativo, recebendo os comandos pelo socket de controle")
+    parser.add_argument("--control-socket", default=None,
+                        help="caminho do socket Unix de controle no modo daemon (padrão: control.sock)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="mostra quanto tempo cada etapa da inicialização levou até o primeiro comando")
+    parser.add_argument("--no-uvloop", action="store_true",
+                        help="usa o event loop padrão do asyncio mesmo com o uvloop instalado")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processos que dividem a porta P2P (SO_REUSEPORT) e as conexões com os peers (padrão: 1)")
+    # usados só pelo processo principal ao iniciar os demais workers
+    parser.add_argument("--shard-worker", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--shard-ipc", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers deve ser pelo menos 1")
+    return args
+
+def installEventLoop(args):
+    # usa o uvloop quando estiver instalado (event loop mais rápido, mesma API do asyncio)
+    if args.no_uvloop:
+        return "asyncio"
+    try:
+        import uvloop
+    except ImportError:
+        return "asyncio"
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return "uvloop"
 
-async def main():
-    validateConfig()
+async def main(args=None, profile=None):
+    args = args or parseArgs([])
+    profile = profile or StartupProfile(time.perf_counter())
+    profile.mark("Início do event loop")
     setupLogger()
+    profile.mark("Logger")
     
     try:
-        # carrega o arquivo 'config.json', que mantém os parâmetros do cliente
-        with open("config.json", "r") as config_file:
-            configs = json.load(config_file)
-            client = Client(configs["name"], configs["port"], configs["namespace"])
+        # carrega e valida o arquivo 'config.json' uma única vez (a configuração é compartilhada pelos módulos)
+        configs = loadConfig()
+        profile.mark("Leitura do config.json")
+        client = Client(configs.name, configs.port, configs.namespace)
+        client.keepalive = KeepAliveScheduler(client)
+        client.sender = ReliableSender(client)
+        client.dedup = DedupCache(configs.dedup_capacity, configs.dedup_window)
+        client.reconnector = ReconnectManager(client)
+
+        # a feature "metrics" liga a coleta de métricas (contadores, histogramas e gauges do cliente)
+        registry.enabled = "metrics" in configs.features
+        watchClient(client)
+        profile.mark("Criação do cliente")
 
     except FileNotFoundError as e:
         loggerError("Arquivo 'config.json' não encontrado!", e)
@@ -26,114 +83,232 @@ async def main():
     except json.JSONDecodeError as e:
         loggerError("Arquivo 'config.json' mal formatado!", e)
         return
+    except (KeyError, ValueError) as e:
+        loggerError("Configuração inválida no arquivo 'config.json'!", e)
+        return
+
+    if args.shard_worker is not None:
+        await shardWorkerMain(args, client)
+        return
+
+    # o REGISTER no Rendezvous (conexão TCP + ida e volta) roda em paralelo com a abertura do servidor P2P,
+    # e o CLI não espera a resposta: o resultado só vai para o log
+    loggerInfo("Registrando no servidor Rendezvous...")
+    register_task = asyncio.create_task(
+        profile.timed("REGISTER no Rendezvous", registerPeer(client.name, client.namespace, client.port))
+    )
+    register_task.add_done_callback(registered)
 
     try:
         # inicia o servidor P2P para aceitar conexões de outros peers
-        server_callback = functools.partial(handle_incoming_connection, client=client)
+        protocol_factory = functools.partial(acceptPeer, client)
         
-        server = await asyncio.start_server(
-            server_callback, 
+        # com vários workers, todos abrem a mesma porta e o kernel distribui as conexões entre eles
+        server = await profile.timed("Abertura do servidor P2P", asyncio.get_running_loop().create_server(
+            protocol_factory, 
             '0.0.0.0', 
-            client.port
-        )
+            client.port,
+            reuse_port=args.workers > 1 or None
+        ))
         loggerInfo(f"Servidor P2P iniciado. Escutando na porta {client.port}...")
         
         # cria uma tarefa para o servidor aceitar conexões de forma assíncrona
         asyncio.create_task(server.serve_forever())
         
-    except OSError as e:
+    except (OSError, ValueError) as e:
         loggerError(f"Falha ao abrir porta {client.port}. Verifique se já está em uso.", e)
+        # sem o servidor o peer não é alcançável: desfaz o registro que rodou em paralelo
+        if await register_task:
+            await unregister(client.namespace, client.name, client.port)
+        await closeSession()
         return
+    profile.mark("Servidor P2P (REGISTER em paralelo)")
 
-    loggerInfo("Registrando no servidor Rendezvous...")
+    if args.workers > 1:
+        client.shard = ShardCoordinator(client, args.workers)
+        await client.shard.start(["--no-uvloop"] if args.no_uvloop else [])
+        print(f"⚙️  {len(client.shard.links) + 1} workers dividindo a porta {client.port}")
+        profile.mark("Workers")
 
-    # tenta registrar o peer no servidor Rendezvous
-    registered = await registerPeer(client.name, client.namespace, client.port)
-    
-    if not registered:
-        loggerError("Falha ao registrar no Rendezvous. O programa continuará, mas talvez não seja visível.")
-    else:
-        loggerInfo("Registrado com sucesso!")
+    # endpoint HTTP local opcional para o Prometheus coletar as métricas
+    metrics_server = None
+    if registry.enabled and configs.metrics_port:
+        try:
+            metrics_server = await startMetricsServer(configs.metrics_address, configs.metrics_port)
+        except OSError as e:
+            loggerError(f"Falha ao abrir a porta de métricas {configs.metrics_port}.", e)
+        profile.mark("Servidor de métricas")
+
+    # no modo daemon os comandos chegam pelo socket de controle; senão, chama a tela inicial do CLI
+    control_server = None
+    control_socket = None
+    quit_event = asyncio.Event()
+    if args.daemon:
+        # o socket de controle só é carregado no modo daemon
+        from control import DEFAULT_CONTROL_SOCKET, startControlServer, stopControlServer
+        control_socket = args.control_socket or DEFAULT_CONTROL_SOCKET
 
-    # chama a tela inicial do CLI
-    await initialScreen()
+        async def execute(command):
+            ans = await runCommand(client, command, interactive=False)
+            if ans:
+                quit_event.set()
+            return ans
+
+        try:
+            control_server = await startControlServer(control_socket, execute)
+        except OSError as e:
+            loggerError(f"Falha ao abrir o socket de controle {control_socket}.", e)
+            server.close()
+            register_task.cancel()
+            await unregister(client.namespace, client.name, client.port)
+            await closeSession()
+            return
+        profile.mark("Socket de controle")
+    else:
+        await initialScreen()
+        profile.mark("Tela inicial do CLI")
 
     # roda o loop principal enquanto o usuário não digita o comando de saída
     discovery_task = asyncio.create_task(clientLoop(client))
+    keepalive_task = asyncio.create_task(client.keepalive.run())
+    config_task = asyncio.create_task(watchConfig())
     ans = 0
+    profile.report(type(asyncio.get_running_loop()).__module__.split(".")[0])
     try:
-        while not ans:
-            # lida do comando do usuário de modo assíncrono
-            ans = await commandRedirection(client)
+        if args.daemon:
+            await quit_event.wait()
+        else:
+            while not ans:
+                # lida do comando do usuário de modo assíncrono
+                ans = await commandRedirection(client)
 
     except KeyboardInterrupt:
         print("\nInterrupção forçada detectada.")
     finally:
         print("Saindo da rede...")
         discovery_task.cancel()
+        keepalive_task.cancel()
+        config_task.cancel()
+        register_task.cancel()
         
         # faz a desconexão limpa do peer e fecha o cliente
         await unregister(client.namespace, client.name, client.port)
+        await closeSession()
+        if client.shard:
+            await client.shard.stop()
         
+        if metrics_server is not None:
+            metrics_server.close()
+        if control_server is not None:
+            await stopControlServer(control_server, control_socket)
         server.close()
         await server.wait_closed()
         print("Aplicação encerrada.")
 
+async def shardWorkerMain(args, client):
+    # processo worker do modo --workers: cuida só das conexões do seu shard (recebidas pela porta compartilhada
+    # ou discadas a pedido do principal), sem CLI, Rendezvous ou discover; termina quando o principal fecha o canal
+    try:
+        server = await asyncio.get_running_loop().create_server(
+            functools.partial(acceptPeer, client), '0.0.0.0', client.port, reuse_port=True
+        )
+    except (OSError, ValueError) as e:
+        loggerError(f"Worker {args.shard_worker}: falha ao abrir a porta {client.port} com SO_REUSEPORT.", e)
+        return
+
+    client.shard = ShardWorker(client, args.shard_worker, args.shard_ipc)
+    keepalive_task = asyncio.create_task(client.keepalive.run())
+    config_task = asyncio.create_task(watchConfig())
+    try:
+        await client.shard.run()
+    except (OSError, ValueError) as e:
+        loggerError(f"Worker {args.shard_worker}: falha no canal com o processo principal.", e)
+    finally:
+        keepalive_task.cancel()
+        config_task.cancel()
+        client.shard = None
+        # o BYE do worker não tem para quem mostrar o resumo: a saída dele é descartada
+        from control import runCaptured
+        await runCaptured(sendBye(client))
+        server.close()
+        await server.wait_closed()
+
+def registered(task):
+    if task.cancelled():
+        return
+    if not task.result():
+        loggerError("Falha ao registrar no Rendezvous. O programa continuará, mas talvez não seja visível.")
+    else:
+        loggerInfo("Registrado com sucesso!")
+
 async def clientLoop(client):
+    # o intervalo do discover começa curto e dobra a cada rodada sem mudanças, até o máximo configurado
+    interval = getConfig().discovery_min_interval
+
     while True:
+        configs = getConfig()
         try:
             # primeiro, faz o discover de peers no servidor Rendezvous
             connectedPeers = await discoverPeers([]) 
             
-            if connectedPeers:
-                # atualiza a lista de peers conhecidos
-                await updatePeerList(client, connectedPeers)
-
-            for peer in list(client.peersConnected): 
-                
-                # evita tentar conectar a si mesmo, e pega o peer_id de cada peer da tabela
-                if peer == f"{client.name}@{client.namespace}":
-                    continue
-                
-                peer_data = client.peersConnected[peer]
-
-                # tenta pingar os peers conectados para atualizar RTTs
-                await pingPeers(client) 
-
-                if peer_data["status"] == "WAITING":
-                    try:
-                        # tenta estabelecer conexão com o peer por meio de HELLO / HELLO_OK
-                        reader, writer = await asyncio.wait_for(
-                            asyncio.open_connection(peer_data["address"], peer_data["port"]),
-                            timeout=5.0 
-                        )
-
-                        # atualiza o 'writer' na tabela de peers conectados para comunicação futura, e adiciona conexão
-                        client.peersConnected[peer]["writer"] = writer
-                        client.outbound.add(peer)
-
-                        # envia a mensagem HELLO para o peer e espera respostas
-                        await sendHello(client, reader, writer, peer)
-                        
-                        asyncio.create_task(listenToPeer(client, reader, peer, writer))
-                    
-                    except (OSError, asyncio.TimeoutError) as e:
-                        loggerError(f"Falha ao conectar com {peer}", e)
-                        
-                    except Exception as e:
-                        loggerError(f"Erro inesperado ao conectar com {peer}", e)
+            if connectedPeers is not None:
+                # aplica apenas as mudanças em relação ao discover anterior
+                added, changed, removed = await updatePeerList(client, connectedPeers)
+
+                # só os peers novos ou com endereço alterado geram trabalho de conexão
+                targets = [
+                    peer for peer in added + changed
+                    if peer in client.peersConnected and client.peersConnected[peer].status != "CONNECTED"
+                ]
+                for peer in targets:
+                    client.peersConnected[peer].status = "WAITING"
+                if targets and client.shard:
+                    client.shard.dial(targets)
+                elif targets:
+                    asyncio.create_task(connectPeers(client, targets))
+
+                if added or changed or removed:
+                    interval = configs.discovery_min_interval
+                else:
+                    interval = min(interval * 2, configs.discovery_max_interval)
+            else:
+                interval = min(interval * 2, configs.discovery_max_interval)
 
         except Exception as e:
             loggerError("Erro crítico no loop do cliente (Discover/Connect)", e)
 
-        await asyncio.sleep(5) 
+        # o próximo discover acontece antes se algum registro conhecido expirar no Rendezvous
+        delay = interval
+        expiry = nextExpiry(client)
+        if expiry is not None:
+            delay = min(delay, max(expiry - time.monotonic(), configs.discovery_min_interval))
+
+        # a queda de algum peer (churn) acorda o loop e volta ao intervalo mínimo
+        client.discovery_wakeup.clear()
+        try:
+            await asyncio.wait_for(client.discovery_wakeup.wait(), timeout=delay)
+            interval = configs.discovery_min_interval
+        except asyncio.TimeoutError:
+            pass
 
 
 async def commandRedirection(client):
     try:
-        # rotina assíncrona para ler o comando do usuário, fazendo o clear da tela antes (clearOSScreen)
+        # rotina assíncrona para ler o comando do usuário
         commands = await async_input("Digite o comando: ")
-        
+    except EOFError:
+        await sayBye(client)
+        await unregister(client.namespace, client.name, client.port)
+        return 1
+
+    return await runCommand(client, commands)
+
+async def runCommand(client, commands, interactive=True):
+    # executa um comando do CLI, fazendo o clear da tela antes (clearOSScreen); pelo socket de controle
+    # (interactive=False) a tela não é limpa e o /msg só responde depois do ACK (ou das retransmissões)
+    clearScreen = clearOSScreen if interactive else lambda: None
+    shard = client.shard
+    try:
         if not commands.strip():
             return 0
             
@@ -141,34 +316,48 @@ async def commandRedirection(client):
         cmd = commands[0].lower()
 
         if cmd == "/peers":
-            clearOSScreen()
+            clearScreen()
             arg = commands[1] if len(commands) > 1 else '*'
-            await showPeers(arg, client)
+            if shard:
+                await shardPeers(shard, arg)
+            else:
+                await showPeers(arg, client)
 
         elif cmd == "/msg":
-            clearOSScreen()
+            clearScreen()
             if len(commands) < 3:
                 print("Uso: /msg <peer_id> <mensagem>")
             else:
                 target = commands[1]
                 msg_content = ' '.join(commands[2:])
-                await sendMessage(target, msg_content, client)
+                if shard:
+                    future = await shardSend(shard, target, msg_content)
+                else:
+                    future = await sendMessage(target, msg_content, client)
+                if future is not None and not interactive:
+                    await future
 
         elif cmd == "/pub":
-            clearOSScreen()
+            clearScreen()
             if len(commands) < 3:
                 print("Uso: /pub <* | #namespace> <mensagem>")
             else:
                 target = commands[1]
                 msg_content = ' '.join(commands[2:])
-                await pubMessage(target, msg_content, client)
+                if shard:
+                    await shardPub(shard, target, msg_content)
+                else:
+                    await pubMessage(target, msg_content, client)
 
         elif cmd == "/conn":
-            clearOSScreen()
-            await showConns(client)
+            clearScreen()
+            if shard:
+                await shardShow(shard, "conns", showConns)
+            else:
+                await showConns(client)
             
         elif cmd == "/logon":
-            clearOSScreen()
+            clearScreen()
             if len(commands) < 2:
                 print("Uso: /logon <nivel>")
             else:
@@ -179,7 +368,7 @@ async def commandRedirection(client):
                     addLevel(level)
 
         elif cmd == "/logoff":
-            clearOSScreen()
+            clearScreen()
             if len(commands) < 2:
                 print("Uso: /logoff <nivel>")
             else:
@@ -190,49 +379,50 @@ async def commandRedirection(client):
                     removeLevel(level)
 
         elif cmd == "/reconnect":
-            clearOSScreen()
-            await reconnectPeers(client)
+            clearScreen()
+            if shard:
+                await shardReconnect(shard)
+            else:
+                await reconnectPeers(client)
             
         elif cmd == "/rtt":
-            clearOSScreen()
-            await showRtt(client)
+            clearScreen()
+            if shard:
+                await shardRtt(shard)
+            else:
+                await showRtt(client)
+
+        elif cmd == "/metrics":
+            clearScreen()
+            if shard:
+                await shardShow(shard, "metrics", showMetrics)
+            else:
+                await showMetrics(client)
+
         elif cmd == "/quit":
-            clearOSScreen()
-            await sendBye(client)
+            clearScreen()
+            await sayBye(client)
             await unregister(client.namespace, client.name, client.port)
             return 1
         
         elif cmd == "/help":
-            clearOSScreen()
+            clearScreen()
             await initialScreen()
 
         else:
             print("Comando inválido! Digite '/help' para ver comandos disponíveis.")
             
-    except EOFError:
-        await sendBye(client)
-        await unregister(client.namespace, client.name, client.port)
-        return 1
     except Exception as e:
         loggerError("Erro processando comando", e)
         
     return 0
 
-def validateConfig():
-    with open("config.json", "r") as configFile:
-            config = json.load(configFile)
-    if (not isinstance(config.get("name"), str) or
-        not isinstance(config.get("port"), int) or
-        not isinstance(config.get("namespace"), str)):
-        raise ValueError("Configuração inválida no arquivo 'config.json'.")
-    
-    if (
-        not config["name"] or
-        not (1024 <= config["port"] <= 65535) or
-        not config["namespace"]
-    ):
-        raise ValueError("Valores inválidos no arquivo 'config.json'.")
-
+async def sayBye(client):
+    # BYE para os peers de todos os workers
+    if client.shard:
+        await shardBye(client.shard)
+    else:
+        await sendBye(client)
 
 async def async_input(prompt: str = "") -> str:
     loop = asyncio.get_running_loop()
@@ -240,7 +430,13 @@ async def async_input(prompt: str = "") -> str:
 
 if __name__ == "__main__":
     # inicia o loop principal do asyncio (boa prática para lidar com KeyboardInterrupt)
+    profile = StartupProfile(_imports_started)
+    profile.mark("Importação dos módulos")
+    args = parseArgs()
+    profile.enabled = args.profile_startup
+    installEventLoop(args)
+    profile.mark("Argumentos e event loop")
     try:
-        asyncio.run(main())
+        asyncio.run(main(args, profile))
     except KeyboardInterrupt:
         pass
\ No newline at end of file
@@ -1,69 +1,49 @@
 import asyncio
-import json
-import uuid
+import time
+import codec
 from logger import *
 from client import Client
-import json
-import uuid
+from state import percentile
+from config import getConfig
+from keep_alive import markPeerLost
 
 async def sendMessage(target_peer_id, message, client : Client):
     if target_peer_id not in client.peersConnected:
         # verifica se o peer está na lista de peers conectados
         print(f"Erro: Peer {target_peer_id} não encontrado ou desconectado.")
-        return
+        return None
 
     # pega o peer_id do peer destinatário e vê se está conectado
     peer_data = client.peersConnected[target_peer_id]
 
-    if peer_data["status"] != "CONNECTED" or "writer" not in peer_data:
+    if not peer_data.connected():
         print(f"Erro: Sem conexão ativa com {target_peer_id}.")
-        return
-
-    # cria o ID único da mensagem e o payload, definindo que requer ACK
-    msg_id = str(uuid.uuid4())
-    require_ack = True
-
-    payload = {
-        "type": "SEND",
-        "msg_id": msg_id,
-        "src": f"{client.name}@{client.namespace}",
-        "dst": target_peer_id,
-        "payload": message,
-        "require_ack": require_ack,
-        "ttl": 1
-    }
-
-    try:
-        # envia a mensagem para o peer destinatário usando o 'writer' armazenado (em clientLoop() na main.py)
-        writer = peer_data["writer"]
-        writer.write((json.dumps(payload) + '\n').encode('UTF-8'))
-        await writer.drain()
-        loggerInfo(f"Mensagem enviada para {target_peer_id}: {message}")
-
-        if require_ack:
-            # atualiza a estrutura para aguardar o ACK
-            ack_future = asyncio.get_running_loop().create_future()
-            client.pending_acks[msg_id] = ack_future
-
-            try:
-                # espera pelo ACK com timeout
-                await asyncio.wait_for(ack_future, timeout=5.0)
-                print(f"✓ ACK recebido de {target_peer_id}")
-
-            except asyncio.TimeoutError:
-                loggerWarning(f"Timeout: Não recebeu ACK de {target_peer_id} para msg {msg_id}")
-                print(f"⚠ Timeout esperando confirmação de {target_peer_id}")
-            finally:
-                if msg_id in client.pending_acks:
-                    # apaga a entrada de espera pelo ACK tanto em sucesso quanto em timeout
-                    del client.pending_acks[msg_id]
-
-    except Exception as e:
-        loggerError(f"Falha ao enviar mensagem para {target_peer_id}", exception=e)
+        return None
+
+    # a mensagem entra na janela de envio do peer e é retransmitida até receber o ACK
+    future = client.sender.send(target_peer_id, message, ackReporter(target_peer_id))
+    loggerInfo("Mensagem enviada para %s: %s", target_peer_id, message)
+    return future
+
+def ackReporter(target_peer_id):
+    def onDone(future):
+        # o resultado chega depois, sem travar o CLI: True com o ACK, False depois de esgotar as retransmissões
+        if future.cancelled() or future.exception() is not None:
+            return
+        if future.result():
+            print(f"\n✓ ACK recebido de {target_peer_id}")
+        elif future.result() is False:
+            print(f"\n⚠ Sem confirmação de {target_peer_id} após {getConfig().max_retransmits + 1} tentativas")
+    return onDone
 
 async def pubMessage(destination, message_text, client: Client):
-    # cria o ID único da mensagem e o payload, sem ACK dessa vez
-    msg_id = str(uuid.uuid4())
+    counts, latencies = await publish(destination, message_text, client)
+    printPubSummary(counts, latencies)
+    return counts, latencies
+
+async def publish(destination, message_text, client: Client, msg_id=None):
+    # cria o ID único da mensagem (ou reaproveita o de outro processo do mesmo nó) e o payload, sem ACK dessa vez
+    msg_id = msg_id or codec.newMsgId()
     
     payload = {
         "type": "PUB",
@@ -75,42 +55,96 @@ async def pubMessage(destination, message_text, client: Client):
         "ttl": 1
     }
 
-    json_msg = (json.dumps(payload) + '\n').encode('UTF-8')
-    count = 0
-
-    # faz uma cópia da lista de peers conectados para evitar modificação durante iteração
-    peers_snapshot = list(client.peersConnected.items())
-
-    for peer_id, data in peers_snapshot:
-        
-        # verifica se deve enviar a mensagem para o peer atual com base se é um pub global ou por namespace
-        should_send = False
-        if destination == "*":
-            should_send = True
-        elif destination.startswith("#"):
-            # recebe namespace do destino (sem o '#') e compara com o namespace do peer
-            target_ns = destination[1:]
-            try:
-                peer_ns = peer_id.split('@')[1]
-                if peer_ns == target_ns:
-                    should_send = True
-            except IndexError:
-                continue
-
-        if should_send and data["status"] == "CONNECTED" and "writer" in data:
-            try:
-                # envia a mensagem PUB para o peer usando o 'writer' armazenado
-                data["writer"].write(json_msg)
-                await data["writer"].drain()
-                count += 1
-            
-            except (ConnectionResetError, BrokenPipeError):
-                loggerWarning(f"Não foi possível enviar PUB para {peer_id}: Conexão perdida.")
-                if peer_id in client.peersConnected:
-                    client.peersConnected[peer_id]["status"] = "LOST"
-
-            except Exception as e:
-                loggerError(f"Erro inesperado ao publicar para {peer_id}", e)
-
-    print(f"Mensagem publicada para {count} peers.")
+    configs = getConfig()
+
+    # codifica o frame uma única vez por framing (JSON por linha / binário) e por compressão, reaproveitando
+    # os mesmos bytes para todos os peers; o payload é comprimido no máximo uma vez por framing
+    frames = {}
+    compressed = {}
+
+    def frameFor(outq):
+        use_zlib = codec.COMPRESSION_FEATURE in outq.features
+        key = (outq.binary, use_zlib)
+        frame = frames.get(key)
+        if frame is None:
+            if use_zlib and outq.binary not in compressed:
+                compressed[outq.binary] = codec.compressPayload(
+                    message_text, configs.compress_threshold, configs.compress_level, outq.binary
+                )
+            frame = frames[key] = codec.encode(payload, outq.binary, compressed[outq.binary] if use_zlib else None)
+        return frame
+
+    deadline = configs.pub_deadline
+    max_buffered = configs.pub_max_buffered
+
+    # consulta os índices da tabela: pub global ou por namespace (sem o '#'), apenas peers conectados
+    if destination == "*":
+        records = client.peersConnected.select(status="CONNECTED")
+    elif destination.startswith("#"):
+        records = client.peersConnected.select(namespace=destination[1:], status="CONNECTED")
+    else:
+        records = []
+
+    targets = [(record.peer_id, record.outq) for record in records if record.outq is not None]
+
+    # entrega para todos os peers ao mesmo tempo: um consumidor lento só atrasa a si mesmo
+    results = await asyncio.gather(
+        *(deliverFrame(peer_id, outq, frameFor(outq), deadline, max_buffered, client) for peer_id, outq in targets)
+    )
+
+    counts = {"delivered": 0, "late": 0, "dropped": 0, "failed": 0}
+    latencies = []
+    for status, latency in results:
+        counts[status] += 1
+        if latency is not None:
+            latencies.append(latency)
+
+    latencies.sort()
+    p50, p95, p99 = (percentile(latencies, p) for p in (50, 95, 99))
+
+    loggerDebug(
+        "PUB %s para %s: %d/%d entregues, %d lentos, %d descartados, %d falhas | "
+        "latência p50=%.2fms p95=%.2fms p99=%.2fms",
+        msg_id, destination, counts['delivered'], len(targets), counts['late'], counts['dropped'], counts['failed'],
+        p50, p95, p99
+    )
+    return counts, latencies
+
+def printPubSummary(counts, latencies):
+    # 'latencies' já ordenadas
+    print(f"Mensagem publicada para {counts['delivered']} peers.")
+    if counts["late"] or counts["dropped"] or counts["failed"]:
+        print(f"⚠ {counts['late']} lentos, {counts['dropped']} descartados, {counts['failed']} falhas.")
+    if latencies:
+        p50, p95, p99 = (percentile(latencies, p) for p in (50, 95, 99))
+        print(f"Latência do fan-out: p50 {p50:.2f}ms | p95 {p95:.2f}ms | p99 {p99:.2f}ms")
+
+async def deliverFrame(peer_id, outq, frame, deadline, max_buffered, client: Client):
+    # entrega um frame já codificado para um peer, respeitando o prazo e o limite de buffer pendente
+    start_time = time.perf_counter()
+
+    try:
+        # descarta a mensagem se o peer já acumula frames ou bytes demais para enviar (consumidor lento)
+        transport = outq.writer.transport
+        if outq.full() or transport.get_write_buffer_size() > max_buffered:
+            loggerWarning("PUB descartado para %s: buffer de envio cheio.", peer_id)
+            return "dropped", None
+
+        await asyncio.wait_for(outq.send(frame, wait=True, msg_type="PUB"), timeout=deadline)
+        return "delivered", (time.perf_counter() - start_time) * 1000
+
+    except asyncio.TimeoutError:
+        # os bytes continuam no buffer, mas o peer não os consumiu dentro do prazo
+        loggerWarning("PUB para %s excedeu o prazo de %ss.", peer_id, deadline)
+        return "late", None
+
+    except (ConnectionResetError, BrokenPipeError):
+        loggerWarning("Não foi possível enviar PUB para %s: Conexão perdida.", peer_id)
+        record = client.peersConnected.get(peer_id)
+        if record is not None and record.outq is outq:
+            markPeerLost(client, peer_id)
+
+    except Exception as e:
+        loggerError(f"Erro inesperado ao publicar para {peer_id}", e)
 
+    return "failed", None
@@ -0,0 +1,302 @@
+import asyncio
+import time
+from bisect import bisect_left
+from logger import *
+
+# subsistema de métricas do cliente (feature "metrics"): contadores e histogramas rotulados,
+# gauges calculados na hora da leitura, e exportação no formato texto do Prometheus
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# tempos de recuperação (reconexão) vão de segundos a minutos
+RECOVERY_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float):
+        # estimativa pelo limite superior do bucket onde cai o quantil (como o histogram_quantile do Prometheus)
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return self.buckets[-1]
+
+class Metrics:
+    def __init__(self):
+        self.enabled = True
+        self.started = time.time()
+        self.meta = {}
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.buckets = {}
+
+    def describe(self, name: str, kind: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.meta[name] = (kind, help_text, tuple(labelnames))
+        if kind == "histogram":
+            self.buckets[name] = buckets
+
+    def inc(self, name: str, labels=(), value=1):
+        # labels é a tupla de valores na ordem dos labelnames declarados em describe()
+        if not self.enabled:
+            return
+        series = self.counters.get(name)
+        if series is None:
+            series = self.counters[name] = {}
+        series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name: str, value: float, labels=()):
+        if not self.enabled:
+            return
+        series = self.histograms.get(name)
+        if series is None:
+            series = self.histograms[name] = {}
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(self.buckets.get(name, LATENCY_BUCKETS))
+        histogram.observe(value)
+
+    def gauge(self, name: str, help_text: str, labelnames, collect):
+        # collect() -> lista de (labels, valor), chamada só quando as métricas são lidas
+        self.describe(name, "gauge", help_text, labelnames)
+        self.gauges[name] = collect
+
+    def collectGauges(self):
+        values = {}
+        for name, collect in self.gauges.items():
+            try:
+                values[name] = collect()
+            except Exception as e:
+                loggerWarning(f"Falha ao coletar a métrica {name}: {e}")
+        return values
+
+    def render(self) -> str:
+        # exporta todas as séries no formato texto do Prometheus (versão 0.0.4)
+        lines = []
+
+        def header(name):
+            kind, help_text, _ = self.meta.get(name, ("untyped", "", ()))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for name, series in sorted(self.counters.items()):
+            header(name)
+            for labels, value in series.items():
+                lines.append(f"{name}{formatLabels(self.labelnames(name), labels)} {value}")
+
+        for name, series in sorted(self.histograms.items()):
+            header(name)
+            labelnames = self.labelnames(name)
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{formatLabels(labelnames + ('le',), labels + (repr(bound),))} {cumulative}")
+                lines.append(f"{name}_bucket{formatLabels(labelnames + ('le',), labels + ('+Inf',))} {histogram.count}")
+                lines.append(f"{name}_sum{formatLabels(labelnames, labels)} {histogram.sum}")
+                lines.append(f"{name}_count{formatLabels(labelnames, labels)} {histogram.count}")
+
+        for name, values in sorted(self.collectGauges().items()):
+            header(name)
+            labelnames = self.labelnames(name)
+            for labels, value in values:
+                lines.append(f"{name}{formatLabels(labelnames, labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def labelnames(self, name):
+        return self.meta.get(name, (None, None, ()))[2]
+
+def formatLabels(labelnames, labels):
+    if not labelnames:
+        return ""
+    pairs = ",".join(
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in zip(labelnames, labels)
+    )
+    return "{" + pairs + "}"
+
+registry = Metrics()
+
+# nomes das métricas (um lugar só para quem registra e para quem lê)
+FRAMES_IN = "p2p_frames_received_total"
+BYTES_IN = "p2p_bytes_received_total"
+FRAMES_OUT = "p2p_frames_sent_total"
+BYTES_OUT = "p2p_bytes_sent_total"
+HANDSHAKE_SECONDS = "p2p_handshake_seconds"
+HANDSHAKE_FAILURES = "p2p_handshake_failures_total"
+ACK_SECONDS = "p2p_ack_latency_seconds"
+ACK_TIMEOUTS = "p2p_ack_timeouts_total"
+RETRANSMITS = "p2p_send_retransmits_total"
+DUPLICATES = "p2p_duplicates_dropped_total"
+RECONNECT_SECONDS = "p2p_reconnect_recovery_seconds"
+RECONNECT_FAILURES = "p2p_reconnect_failures_total"
+RENDEZVOUS_SECONDS = "p2p_rendezvous_request_seconds"
+RENDEZVOUS_FAILURES = "p2p_rendezvous_failures_total"
+
+registry.describe(FRAMES_IN, "counter", "Frames recebidos de peers.", ("type", "peer"))
+registry.describe(BYTES_IN, "counter", "Bytes de frames recebidos de peers.", ("type", "peer"))
+registry.describe(FRAMES_OUT, "counter", "Frames enfileirados para envio a peers.", ("type", "peer"))
+registry.describe(BYTES_OUT, "counter", "Bytes de frames enfileirados para envio a peers.", ("type", "peer"))
+registry.describe(HANDSHAKE_SECONDS, "histogram", "Duração do handshake HELLO / HELLO_OK.", ("direction",))
+registry.describe(HANDSHAKE_FAILURES, "counter", "Handshakes que falharam.", ("direction",))
+registry.describe(ACK_SECONDS, "histogram", "Latência entre o envio de um SEND e o seu ACK.", ())
+registry.describe(ACK_TIMEOUTS, "counter", "SENDs sem ACK depois de esgotar as retransmissões.", ("peer",))
+registry.describe(RETRANSMITS, "counter", "SENDs retransmitidos por falta de ACK.", ("peer",))
+registry.describe(DUPLICATES, "counter", "Mensagens recebidas em duplicata e descartadas.", ("type",))
+registry.describe(RECONNECT_SECONDS, "histogram", "Tempo entre a perda de um peer e a nova conexão com ele.", ("peer",), RECOVERY_BUCKETS)
+registry.describe(RECONNECT_FAILURES, "counter", "Peers que esgotaram as tentativas de reconexão.", ("peer",))
+registry.describe(RENDEZVOUS_SECONDS, "histogram", "Tempo de ida e volta dos pedidos ao Rendezvous.", ("type",))
+registry.describe(RENDEZVOUS_FAILURES, "counter", "Pedidos ao Rendezvous que falharam.", ("type",))
+
+def watchClient(client):
+    # gauges do estado atual do cliente, calculados só quando alguém lê as métricas
+    import codec
+
+    registry.gauge(
+        "p2p_peers", "Peers conhecidos por status.", ("status",),
+        lambda: [((status,), len(ids)) for status, ids in client.peersConnected.by_status.items()]
+    )
+    registry.gauge(
+        "p2p_connections", "Conexões ativas por direção.", ("direction",),
+        lambda: [((direction,), len(ids)) for direction, ids in client.peersConnected.by_direction.items()]
+    )
+    registry.gauge(
+        "p2p_outbound_queue_depth", "Frames aguardando na fila de saída de cada conexão.", ("peer",),
+        lambda: [
+            ((record.peer_id,), record.outq.depth())
+            for record in client.peersConnected.select(status="CONNECTED") if record.outq is not None
+        ]
+    )
+    registry.gauge(
+        "p2p_send_inflight", "SENDs aguardando ACK na janela de cada peer.", ("peer",),
+        lambda: [((peer_id,), len(window.inflight)) for peer_id, window in client.sender.windows.items()] if client.sender else []
+    )
+    registry.gauge(
+        "p2p_rtt_smoothed_seconds", "RTT suavizado (EWMA) por par de peers.", ("pair",),
+        lambda: [((f"{a}<->{b}",), stats.srtt / 1000) for (a, b), stats in client.rtt_table.items() if stats.count]
+    )
+    registry.gauge(
+        "p2p_ping_loss_ratio", "Fração de PINGs sem PONG por par de peers.", ("pair",),
+        lambda: [((f"{a}<->{b}",), stats.lossRate()) for (a, b), stats in client.rtt_table.items()]
+    )
+    registry.gauge(
+        "p2p_compression_bytes", "Bytes de payload antes e depois da compressão.", ("stage",),
+        lambda: [(("raw",), codec.compression_stats["raw_bytes"]), (("compressed",), codec.compression_stats["compressed_bytes"])]
+    )
+    registry.gauge(
+        "p2p_uptime_seconds", "Tempo desde o início do cliente.", (),
+        lambda: [((), time.time() - registry.started)]
+    )
+
+async def showMetrics(client):
+    # resumo legível das métricas para o CLI
+    if not registry.enabled:
+        print("\n🚫 Métricas desabilitadas (adicione \"metrics\" em 'features' no 'config.json').\n")
+        return
+
+    print(f"\n📈 Métricas (há {time.time() - registry.started:.0f}s)")
+
+    def totals(name, index):
+        grouped = {}
+        for labels, value in registry.counters.get(name, {}).items():
+            grouped[labels[index]] = grouped.get(labels[index], 0) + value
+        return grouped
+
+    frames_in, bytes_in = totals(FRAMES_IN, 0), totals(BYTES_IN, 0)
+    frames_out, bytes_out = totals(FRAMES_OUT, 0), totals(BYTES_OUT, 0)
+    types = sorted(set(frames_in) | set(frames_out))
+    if types:
+        print(f"{'TIPO':<10} | {'FRAMES IN':>10} | {'BYTES IN':>10} | {'FRAMES OUT':>10} | {'BYTES OUT':>10}")
+        print("-" * 62)
+        for msg_type in types:
+            print(
+                f"{msg_type:<10} | {frames_in.get(msg_type, 0):>10} | {bytes_in.get(msg_type, 0):>10} | "
+                f"{frames_out.get(msg_type, 0):>10} | {bytes_out.get(msg_type, 0):>10}"
+            )
+
+    peers_in, peers_out = totals(BYTES_IN, 1), totals(BYTES_OUT, 1)
+    if peers_in or peers_out:
+        print("\nBytes por peer (in / out):")
+        for peer in sorted(set(peers_in) | set(peers_out)):
+            print(f"\t- {peer}: {peers_in.get(peer, 0)} / {peers_out.get(peer, 0)}")
+
+    print("\nLatências (contagem | média | p50 | p95 | p99):")
+    for name, title in (
+        (HANDSHAKE_SECONDS, "Handshake"),
+        (ACK_SECONDS, "ACK"),
+        (RECONNECT_SECONDS, "Reconexão"),
+        (RENDEZVOUS_SECONDS, "Rendezvous"),
+    ):
+        for labels, histogram in sorted(registry.histograms.get(name, {}).items()):
+            label = f"{title} {'/'.join(labels)}".strip()
+            avg = histogram.sum / histogram.count * 1000 if histogram.count else 0.0
+            p50, p95, p99 = (histogram.quantile(q) * 1000 for q in (0.5, 0.95, 0.99))
+            print(f"\t- {label:<22}: {histogram.count:>6} | {avg:>8.2f}ms | ≤{p50:.1f}ms | ≤{p95:.1f}ms | ≤{p99:.1f}ms")
+
+    failures = []
+    for name, title in ((RETRANSMITS, "retransmissões"), (DUPLICATES, "duplicatas descartadas"), (RECONNECT_FAILURES, "reconexões esgotadas"), (ACK_TIMEOUTS, "timeouts de ACK"), (HANDSHAKE_FAILURES, "handshakes falhos"), (RENDEZVOUS_FAILURES, "falhas no Rendezvous")):
+        total = sum(registry.counters.get(name, {}).values())
+        if total:
+            failures.append(f"{total} {title}")
+    if failures:
+        print(f"\n⚠ {', '.join(failures)}")
+
+    gauges = registry.collectGauges()
+    peers = dict((labels[0], value) for labels, value in gauges.get("p2p_peers", []))
+    connections = dict((labels[0], value) for labels, value in gauges.get("p2p_connections", []))
+    depths = [value for _, value in gauges.get("p2p_outbound_queue_depth", [])]
+    print(
+        f"\nPeers: {peers.get('CONNECTED', 0)} conectados, {peers.get('WAITING', 0)} aguardando, "
+        f"{peers.get('LOST', 0)} perdidos | conexões {connections.get('inbound', 0)} in / {connections.get('outbound', 0)} out | "
+        f"fila de saída máx {max(depths, default=0)}\n"
+    )
+
+async def handleScrape(reader, writer):
+    # servidor HTTP mínimo: GET /metrics devolve o texto do Prometheus; qualquer outra rota devolve 404
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if not line or line in (b"\r\n", b"\n"):
+                break
+
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            body = registry.render().encode("UTF-8")
+            status = "200 OK"
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = b"not found\n"
+            status = "404 Not Found"
+            content_type = "text/plain"
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, OSError):
+        pass
+    finally:
+        writer.close()
+
+async def startMetricsServer(address: str, port: int):
+    server = await asyncio.start_server(handleScrape, address, port)
+    loggerInfo(f"Métricas disponíveis em http://{address}:{port}/metrics")
+    return server
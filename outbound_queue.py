@@ -0,0 +1,168 @@
+import asyncio
+import codec
+from logger import *
+from config import getConfig
+from metrics import registry, FRAMES_OUT, BYTES_OUT
+
+class OutboundQueue:
+    # fila de saída de uma conexão: uma única tarefa escreve no socket, agrupando os frames pendentes
+    def __init__(self, writer, peer_id: str, maxsize=1024, features=()):
+        self.writer = writer
+        self.peer_id = peer_id
+        # features negociadas no handshake; definem como os frames desta conexão são codificados
+        self.features = frozenset(features)
+        self.binary = codec.BINARY_FEATURE in self.features
+        self.acks = AckBatcher(self) if codec.ACK_BATCH_FEATURE in self.features else None
+        self.queue = asyncio.Queue(maxsize)
+        self.task = None
+        self.closed = False
+        self.stats = {
+            "frames": 0,
+            "bytes": 0,
+            "flushes": 0,
+            "max_flush_bytes": 0,
+            "max_depth": 0
+        }
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+        return self
+
+    async def send(self, frame: bytes, wait=False, msg_type="?"):
+        # enfileira um frame já codificado; bloqueia o produtor quando a fila está cheia (backpressure)
+        if self.closed:
+            raise ConnectionResetError(f"Conexão com {self.peer_id} encerrada.")
+
+        future = asyncio.get_running_loop().create_future() if wait else None
+        await self.queue.put((frame, future))
+        self.stats["max_depth"] = max(self.stats["max_depth"], self.queue.qsize())
+        self.count(frame, msg_type)
+
+        # com wait=True, só retorna depois que o frame foi entregue ao socket (drain concluído)
+        if future is not None:
+            await future
+
+    def sendNowait(self, frame: bytes, msg_type="?"):
+        # enfileira sem esperar; lança asyncio.QueueFull quando a fila está cheia
+        if self.closed:
+            raise ConnectionResetError(f"Conexão com {self.peer_id} encerrada.")
+
+        self.queue.put_nowait((frame, None))
+        self.stats["max_depth"] = max(self.stats["max_depth"], self.queue.qsize())
+        self.count(frame, msg_type)
+
+    def count(self, frame: bytes, msg_type: str):
+        labels = (msg_type, self.peer_id)
+        registry.inc(FRAMES_OUT, labels)
+        registry.inc(BYTES_OUT, labels, len(frame))
+
+    def full(self):
+        return self.queue.full()
+
+    def depth(self):
+        return self.queue.qsize()
+
+    async def run(self):
+        batch = []
+        try:
+            while True:
+                batch = [await self.queue.get()]
+
+                # junta tudo o que já está pendente na fila em uma única escrita
+                while not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+
+                frames = [frame for frame, _ in batch]
+                flush_bytes = sum(len(frame) for frame in frames)
+
+                self.writer.writelines(frames)
+                await self.writer.drain()
+
+                self.stats["frames"] += len(frames)
+                self.stats["bytes"] += flush_bytes
+                self.stats["flushes"] += 1
+                self.stats["max_flush_bytes"] = max(self.stats["max_flush_bytes"], flush_bytes)
+
+                for _, future in batch:
+                    if future is not None and not future.done():
+                        future.set_result(True)
+                batch = []
+
+        except asyncio.CancelledError:
+            self.failPending(batch, ConnectionResetError(f"Conexão com {self.peer_id} encerrada."))
+            raise
+        except Exception as e:
+            loggerWarning(f"Falha ao escrever para {self.peer_id}: {e}")
+            self.closed = True
+            self.failPending(batch, e)
+
+    def failPending(self, batch, error):
+        # avisa os produtores que aguardavam a entrega dos frames que não foram enviados
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        for _, future in batch:
+            if future is not None and not future.done():
+                future.set_exception(error)
+
+    def close(self):
+        # encerra a tarefa de escrita e o socket da conexão
+        self.closed = True
+        if self.acks is not None:
+            self.acks.cancel()
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+        self.writer.close()
+
+    def snapshot(self):
+        stats = dict(self.stats)
+        stats["depth"] = self.queue.qsize()
+        stats["avg_flush_bytes"] = stats["bytes"] / stats["flushes"] if stats["flushes"] else 0.0
+        return stats
+
+class AckBatcher:
+    # ACKs atrasados da conexão (feature "ackbatch"): os msg_ids recebidos se acumulam por até 'ack_delay'
+    # segundos ou 'ack_batch_size' mensagens e saem todos em um único frame ACK
+    def __init__(self, outq: OutboundQueue):
+        self.outq = outq
+        self.msg_ids = []
+        self.timer = None
+
+    def add(self, msg_id: str):
+        # retorna None ou, com a fila de saída cheia, a espera pelo envio do lote (backpressure)
+        self.msg_ids.append(msg_id)
+        configs = getConfig()
+        if len(self.msg_ids) >= configs.ack_batch_size:
+            return self.flush()
+        if self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(configs.ack_delay, self.flushLater)
+        return None
+
+    def flushLater(self):
+        self.timer = None
+        pending = self.flush()
+        if pending is not None:
+            asyncio.ensure_future(pending).add_done_callback(self.flushed)
+
+    def flushed(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            loggerWarning(f"Falha ao enviar ACKs para {self.outq.peer_id}: {task.exception()}")
+
+    def flush(self):
+        self.cancel()
+        if not self.msg_ids:
+            return None
+
+        frame = codec.encodeAcks(self.msg_ids, self.outq.binary)
+        self.msg_ids = []
+        try:
+            self.outq.sendNowait(frame, msg_type="ACK")
+        except asyncio.QueueFull:
+            return self.outq.send(frame, msg_type="ACK")
+        except ConnectionResetError:
+            pass
+        return None
+
+    def cancel(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
@@ -1,45 +1,170 @@
-import json
 import asyncio
+import time
+from collections import deque
+import codec
 from logger import *
+from config import getConfig
+from metrics import registry, RENDEZVOUS_SECONDS, RENDEZVOUS_FAILURES
+
+class RendezvousSession:
+    # sessão persistente com o servidor Rendezvous: uma única conexão TCP reaproveitada por
+    # REGISTER / DISCOVER / UNREGISTER, com vários pedidos em voo respondidos em ordem (pipelining)
+    def __init__(self, address=None, port=None):
+        self.address = address
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.reader_task = None
+        self.pending = deque()
+        self.connect_lock = asyncio.Lock()
+        self.stats = {"connections": 0, "requests": 0}
+
+    def connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def ensureConnected(self):
+        async with self.connect_lock:
+            if self.connected():
+                return
+
+            # o endereço do servidor vem da configuração atual, a menos que tenha sido fixado na sessão
+            configs = getConfig()
+            address = self.address or configs.server_address
+            port = self.port or configs.server_port
+
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(address, port), timeout=10
+            )
+            self.stats["connections"] += 1
+            self.reader_task = asyncio.create_task(self.readLoop(self.reader))
+            loggerDebug("Sessão com o Rendezvous aberta (%s:%s).", address, port)
+
+    async def readLoop(self, reader):
+        # cada linha recebida responde ao pedido mais antigo ainda pendente
+        error = ConnectionResetError("Conexão com o Rendezvous encerrada.")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                line = line.strip()
+                if not line:
+                    continue
+
+                try:
+                    response = codec.decode(line)
+                except codec.DecodeError as e:
+                    error = e
+                    break
+
+                if not self.pending:
+                    loggerWarning(f"Resposta inesperada do Rendezvous: {response}")
+                    continue
+
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_result(response)
+
+        except Exception as e:
+            error = e
+        finally:
+            if self.reader is reader:
+                self.reset(error)
+
+    def reset(self, error):
+        # descarta a conexão atual e falha os pedidos pendentes (que serão refeitos numa nova conexão)
+        writer = self.writer
+        self.reader = None
+        self.writer = None
+
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+        if self.reader_task is not None and self.reader_task is not asyncio.current_task():
+            self.reader_task.cancel()
+        self.reader_task = None
+
+        if writer is not None:
+            writer.close()
+
+    async def request(self, message: dict, timeout=10, retries=1):
+        # envia um pedido e espera a resposta; em caso de falha de conexão, reconecta e tenta de novo
+        data = codec.encode(message)
+        labels = (str(message.get("type")),)
+        start_time = time.perf_counter()
+
+        for attempt in range(retries + 1):
+            try:
+                await self.ensureConnected()
+
+                future = asyncio.get_running_loop().create_future()
+                self.pending.append(future)
+                self.writer.write(data)
+                self.stats["requests"] += 1
+
+                await self.writer.drain()
+                response = await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+                registry.observe(RENDEZVOUS_SECONDS, time.perf_counter() - start_time, labels)
+                return response
+
+            except asyncio.TimeoutError:
+                # sem resposta a tempo, a ordem das respostas na conexão não é mais confiável
+                registry.inc(RENDEZVOUS_FAILURES, labels)
+                self.reset(ConnectionResetError("Timeout esperando resposta do Rendezvous."))
+                raise
+
+            except (OSError, codec.DecodeError) as e:
+                if self.connected():
+                    self.reset(e)
+                if attempt == retries:
+                    registry.inc(RENDEZVOUS_FAILURES, labels)
+                    raise
+                loggerDebug("Reconectando ao Rendezvous após falha: %s", e)
+
+    async def close(self):
+        writer = self.writer
+        self.reset(ConnectionResetError("Sessão com o Rendezvous encerrada."))
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+_session = None
+
+def getSession() -> RendezvousSession:
+    global _session
+    if _session is None:
+        _session = RendezvousSession()
+    return _session
+
+async def closeSession():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
 
 async def registerPeer(peerName, peerNamespace, port):
     # cria a mensagem de registro em JSON
     jsonString = {
         "type" : "REGISTER",
-        "namespace" : peerNamespace, 
-        "name" : peerName, 
-        "port" : port, 
+        "namespace" : peerNamespace,
+        "name" : peerName,
+        "port" : port,
         "ttl" : 7200
     }
-    message = json.dumps(jsonString) + '\n'
-
-    # abre conexão com o servidor Rendezvous usando os parâmetros do config.json
-    with open("config.json", "r") as configFile:
-        configs = json.load(configFile)
-    reader, writer = await asyncio.open_connection(configs["server_address"], configs["server_port"])
-
-    writer.write(message.encode('UTF-8'))
-    await writer.drain()
 
     try:
-        # espera a resposta do servidor com timeout de 10 segundos e retorna o status do registro
-        response = await asyncio.wait_for(reader.read(32000), timeout=10)
-
-        responseMsg = response.decode('UTF-8')
-        responseMsg = responseMsg.strip()
-
-        responseMsg = json.loads(responseMsg)
-
-        if responseMsg["status"] == "OK":
-            return True
-        else:
-            return False
+        # envia pela sessão persistente e espera a resposta com timeout de 10 segundos
+        responseMsg = await getSession().request(jsonString)
+        return responseMsg.get("status") == "OK"
 
-    except TimeoutError as error:
+    except (OSError, asyncio.TimeoutError, codec.DecodeError) as error:
         loggerError("Não foi possível se conectar ao servidor!", error)
-
-    writer.close()
-    await writer.wait_closed()
+        return False
 
 
 async def unregister(namespace, peer, port):
@@ -51,78 +176,41 @@ async def unregister(namespace, peer, port):
         "port": port,
         "ttl": 7200
     }
-    message = json.dumps(json_dict) + '\n'
-
-    # abre conexão com o servidor Rendezvous usando os parâmetros do config.json
-    with open("config.json", "r") as configFile:
-        configs = json.load(configFile)
-    reader, writer = await asyncio.open_connection(configs["server_address"], configs["server_port"])
-
-    writer.write(message.encode('UTF-8'))
-    await writer.drain()
 
     try:
-        # espera a resposta do servidor com timeout de 10 segundos e retorna o status do unregister
-        response = await asyncio.wait_for(reader.read(32000), timeout=10)
-        responseMsg = response.decode('UTF-8').strip()
-        responseJson = json.loads(responseMsg)
+        # envia pela sessão persistente e retorna o status do unregister
+        responseJson = await getSession().request(json_dict)
         return responseJson.get("status") == "OK"
-    except TimeoutError as error:
+
+    except asyncio.TimeoutError as error:
         loggerError("Timeout ao tentar UNREGISTER no servidor", error)
-        return False
-    finally:
-        writer.close()
-        await writer.wait_closed()
+    except (OSError, codec.DecodeError) as error:
+        loggerError("Não foi possível se conectar ao servidor!", error)
+    return False
+
 
-        
 async def discoverPeers(receiver):
     if len(receiver) > 0:
         # cria a mensagem de discover em JSON com namespace específico
         jsonString = {
-            "type" : "DISCOVER", 
+            "type" : "DISCOVER",
             "namespace" : receiver[0]
         }
-        message = json.dumps(jsonString)
-        
-        # abre conexão com o servidor Rendezvous usando os parâmetros do config.json
-        with open("config.json", "r") as configFile:
-            configs = json.load(configFile)
-        reader, writer = await asyncio.open_connection(configs["server_address"], configs["server_port"])
-
-        writer.write(message.encode('UTF-8') + b'\n')
-        await writer.drain()
-        
     else:
         # cria a mensagem de discover em JSON global
         jsonString = {"type" : "DISCOVER"}
-        message = json.dumps(jsonString)
-        
-        # abre conexão com o servidor Rendezvous usando os parâmetros do config.json
-        with open("config.json", "r") as configFile:
-            configs = json.load(configFile)
-        reader, writer = await asyncio.open_connection(configs["server_address"], configs["server_port"])
-
-        writer.write(message.encode('UTF-8') + b'\n')
-        await writer.drain()
 
     try:
         # em todo o caso, espera a resposta do servidor com timeout de 10 segundos e retorna a lista de peers
-        response = await asyncio.wait_for(reader.readline(), timeout=10)
-
-        responseMsg = response.decode('UTF-8')
-        responseMsg = responseMsg.strip()
+        responseMsg = await getSession().request(jsonString)
 
-        responseMsg = json.loads(responseMsg)
-
-        if responseMsg["status"] != "OK":
+        if responseMsg.get("status") != "OK":
             loggerError("Não foi possível se conectar ao servidor!")
             return None
 
         return responseMsg["peers"]
-    
-    except TimeoutError as error:
-            loggerError("Não foi possível se conectar ao servidor!", error)
-            
-    writer.close()
-    await writer.wait_closed()
+
+    except (OSError, asyncio.TimeoutError, codec.DecodeError) as error:
+        loggerError("Não foi possível se conectar ao servidor!", error)
+
     return None
@@ -1,260 +1,407 @@
 import asyncio
-import json
 import time
-import uuid
-from datetime import datetime
+import codec
 from logger import *
 from client import Client
-from state import updateRttTable  
+from state import updateRttTable, rttStatsFor
+from outbound_queue import OutboundQueue
+from peer_protocol import PeerProtocol
+from metrics import *
+from keep_alive import markPeerLost
+from config import getConfig
 from p2p_client import registerPeer
 
 
-async def sendHello(client: Client, reader, writer, peer_id: str):
+def negotiateFeatures(remote_features):
+    # uma feature só vale na conexão se os dois lados a anunciaram no HELLO / HELLO_OK
+    if not isinstance(remote_features, list):
+        return frozenset()
+    return frozenset(getConfig().features).intersection(remote_features)
+
+async def sendHello(client: Client, conn: PeerProtocol, peer_id: str):
+    # o handshake é sempre em JSON por linha; retorna o HELLO_OK recebido (ou None em caso de falha)
     try:
         # cria a mensagem HELLO em JSON e envia para o peer
-        with open("config.json", "r") as configsFile:
-            configs = json.load(configsFile)
+        configs = getConfig()
             
         jsonString = {
             "type" : "HELLO", 
             "peer_id" : f"{client.name}@{client.namespace}", 
-            "version" : configs["version"], 
-            "features" : configs["features"]
+            "version" : configs.version, 
+            "features" : configs.features
         }
-        message = json.dumps(jsonString)
-
-        writer.write(message.encode('UTF-8') + b'\n')
-        await writer.drain()
+        conn.write(codec.encode(jsonString))
+        await conn.drain()
 
         try:
-            # espera a resposta HELLO_OK do peer com timeout de 10 segundos, e atualiza o status da conexão (CONNECTED e outbound)
-            response = await asyncio.wait_for(reader.readline(), timeout=10)
-            if not response:
-                loggerError(f"Conexão fechada por {peer_id} durante handshake.")
-                return
-
-            responseMsg = response.decode('UTF-8').strip()
-            
-            responseMsg = json.loads(responseMsg)
-
-            if responseMsg["type"] == "HELLO_OK":
-                client.peersConnected[peer_id]["status"] = "CONNECTED"
-                client.outbound.add(peer_id)
+            # espera a resposta HELLO_OK do peer com timeout de 10 segundos
+            responseMsg = await asyncio.wait_for(conn.nextMessage(), timeout=10)
+            if responseMsg is None:
+                # o peer recusa a conexão duplicada fechando o socket durante o handshake (ver keepsNewConnection)
+                record = client.peersConnected.get(peer_id)
+                if record is not None and record.connected():
+                    loggerDebug("Conexão duplicada com %s recusada pelo peer; mantida a conexão existente", peer_id)
+                else:
+                    loggerError(f"Conexão fechada por {peer_id} durante handshake.")
+                return None
+
+            if responseMsg.get("type") == "HELLO_OK":
+                registry.observe(HANDSHAKE_SECONDS, time.perf_counter() - conn.connected_at, ("outbound",))
                 loggerInfo(f"Handshake concluído com sucesso: {peer_id}")
+                return responseMsg
 
         except asyncio.TimeoutError:
             loggerError(f"Timeout: Não recebeu HELLO_OK de {peer_id}")
             
     except Exception as e:
         loggerError(f"Erro ao enviar HELLO para {peer_id}", e)
+    return None
+
+async def connectToPeer(client: Client, peer_id: str):
+    # estabelece a conexão OUTBOUND com um peer (TCP + HELLO / HELLO_OK) e já inicia a escuta
+    peer_data = client.peersConnected.get(peer_id)
+    if peer_data is None or peer_data.status != "WAITING":
+        return False
 
-async def sendHelloOk(peer_id: str, reader, writer):
+    conn = None
     try:
-        # cria a mensagem HELLO_OK em JSON e envia para o peer, quando recebe HELLO na rotina handle_incoming_connection()
-        with open("config.json", "r") as configsFile:
-            configs = json.load(configsFile)
-        
-        # cria a mensagem HELLO_OK em JSON e envia para o peer
-        jsonString = {
-            "type" : "HELLO_OK", 
-            "peer_id" : peer_id, 
-            "version" : configs["version"], 
-            "features" : configs["features"]
-        }
-        message = json.dumps(jsonString)
+        _, conn = await asyncio.wait_for(
+            asyncio.get_running_loop().create_connection(PeerProtocol, peer_data.address, peer_data.port),
+            timeout=5.0
+        )
+
+        hello_ok = await sendHello(client, conn, peer_id)
+        if hello_ok is None:
+            conn.close()
+            if peer_data.connected():
+                return True
+            registry.inc(HANDSHAKE_FAILURES, ("outbound",))
+            dialFailed(client, peer_data)
+            return False
+
+        # o peer pode ter conectado em nós enquanto discávamos: só uma das duas conexões fica
+        if not keepsNewConnection(client, peer_data, "outbound"):
+            loggerInfo(f"Conexão duplicada com {peer_id}: mantida a conexão INBOUND")
+            conn.close()
+            return True
+
+        # atualiza o 'writer' (a própria conexão) e a fila de saída na tabela de peers conectados
+        features = negotiateFeatures(hello_ok.get("features"))
+        outq = OutboundQueue(conn, peer_id, getConfig().outbound_queue_size, features).start()
+        replaced = peer_data.outq if peer_data.connected() else None
+        peer_data.writer = conn
+        peer_data.outq = outq
+        peer_data.status = "CONNECTED"
+        peer_data.direction = "outbound"
+        if replaced is not None:
+            loggerInfo(f"Conexão duplicada com {peer_id}: mantida a conexão OUTBOUND")
+            replaced.close()
+        if client.keepalive:
+            client.keepalive.track(peer_id)
+        if client.reconnector:
+            client.reconnector.peerConnected(peer_id)
+        if client.shard:
+            client.shard.peerConnected(peer_id, "outbound")
+        listenToPeer(client, conn, peer_id, outq)
+        return True
+
+    except (OSError, asyncio.TimeoutError) as e:
+        loggerError(f"Falha ao conectar com {peer_id}", e)
+    except Exception as e:
+        loggerError(f"Erro inesperado ao conectar com {peer_id}", e)
+
+    if conn is not None:
+        conn.close()
+    dialFailed(client, peer_data)
+    return False
+
+def dialFailed(client: Client, record):
+    # peer que não atendeu a primeira discagem passa para o gerenciador de reconexão (backoff com jitter);
+    # as tentativas do próprio gerenciador já tratam a falha por conta própria
+    if client.reconnector is None or record.status != "WAITING" or record.peer_id in client.reconnector.dialing:
+        return
+    record.status = "LOST"
+    client.reconnector.peerLost(record.peer_id)
 
-        writer.write(message.encode('UTF-8') + b'\n')
-        await writer.drain()
+async def connectPeers(client: Client, peer_ids):
+    # conecta com vários peers ao mesmo tempo, limitando a quantidade de conexões simultâneas
+    limit = getConfig().max_concurrent_connections
+
+    if client.connect_semaphore is None:
+        client.connect_semaphore = asyncio.Semaphore(limit)
+
+    # evita discar duas vezes para o mesmo peer enquanto a tentativa anterior não terminou
+    peer_ids = [peer for peer in peer_ids if peer not in client.connecting]
+    client.connecting.update(peer_ids)
+
+    async def worker(peer_id):
+        try:
+            async with client.connect_semaphore:
+                return await connectToPeer(client, peer_id)
+        finally:
+            client.connecting.discard(peer_id)
+
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*(worker(peer) for peer in peer_ids), return_exceptions=True)
+    elapsed = time.perf_counter() - start_time
+
+    connected = sum(1 for result in results if result is True)
+
+    # a primeira rodada de conexões define o tempo de formação da malha
+    if client.mesh_formation_time is None:
+        client.mesh_formation_time = elapsed
+        loggerInfo(f"Malha formada em {elapsed:.2f}s: {connected}/{len(peer_ids)} peers conectados (limite {limit})")
+    else:
+        loggerDebug("Rodada de conexões em %.2fs: %d/%d peers conectados", elapsed, connected, len(peer_ids))
+
+    return connected
+
+def keepsNewConnection(client: Client, record, direction: str):
+    # desempate determinístico entre duas conexões com o mesmo peer (os dois discaram ao mesmo tempo):
+    # fica a conexão discada pelo menor peer_id, então os dois lados escolhem a mesma sem trocar mensagens.
+    # uma nova conexão na mesma direção da atual substitui a antiga (o peer reiniciou ou reconectou)
+    if not record.connected() or record.direction == direction:
+        return True
+    my_id = f"{client.name}@{client.namespace}"
+    dialer = my_id if direction == "outbound" else record.peer_id
+    return dialer == min(my_id, record.peer_id)
+
+def helloOkPacket(peer_id: str):
+    configs = getConfig()
+
+    # cria a mensagem HELLO_OK em JSON
+    return {
+        "type" : "HELLO_OK", 
+        "peer_id" : peer_id, 
+        "version" : configs.version, 
+        "features" : configs.features
+    }
+
+async def sendHelloOk(peer_id: str, conn: PeerProtocol):
+    try:
+        # envia o HELLO_OK para o peer, quando recebe HELLO na rotina handle_incoming_connection()
+        conn.write(codec.encode(helloOkPacket(peer_id)))
+        await conn.drain()
 
     except Exception as e:
         loggerError(f"Erro ao enviar HELLO_OK para {peer_id}", e)
 
-async def handle_incoming_connection(reader, writer, client: Client):
-    addr = writer.get_extra_info('peername')
+def acceptPeer(client: Client):
+    # fábrica de protocolos para o servidor P2P: cada conexão recebida começa pelo handshake INBOUND
+    def onConnect(conn: PeerProtocol):
+        asyncio.create_task(handle_incoming_connection(conn, client))
+    return PeerProtocol(on_connect=onConnect)
+
+async def handle_incoming_connection(conn: PeerProtocol, client: Client):
+    addr = conn.get_extra_info('peername')
     
     try:
         # rotina para tratar das tentativas de conexão INBOUND de outros peers
-        data = await asyncio.wait_for(reader.readline(), timeout=10.0)
-        if not data:
-            writer.close()
-            await writer.wait_closed()
+        msg = await asyncio.wait_for(conn.nextMessage(), timeout=10.0)
+        if msg is None or msg.get("type") != "HELLO":
+            registry.inc(HANDSHAKE_FAILURES, ("inbound",))
+            conn.close()
             return
 
-        msg = json.loads(data.decode('UTF-8').strip())
+        remote_peer_id = msg.get("peer_id")
 
-        if msg.get("type") != "HELLO":
-            writer.close()
-            await writer.wait_closed()
+        # com uma conexão OUTBOUND já ativa para o mesmo peer, só uma das duas fica; a perdedora é
+        # recusada fechando o socket antes do HELLO_OK
+        record = client.peersConnected.get(remote_peer_id)
+        if record is not None and not keepsNewConnection(client, record, "inbound"):
+            loggerInfo(f"Conexão duplicada com {remote_peer_id}: mantida a conexão OUTBOUND")
+            conn.close()
             return
 
-        remote_peer_id = msg.get("peer_id")
-        
         # caso o peer não esteja na tabela, adiciona com status CONNECTED, caso contrário, atualiza o 'writer' e status
-        if remote_peer_id not in client.peersConnected:
-            client.peersConnected[remote_peer_id] = {
-                "address": addr[0],
-                "port": addr[1],
-                "status": "CONNECTED",
-                "writer": writer
-            }
-        else:
-            client.peersConnected[remote_peer_id]["writer"] = writer
-            client.peersConnected[remote_peer_id]["status"] = "CONNECTED"
-
-        # adiciona o peer à lista de conexões INBOUND (recebidas)
-        client.inbound.add(remote_peer_id)
+        # o framing negociado vale a partir do primeiro frame depois do HELLO_OK
+        features = negotiateFeatures(msg.get("features"))
+        outq = OutboundQueue(conn, remote_peer_id, getConfig().outbound_queue_size, features)
+        if record is None:
+            record = client.peersConnected.add(remote_peer_id, addr[0], addr[1])
+        replaced = record.outq if record.connected() else None
+        record.writer = conn
+        record.outq = outq
+        record.status = "CONNECTED"
+
+        # marca o peer como conexão INBOUND (recebida)
+        record.direction = "inbound"
+
+        # a conexão anterior (a OUTBOUND perdedora, ou a INBOUND antiga de um peer que reiniciou) é encerrada
+        if replaced is not None:
+            loggerInfo(f"Conexão anterior com {remote_peer_id} substituída pela nova conexão INBOUND")
+            replaced.close()
 
         # envia a mensagem HELLO_OK como resposta para finalizar a tentativa de conexão com sucesso
-        await sendHelloOk(remote_peer_id, reader, writer)
-        loggerInfo(f"Conexão INBOUND estabelecida com {remote_peer_id}")
-        asyncio.create_task(listenToPeer(client, reader, remote_peer_id, writer))
+        await sendHelloOk(remote_peer_id, conn)
+        registry.observe(HANDSHAKE_SECONDS, time.perf_counter() - conn.connected_at, ("inbound",))
+        outq.start()
+        loggerInfo(f"Conexão INBOUND estabelecida com {remote_peer_id} (features: {', '.join(sorted(features)) or 'nenhuma'})")
+        if client.keepalive:
+            client.keepalive.track(remote_peer_id)
+        if client.reconnector:
+            client.reconnector.peerConnected(remote_peer_id)
+        if client.shard:
+            client.shard.peerConnected(remote_peer_id, "inbound")
+        listenToPeer(client, conn, remote_peer_id, outq)
 
     except Exception as e:
+        registry.inc(HANDSHAKE_FAILURES, ("inbound",))
         loggerError(f"Erro no handshake INBOUND com {addr}", e)
-        writer.close()
-        await writer.wait_closed()
+        conn.close()
 
-async def listenToPeer(client: Client, reader, peer_id: str, writer):
+def reply(outq: OutboundQueue, frame: bytes, msg_type: str):
+    # responde sem esperar quando há espaço na fila de saída; com a fila cheia, devolve a espera
+    # para o transporte, que pausa a leitura do socket até a resposta ser enfileirada
     try:
-        while True:
-            # tenta ler mensagens do peer conectado
-            data = await reader.readline()
-            if not data:
-                loggerWarning(f"Conexão fechada pelo peer {peer_id}")
-                break
-            
-            msg_str = data.decode('UTF-8').strip()
-            if not msg_str:
-                continue
-                
-            try:
-                msg = json.loads(msg_str)
-            except json.JSONDecodeError:
-                loggerWarning(f"Mensagem inválida recebida de {peer_id}")
-                continue
-
-            msg_type = msg.get("type")
-
-            # trata os diferentes tipos de mensagens recebidas
-            if msg_type == "HELLO":
-                await sendHelloOk(peer_id, reader, writer)
-
-            elif msg_type == "PING":
-                pong_packet = {
-                    "type": "PONG",
-                    "msg_id": msg["msg_id"],
-                    "timestamp": time.time(),
-                    "ttl": 1
-                }
-                writer.write((json.dumps(pong_packet) + '\n').encode('UTF-8'))
-                await writer.drain()
-
-            elif msg_type == "PONG":
-                msg_id = msg.get("msg_id")
-                
-                # caso esteja recebendo um PONG, calcula o RTT e atualiza a tabela de RTTs
-                if hasattr(client, "ping_timestamps") and msg_id in client.ping_timestamps:
-                    start_time = client.ping_timestamps.pop(msg_id)
-                    end_time = time.time()
-                    
-                    rtt_ms = (end_time - start_time) * 1000
-                    
-                    my_id = f"{client.name}@{client.namespace}"
-                    await updateRttTable(rtt_ms, (my_id, peer_id), client)
-                    
-                    loggerDebug(f"RTT atualizado para {peer_id}: {rtt_ms:.2f}ms")
-
-            elif msg_type == "SEND":
-                # no SEND, trata da emissão de ACKs e exibição da mensagem
-                print(f"\n[DM de {msg.get('src', '?')}]: {msg.get('payload', '')}")
-                
-                if msg.get("require_ack", False):
-                    ack_packet = {
-                        "type": "ACK",
-                        "msg_id": msg["msg_id"],
-                        "timestamp": datetime.now().isoformat(),
-                        "ttl": 1
-                    }
-                    writer.write((json.dumps(ack_packet) + '\n').encode('UTF-8'))
-                    await writer.drain()
-
-            elif msg_type == "PUB":
-                # no PUB, apenas exibe a mensagem pública
-                print(f"\n[PUB {msg.get('dst')} de {msg.get('src')}]: {msg.get('payload')}")
-
-            elif msg_type == "ACK":
-                # no ACK, verifica se há uma espera por esse ACK e a completa
-                ack_id = msg.get("msg_id")
-                if ack_id in client.pending_acks:
-                    future = client.pending_acks[ack_id]
-                    if not future.done():
-                        future.set_result(True)
-            
-            elif msg_type == "BYE":
-                # ao receber BYE, envia BYE_OK e encerra a conexão
-                loggerInfo(f"Recebido BYE de {peer_id}. Encerrando conexão.")
-                bye_packet = {
-                    "type": "BYE_OK",
-                    "msg_id": str(uuid.uuid4()),
-                    "timestamp": datetime.now().isoformat(),
-                    "ttl": 1,
-                    "src": f"{client.name}@{client.namespace}",
-                    "dest": peer_id,
-                }
-                writer.write((json.dumps(bye_packet) + '\n').encode('UTF-8'))
-                await writer.drain()
+        outq.sendNowait(frame, msg_type)
+    except asyncio.QueueFull:
+        return outq.send(frame, msg_type=msg_type)
+    except ConnectionResetError:
+        pass
+    return None
+
+def sendAck(outq: OutboundQueue, msg_id: str):
+    # com a feature "ackbatch" o ACK entra no lote da conexão; sem ela, sai um ACK por mensagem
+    if outq.acks is not None:
+        return outq.acks.add(msg_id)
+    return reply(outq, codec.encodeAck(msg_id, outq.binary), "ACK")
+
+# handlers das mensagens recebidas de um peer: (client, peer_id, outq, msg) -> None ou awaitable
+
+def handleHello(client: Client, peer_id: str, outq: OutboundQueue, msg: dict):
+    return reply(outq, codec.encode(helloOkPacket(peer_id), outq.binary), "HELLO_OK")
+
+def handlePing(client: Client, peer_id: str, outq: OutboundQueue, msg: dict):
+    return reply(outq, codec.encodePong(msg.get("msg_id"), time.time(), outq.binary), "PONG")
+
+def handlePong(client: Client, peer_id: str, outq: OutboundQueue, msg: dict):
+    msg_id = msg.get("msg_id")
+
+    # caso esteja recebendo um PONG de um PING pendente, calcula o RTT e atualiza a tabela de RTTs
+    rtt_ms = rttStatsFor(client, peer_id).pongReceived(msg_id, time.time())
+    if rtt_ms is not None:
+        my_id = f"{client.name}@{client.namespace}"
+        updateRttTable(rtt_ms, (my_id, peer_id), client)
+        loggerDebug("RTT atualizado para %s: %.2fms", peer_id, rtt_ms)
+
+def spoofed(peer_id: str, msg: dict):
+    # com ttl 1 a mensagem vem direto de quem a escreveu: um 'src' diferente do peer da conexão (autenticado
+    # no HELLO) é descartado, senão um peer poderia se passar por outro e queimar os ids dele no dedup
+    if msg.get("src") == peer_id:
+        return False
+    loggerWarning(f"{msg.get('type')} de {peer_id} com src {msg.get('src')!r} descartado")
+    return True
+
+def isDuplicate(client: Client, peer_id: str, msg: dict):
+    # mensagens já recebidas (retransmissões) não são entregues de novo; a chave é o peer da conexão
+    msg_id = msg.get("msg_id")
+    if client.dedup is None or msg_id is None:
+        return False
+    if client.dedup.seen(peer_id, msg_id):
+        registry.inc(DUPLICATES, (msg.get("type"),))
+        loggerDebug("Mensagem duplicada %s de %s descartada", msg_id, peer_id)
+        return True
+    return False
+
+def handleSend(client: Client, peer_id: str, outq: OutboundQueue, msg: dict):
+    # no SEND, trata da emissão de ACKs e exibição da mensagem; duplicatas são confirmadas de novo
+    # (o ACK anterior pode ter se perdido) mas não são exibidas
+    if spoofed(peer_id, msg):
+        return None
+    if not isDuplicate(client, peer_id, msg):
+        print(f"\n[DM de {peer_id}]: {msg.get('payload', '')}")
+
+    if msg.get("require_ack", False):
+        return sendAck(outq, msg.get("msg_id"))
+    return None
+
+def handlePub(client: Client, peer_id: str, outq: OutboundQueue, msg: dict):
+    # no PUB, apenas exibe a mensagem pública
+    if not spoofed(peer_id, msg) and not isDuplicate(client, peer_id, msg):
+        print(f"\n[PUB {msg.get('dst')} de {peer_id}]: {msg.get('payload')}")
+
+def handleAck(client: Client, peer_id: str, outq: OutboundQueue, msg: dict):
+    # no ACK, libera as mensagens correspondentes da janela de envio (ACKs repetidos ou atrasados são ignorados);
+    # um ACK em lote traz a lista "msg_ids" no lugar de "msg_id"
+    if client.sender is None:
+        return
 
-                client.removePeer(peer_id)
-                break
+    msg_ids = msg.get("msg_ids")
+    if isinstance(msg_ids, list):
+        for msg_id in msg_ids:
+            client.sender.ackReceived(msg_id, peer_id)
+    else:
+        client.sender.ackReceived(msg.get("msg_id"), peer_id)
+
+def handleBye(client: Client, peer_id: str, outq: OutboundQueue, msg: dict):
+    # ao receber BYE, envia BYE_OK e encerra a conexão
+    loggerInfo(f"Recebido BYE de {peer_id}. Encerrando conexão.")
+    return closeAfterByeOk(client, peer_id, outq)
+
+async def closeAfterByeOk(client: Client, peer_id: str, outq: OutboundQueue):
+    bye_packet = {
+        "type": "BYE_OK",
+        "msg_id": codec.newMsgId(),
+        "timestamp": codec.isoNow(),
+        "ttl": 1,
+        "src": f"{client.name}@{client.namespace}",
+        "dest": peer_id,
+    }
+    try:
+        # confirma os SENDs ainda no lote de ACKs antes do BYE_OK
+        if outq.acks is not None:
+            pending = outq.acks.flush()
+            if pending is not None:
+                await pending
 
-    except (ConnectionResetError, asyncio.IncompleteReadError):
-        loggerWarning(f"Conexão perdida com {peer_id}")
-    except Exception as e:
-        loggerError(f"Erro escutando peer {peer_id}", e)
+        await outq.send(codec.encode(bye_packet, outq.binary), wait=True, msg_type="BYE_OK")
     finally:
-        if peer_id in client.peersConnected:
-             pass
-
-async def pingPeers(client: Client):
-    while True:
-        if not hasattr(client, "ping_timestamps"):
-            # inicializa o dicionário de timestamps de ping se não existir
-            client.ping_timestamps = {}
-
-        for peer_id, data in list(client.peersConnected.items()):
-            is_outbound = peer_id in client.outbound
-            # envia PING apenas para peers das conexoes outbound conectados
-            if is_outbound and data.get("status") == "CONNECTED" and "writer" in data and data["writer"]:
-                try:
-                    msg_id = str(uuid.uuid4())
-                    current_time = time.time()
-                    
-                    # registra o timestamp do ping para cálculo de RTT ao receber o PONG
-                    client.ping_timestamps[msg_id] = current_time
-                    
-                    packet = {
-                        "type": "PING",
-                        "msg_id": msg_id,
-                        "timestamp": current_time,
-                        "ttl": 1
-                    }
-                    
-                    data["writer"].write((json.dumps(packet) + '\n').encode('UTF-8'))
-                    await data["writer"].drain()
-                    
-                except Exception as e:
-                    loggerWarning(f"Falha ao enviar PING para {peer_id}: {e}")
-                    client.ping_timestamps.pop(msg_id, None)
-
-        with open("config.json", "r") as configFile:
-            config = json.load(configFile)
-            ping_timer = config['ping_timer']
-        await asyncio.sleep(ping_timer)
-        config.close()
-        return
+        # só marca o peer como CLOSED se esta ainda for a conexão registrada na tabela
+        record = client.peersConnected.get(peer_id)
+        if record is not None and record.outq is outq:
+            client.removePeer(peer_id)
+        outq.writer.stop()
+
+MESSAGE_HANDLERS = {
+    "HELLO": handleHello,
+    "PING": handlePing,
+    "PONG": handlePong,
+    "SEND": handleSend,
+    "PUB": handlePub,
+    "ACK": handleAck,
+    "BYE": handleBye,
+}
+
+def listenToPeer(client: Client, conn: PeerProtocol, peer_id: str, outq: OutboundQueue):
+    # passa a entregar os frames da conexão (no framing negociado) para a tabela de handlers;
+    # não há tarefa de leitura: o transporte chama o handler a cada frame completo
+    frames = conn.frames
+
+    def dispatch(msg):
+        msg_type = msg.get("type")
+        if registry.enabled:
+            labels = (str(msg_type), peer_id)
+            registry.inc(FRAMES_IN, labels)
+            registry.inc(BYTES_IN, labels, frames.frame_size)
+
+        handler = MESSAGE_HANDLERS.get(msg_type)
+        if handler is None:
+            return None
+        return handler(client, peer_id, outq, msg)
+
+    def onClose():
+        # só altera o estado do peer se esta ainda for a conexão registrada na tabela
+        record = client.peersConnected.get(peer_id)
+        if record is not None and record.outq is outq and record.status == "CONNECTED":
+            loggerWarning(f"Conexão fechada pelo peer {peer_id}")
+            markPeerLost(client, peer_id)
+        outq.close()
+
+    conn.start(peer_id, dispatch, onClose, outq.binary, client.peersConnected.get(peer_id))
 
 async def reconnectPeers(client: Client):
-    # rotina para forçar a reconexão com todos os peers conectados (backoff exponencial)
+    # rotina para forçar a reconexão com todos os peers conectados
     print("\n🔄 Iniciando protocolo de reconexão forçada...")
     loggerInfo("Usuário solicitou /reconnect.")
 
@@ -267,55 +414,76 @@ async def reconnectPeers(client: Client):
     except Exception as e:
         print(f"❌ Erro ao conectar ao servidor: {e}")
 
+    closed_count = await resetConnections(client)
+
+    print(f"⚠️ {closed_count} conexões foram reiniciadas.")
+    print("⏳ O sistema tentará reconectar automaticamente em instantes.\n")
+
+async def resetConnections(client: Client):
+    # fecha todas as conexões e deixa os peers anunciados no Rendezvous para o gerenciador de reconexão;
+    # retorna quantas conexões foram reiniciadas
     closed_count = 0
-    
-    for peer_id, data in list(client.peersConnected.items()):
-        
-        # reseta o estado de cada peer para forçar nova conexão, por meio de um backoff exponencial
-        exponential_backoff = 1
-        if data.get("writer"):
-            while True:
-                try:
-                    data["writer"].close()
-                    await data["writer"].wait_closed()
-                    break
-                except Exception as e:
-                    loggerWarning(f"Erro ao fechar socket de {peer_id}, tentando novamente: {e}")
-                    await asyncio.sleep(exponential_backoff * 10)
-                    exponential_backoff = min(exponential_backoff * 2, 40)  # limita o backoff máximo a 40 segundos
-
-        data["writer"] = None
-        data["status"] = "WAITING"
+    writers = []
+
+    for data in list(client.peersConnected.values()):
+        # fecha a conexão de cada peer e o marca como perdido para forçar uma nova conexão
+        if data.writer:
+            writers.append(data.writer)
+        if data.outq:
+            data.outq.close()
+
+        data.writer = None
+        data.outq = None
+        data.status = "LOST"
+        data.direction = None
+        if client.shard:
+            client.shard.peerLost(data.peer_id)
 
         closed_count += 1
 
-    client.outbound.clear()
-    client.inbound.clear()
-    
+    # espera os sockets fecharem em paralelo
+    await asyncio.gather(*(asyncio.wait_for(writer.wait_closed(), timeout=2.0) for writer in writers), return_exceptions=True)
+
     if hasattr(client, 'rtt_table'):
             client.rtt_table.clear()
 
-    print(f"⚠️ {closed_count} conexões foram reiniciadas.")
-    print("⏳ O sistema tentará reconectar automaticamente em instantes.\n")
+    # os peers anunciados no Rendezvous são rediscados pelo gerenciador de reconexão, cada um com seu
+    # backoff com jitter (o discover só dispara conexões para deltas)
+    if client.reconnector:
+        for peer_id in client.discovered:
+            if peer_id in client.peersConnected:
+                client.reconnector.peerLost(peer_id)
+
+    return closed_count
 
 async def sendBye(client: Client):
     # envia mensagem de BYE para todos os peers conectados antes de sair
     print("\n👋 Enviando mensagens de BYE para peers conectados...")
-    
-    for peer_id, data in list(client.peersConnected.items()):
-        if data.get("status") == "CONNECTED" and "writer" in data and data["writer"]:
+
+    # a partir daqui o fechamento das conexões (BYE_OK do outro lado) não é perda: sem reconexão
+    if client.reconnector:
+        client.reconnector.stop()
+    records = list(client.peersConnected.select(status="CONNECTED"))
+    for data in records:
+        client.removePeer(data.peer_id)
+
+    for data in records:
+        peer_id = data.peer_id
+        if data.outq:
             try:
                 bye_packet = {
                     "type": "BYE",
-                    "msg_id": str(uuid.uuid4()),
-                    "timestamp": datetime.now().isoformat(),
+                    "msg_id": codec.newMsgId(),
+                    "timestamp": codec.isoNow(),
                     "ttl": 1,
                     "src": f"{client.name}@{client.namespace}",
                     "dest": peer_id,
                     "reason": "Encerrando conexão"
                 }
-                data["writer"].write((json.dumps(bye_packet) + '\n').encode('UTF-8'))
-                await data["writer"].drain()
+                await asyncio.wait_for(
+                    data.outq.send(codec.encode(bye_packet, data.outq.binary), wait=True, msg_type="BYE"),
+                    timeout=2.0
+                )
                 loggerInfo(f"Mensagem BYE enviada para {peer_id}")
             except Exception as e:
                 loggerWarning(f"Falha ao enviar BYE para {peer_id}: {e}")
@@ -1,36 +1,73 @@
+import time
 from logger import *
+from config import getConfig
 
 async def updatePeerList(client, peerList):
-    
-    current_server_peers = set()
+    # aplica a resposta do DISCOVER como deltas (adicionados, alterados, removidos) em relação ao último discover
+    now = time.monotonic()
+    min_interval = getConfig().discovery_min_interval
+    my_id = f"{client.name}@{client.namespace}"
 
+    current_server_peers = {}
     for peer in peerList:
-        # atualiza ou adiciona cada peer da lista do servidor (ignorando a si mesmo)
+        # ignora a si mesmo
         if peer["name"] == client.name and peer["namespace"] == client.namespace:
             continue
 
         peer_id = f"{peer['name']}@{peer['namespace']}"
-        current_server_peers.add(peer_id)
+        current_server_peers[peer_id] = (peer["ip"], peer["port"])
 
-        if peer_id in client.peersConnected:
-            client.peersConnected[peer_id]["address"] = peer["ip"]
-            client.peersConnected[peer_id]["port"] = peer["port"]
-            
+        # guarda quando o registro do peer expira no Rendezvous, só quando o servidor informa o tempo restante
+        # ("ttl" é o TTL inteiro do registro); registros já vencidos não entram
+        expires_in = peer.get("expires_in")
+        if isinstance(expires_in, (int, float)) and not isinstance(expires_in, bool) and expires_in > 0:
+            client.peer_expiry[peer_id] = now + max(expires_in, min_interval)
         else:
-            loggerInfo(f"Novo peer descoberto: {peer_id}")
-            client.peersConnected[peer_id] = {
-                "address": peer["ip"],
-                "port": peer["port"],
-                "status": "WAITING",
-                "writer": None
-            }
-
-    local_peers = list(client.peersConnected.keys())
-    
-    for peer_id in local_peers:
+            client.peer_expiry.pop(peer_id, None)
+
+    previous = client.discovered
+    added = [peer_id for peer_id in current_server_peers if peer_id not in previous]
+    removed = [peer_id for peer_id in previous if peer_id not in current_server_peers]
+    changed = [
+        peer_id for peer_id, address in current_server_peers.items()
+        if peer_id in previous and previous[peer_id] != address
+    ]
+    client.discovered = current_server_peers
+
+    for peer_id in added:
+        ip, port = current_server_peers[peer_id]
+        if peer_id in client.peersConnected:
+            # peer já conhecido por uma conexão INBOUND, apenas atualiza o endereço anunciado
+            client.peersConnected[peer_id].address = ip
+            client.peersConnected[peer_id].port = port
+            continue
+
+        loggerInfo(f"Novo peer descoberto: {peer_id}")
+        client.peersConnected.add(peer_id, ip, port, "WAITING")
+
+    for peer_id in changed:
+        ip, port = current_server_peers[peer_id]
+        loggerDebug("Endereço de %s alterado para %s:%s", peer_id, ip, port)
+        if peer_id in client.peersConnected:
+            client.peersConnected[peer_id].address = ip
+            client.peersConnected[peer_id].port = port
+
+    for peer_id in removed:
         # caso algum peer local não esteja mais no servidor, remove-o da lista local
-        if peer_id not in current_server_peers:
-            if client.peersConnected[peer_id]["status"] != "CONNECTED":
-                loggerDebug(f"Removendo peer obsoleto: {peer_id}")
-                del client.peersConnected[peer_id]
-                
\ No newline at end of file
+        client.peer_expiry.pop(peer_id, None)
+        if peer_id in client.peersConnected and client.peersConnected[peer_id].status != "CONNECTED":
+            loggerDebug("Removendo peer obsoleto: %s", peer_id)
+            del client.peersConnected[peer_id]
+
+    added = [peer_id for peer_id in added if peer_id != my_id]
+    return added, changed, removed
+
+def nextExpiry(client):
+    # instante (time.monotonic) em que o registro conhecido mais próximo de expirar fica obsoleto; prazos que
+    # já passaram saem da tabela (senão prenderiam o discover no intervalo mínimo)
+    now = time.monotonic()
+    for peer_id in [peer_id for peer_id, expiry in client.peer_expiry.items() if expiry <= now]:
+        del client.peer_expiry[peer_id]
+    if not client.peer_expiry:
+        return None
+    return min(client.peer_expiry.values())
@@ -0,0 +1,176 @@
+import asyncio
+import time
+import codec
+from logger import *
+
+class PeerProtocol(asyncio.Protocol):
+    # transporte de uma conexão entre peers baseado em asyncio.Protocol: os frames são separados direto
+    # de um bytearray reaproveitado (sem StreamReader) e entregues ao handler da conexão.
+    # também faz o papel de 'writer' (write / writelines / drain / close) para a OutboundQueue
+    def __init__(self, on_connect=None):
+        self.on_connect = on_connect
+        self.transport = None
+        self.peer_id = None
+        self.frames = codec.FrameBuffer()
+        self.handler = None
+        self.on_close = None
+        self.record = None
+        self.waiter = None
+        self.drain_waiter = None
+        self.paused = False
+        self.closed = False
+        self.closed_future = asyncio.get_running_loop().create_future()
+        self.connected_at = 0.0
+
+    # ---- eventos do transporte ----
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.connected_at = time.perf_counter()
+        if self.on_connect is not None:
+            self.on_connect(self)
+
+    def data_received(self, data):
+        # qualquer tráfego recebido conta como sinal de vida para o keep-alive (uma vez por bloco, não por frame)
+        if self.record is not None:
+            self.record.last_seen = time.monotonic()
+
+        self.frames.feed(data)
+        if self.handler is not None:
+            self.processFrames()
+        else:
+            self.wakeup()
+
+    def connection_lost(self, exc):
+        self.closed = True
+        self.wakeup()
+        if self.drain_waiter is not None and not self.drain_waiter.done():
+            self.drain_waiter.set_result(None)
+        if not self.closed_future.done():
+            self.closed_future.set_result(None)
+
+        # os frames que já chegaram são tratados antes de encerrar a conexão
+        if self.handler is not None and not self.paused:
+            self.processFrames()
+        if not self.paused:
+            self.finish()
+
+    def pause_writing(self):
+        if self.drain_waiter is None or self.drain_waiter.done():
+            self.drain_waiter = asyncio.get_running_loop().create_future()
+
+    def resume_writing(self):
+        if self.drain_waiter is not None and not self.drain_waiter.done():
+            self.drain_waiter.set_result(None)
+
+    # ---- leitura ----
+
+    def wakeup(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def nextMessage(self):
+        # usado só no handshake, antes de start(): retorna a próxima mensagem ou None se a conexão fechar
+        while True:
+            msg = self.frames.parse()
+            if msg is not None:
+                return msg
+            if self.closed:
+                return None
+
+            self.waiter = asyncio.get_running_loop().create_future()
+            await self.waiter
+
+    def start(self, peer_id, handler, on_close, binary=False, record=None):
+        # conclui o handshake: troca para o framing negociado e passa a entregar cada frame ao handler.
+        # o handler retorna None ou um awaitable; enquanto o awaitable não termina, a leitura fica pausada
+        self.peer_id = peer_id
+        self.handler = handler
+        self.on_close = on_close
+        self.record = record
+        self.frames.binary = binary
+
+        self.processFrames()
+        if self.closed and not self.paused:
+            self.finish()
+
+    def processFrames(self):
+        while not self.paused and self.handler is not None:
+            try:
+                msg = self.frames.parse()
+            except codec.DecodeError as e:
+                loggerWarning(f"Mensagem inválida recebida de {self.peer_id}: {e}")
+                continue
+
+            if msg is None:
+                return
+
+            try:
+                pending = self.handler(msg)
+            except Exception as e:
+                loggerError(f"Erro tratando mensagem de {self.peer_id}", e)
+                continue
+
+            if pending is not None:
+                self.block(pending)
+
+    def block(self, pending):
+        # backpressure: a leitura do socket fica pausada até a resposta caber na fila de saída
+        self.paused = True
+        if not self.closed:
+            self.transport.pause_reading()
+        asyncio.ensure_future(pending).add_done_callback(self.unblock)
+
+    def unblock(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            loggerError(f"Erro tratando mensagem de {self.peer_id}", task.exception())
+
+        self.paused = False
+        if self.closed:
+            self.processFrames()
+            if not self.paused:
+                self.finish()
+            return
+
+        self.transport.resume_reading()
+        self.processFrames()
+
+    def stop(self):
+        # para de entregar frames (ex.: depois do BYE) e fecha a conexão
+        self.handler = None
+        self.close()
+
+    def finish(self):
+        self.handler = None
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+
+    # ---- interface de 'writer' ----
+
+    def write(self, data):
+        self.transport.write(data)
+
+    def writelines(self, frames):
+        self.transport.writelines(frames)
+
+    async def drain(self):
+        if self.closed:
+            raise ConnectionResetError(f"Conexão com {self.peer_id} encerrada.")
+        if self.drain_waiter is not None and not self.drain_waiter.done():
+            await self.drain_waiter
+            if self.closed:
+                raise ConnectionResetError(f"Conexão com {self.peer_id} encerrada.")
+
+    def is_closing(self):
+        return self.transport is None or self.transport.is_closing()
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    async def wait_closed(self):
+        await self.closed_future
+
+    def get_extra_info(self, name, default=None):
+        return self.transport.get_extra_info(name, default)
@@ -0,0 +1,145 @@
+import sys
+
+STATUSES = ("WAITING", "CONNECTED", "LOST", "CLOSED")
+DIRECTIONS = ("inbound", "outbound")
+
+class PeerRecord:
+    # registro compacto de um peer conhecido; status e direção atualizam os índices da tabela
+    __slots__ = (
+        "peer_id", "namespace", "address", "port",
+        "writer", "outq", "last_seen", "_status", "_direction", "_table"
+    )
+
+    def __init__(self, peer_id: str, address, port, status="WAITING"):
+        self.peer_id = peer_id
+        # o namespace é compartilhado por muitos peers, então a string é internada
+        self.namespace = sys.intern(peer_id.partition("@")[2])
+        self.address = address
+        self.port = port
+        self.writer = None
+        self.outq = None
+        self.last_seen = 0.0
+        self._status = status
+        self._direction = None
+        self._table = None
+
+    @property
+    def name(self):
+        return self.peer_id.partition("@")[0]
+
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        if value not in STATUSES:
+            raise ValueError(f"Status de peer inválido: {value}")
+        if self._table is not None and value != self._status:
+            self._table.reindex(self, self._status, value, self._direction, self._direction)
+        self._status = value
+
+    @property
+    def direction(self):
+        return self._direction
+
+    @direction.setter
+    def direction(self, value):
+        if value is not None and value not in DIRECTIONS:
+            raise ValueError(f"Direção de conexão inválida: {value}")
+        if self._table is not None and value != self._direction:
+            self._table.reindex(self, self._status, self._status, self._direction, value)
+        self._direction = value
+
+    def connected(self):
+        return self._status == "CONNECTED" and self.outq is not None
+
+class PeerTable:
+    # tabela de peers com índices secundários por namespace, status e direção da conexão
+    def __init__(self):
+        self.records = {}
+        self.by_status = {status: set() for status in STATUSES}
+        self.by_namespace = {}
+        self.by_direction = {direction: set() for direction in DIRECTIONS}
+
+    def add(self, peer_id: str, address, port, status="WAITING") -> PeerRecord:
+        if peer_id in self.records:
+            del self[peer_id]
+
+        record = PeerRecord(peer_id, address, port, status)
+        record._table = self
+        self.records[peer_id] = record
+
+        self.by_status[status].add(peer_id)
+        self.namespaceIndex(record.namespace, status).add(peer_id)
+        return record
+
+    def namespaceIndex(self, namespace: str, status: str):
+        statuses = self.by_namespace.get(namespace)
+        if statuses is None:
+            statuses = self.by_namespace[namespace] = {s: set() for s in STATUSES}
+        return statuses[status]
+
+    def reindex(self, record: PeerRecord, old_status, new_status, old_direction, new_direction):
+        # mantém os índices consistentes a cada transição de estado do registro
+        peer_id = record.peer_id
+        if old_status != new_status:
+            self.by_status[old_status].discard(peer_id)
+            self.by_status[new_status].add(peer_id)
+            self.namespaceIndex(record.namespace, old_status).discard(peer_id)
+            self.namespaceIndex(record.namespace, new_status).add(peer_id)
+
+        if old_direction != new_direction:
+            if old_direction is not None:
+                self.by_direction[old_direction].discard(peer_id)
+            if new_direction is not None:
+                self.by_direction[new_direction].add(peer_id)
+
+    def select(self, namespace=None, status=None):
+        # retorna os registros que casam com o filtro, custando O(peers encontrados)
+        if namespace is not None:
+            statuses = self.by_namespace.get(namespace)
+            if statuses is None:
+                return []
+            if status is not None:
+                ids = statuses[status]
+            else:
+                ids = set().union(*statuses.values())
+        elif status is not None:
+            ids = self.by_status[status]
+        else:
+            return list(self.records.values())
+
+        return [self.records[peer_id] for peer_id in ids]
+
+    def __delitem__(self, peer_id: str):
+        record = self.records.pop(peer_id)
+        self.by_status[record.status].discard(peer_id)
+        self.namespaceIndex(record.namespace, record.status).discard(peer_id)
+        if record.direction is not None:
+            self.by_direction[record.direction].discard(peer_id)
+        record._table = None
+
+    def __getitem__(self, peer_id: str) -> PeerRecord:
+        return self.records[peer_id]
+
+    def __contains__(self, peer_id):
+        return peer_id in self.records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, peer_id: str, default=None):
+        return self.records.get(peer_id, default)
+
+    def keys(self):
+        return self.records.keys()
+
+    def values(self):
+        return self.records.values()
+
+    def items(self):
+        return self.records.items()
@@ -0,0 +1,116 @@
+import asyncio
+import random
+import time
+from logger import *
+from client import Client
+from config import getConfig
+from peer_connection import connectPeers
+from metrics import registry, RECONNECT_SECONDS, RECONNECT_FAILURES
+
+# espera base e máxima (em segundos) entre tentativas de reconexão; a espera de cada tentativa é sorteada
+# entre 0 e min(máxima, base * 2^tentativa) ("full jitter"), para os peers perdidos juntos não redisarem juntos
+RECONNECT_BASE_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+class ReconnectManager:
+    # reconexão independente por peer perdido: cada peer LOST ganha uma tarefa própria que tenta de novo com
+    # backoff exponencial e jitter, até 'max_reconnect_attempts' vezes. As tentativas de peers diferentes rodam
+    # em paralelo (limitadas pelo semáforo de connectPeers) e o tempo até a recuperação fica registrado por peer
+    def __init__(self, client: Client):
+        self.client = client
+        self.tasks = {}
+        self.lost_at = {}
+        self.attempts = {}
+        self.dialing = set()
+        self.recovered = {}
+        self.stopped = False
+
+    def stop(self):
+        # o nó está saindo da rede: cancela as reconexões pendentes e ignora as próximas perdas
+        self.stopped = True
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+
+    def peerLost(self, peer_id: str):
+        if self.stopped:
+            return
+        self.lost_at.setdefault(peer_id, time.monotonic())
+        if peer_id not in self.tasks:
+            self.tasks[peer_id] = asyncio.create_task(self.reconnect(peer_id))
+
+    def peerConnected(self, peer_id: str):
+        # chamado em toda conexão estabelecida (discada por nós ou recebida do peer); a tarefa de um peer que
+        # voltou por outra conexão é cancelada, e a que acabou de discar termina sozinha
+        if peer_id not in self.dialing:
+            task = self.tasks.pop(peer_id, None)
+            if task is not None:
+                task.cancel()
+
+        lost_at = self.lost_at.pop(peer_id, None)
+        self.attempts.pop(peer_id, None)
+        if lost_at is not None:
+            elapsed = time.monotonic() - lost_at
+            self.recovered[peer_id] = elapsed
+            registry.observe(RECONNECT_SECONDS, elapsed, (peer_id,))
+            loggerInfo(f"Conexão com {peer_id} recuperada em {elapsed:.2f}s")
+
+    def describe(self, peer_id: str):
+        # resumo do estado de reconexão do peer para o CLI (ou None se não houver nada a mostrar)
+        if peer_id in self.attempts:
+            return f"tentativa {self.attempts[peer_id]}/{getConfig().max_reconnect_attempts}"
+        if peer_id in self.lost_at:
+            return "sem novas tentativas" if peer_id not in self.tasks else "aguardando nova tentativa"
+        if peer_id in self.recovered:
+            return f"recuperado em {self.recovered[peer_id]:.1f}s"
+        return None
+
+    async def reconnect(self, peer_id: str):
+        client = self.client
+        max_attempts = getConfig().max_reconnect_attempts
+        try:
+            for attempt in range(max_attempts):
+                await asyncio.sleep(random.uniform(0, min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt)))
+
+                # peer que saiu da rede (BYE ou removido do Rendezvous) não é mais reconectado
+                record = client.peersConnected.get(peer_id)
+                if record is None or record.status == "CLOSED":
+                    self.lost_at.pop(peer_id, None)
+                    return
+                if record.status == "CONNECTED":
+                    return
+                if peer_id in client.connecting:
+                    continue
+
+                # só dá para discar peers com endereço anunciado no Rendezvous (o de uma conexão INBOUND
+                # é a porta efêmera do outro lado); os demais reconectam por conta própria
+                address = client.discovered.get(peer_id)
+                if address is None:
+                    loggerDebug("Reconexão com %s adiada: endereço não anunciado no Rendezvous", peer_id)
+                    continue
+
+                record.address, record.port = address
+                record.status = "WAITING"
+                self.attempts[peer_id] = attempt + 1
+                loggerInfo(f"Reconectando com {peer_id} (tentativa {attempt + 1}/{max_attempts})")
+
+                self.dialing.add(peer_id)
+                try:
+                    if await connectPeers(client, [peer_id]):
+                        return
+                finally:
+                    self.dialing.discard(peer_id)
+
+                record = client.peersConnected.get(peer_id)
+                if record is not None and record.status == "WAITING":
+                    record.status = "LOST"
+
+            registry.inc(RECONNECT_FAILURES, (peer_id,))
+            loggerWarning(f"Reconexão com {peer_id} falhou após {max_attempts} tentativas.")
+
+        except Exception as e:
+            loggerError(f"Erro na reconexão com {peer_id}", e)
+        finally:
+            if self.tasks.get(peer_id) is asyncio.current_task():
+                del self.tasks[peer_id]
+            self.attempts.pop(peer_id, None)
@@ -0,0 +1,218 @@
+import asyncio
+import collections
+import time
+import codec
+from logger import *
+from config import getConfig
+from state import rttKey
+from metrics import registry, ACK_SECONDS, ACK_TIMEOUTS, RETRANSMITS
+
+# limites do timeout de retransmissão (RTO), em segundos; sem medição de RTT do par usa o RTO inicial (RFC 6298)
+INITIAL_RTO = 1.0
+MIN_RTO = 0.2
+MAX_RTO = 10.0
+
+class PendingSend:
+    # um SEND em voo (ou aguardando vaga na janela): o frame codificado é guardado por fila de saída,
+    # então a retransmissão não codifica / comprime de novo enquanto a conexão for a mesma
+    __slots__ = (
+        "msg_id", "peer_id", "payload", "message", "future", "attempts", "first_sent", "sent_at", "deadline",
+        "warned", "timer", "frame", "frame_outq"
+    )
+
+    def __init__(self, msg_id, peer_id, payload, message, future):
+        self.msg_id = msg_id
+        self.peer_id = peer_id
+        self.payload = payload
+        self.message = message
+        self.future = future
+        self.attempts = 0
+        self.first_sent = 0.0
+        self.sent_at = 0.0
+        self.deadline = 0.0
+        self.warned = False
+        self.timer = None
+        self.frame = None
+        self.frame_outq = None
+
+class RtoEstimator:
+    # SRTT / RTTVAR do RFC 6298 medidos pelo tempo SEND -> ACK, separados da tabela de RTT do /rtt (que é
+    # só de PING): o tempo do ACK inclui espera na janela, na fila de saída e o atraso do ackbatch
+    __slots__ = ("srtt", "rttvar")
+
+    def __init__(self, sample: float):
+        self.srtt = sample
+        self.rttvar = sample / 2
+
+    def add(self, sample: float):
+        self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - sample)
+        self.srtt = 0.875 * self.srtt + 0.125 * sample
+
+    def rto(self):
+        return self.srtt + 4 * self.rttvar
+
+class SendWindow:
+    # janela de um peer: no máximo 'send_window' SENDs sem ACK; o resto espera na fila, em ordem
+    __slots__ = ("inflight", "backlog")
+
+    def __init__(self):
+        self.inflight = {}
+        self.backlog = collections.deque()
+
+class ReliableSender:
+    # envio confiável de SENDs sem bloquear quem chama: send() retorna um future por mensagem
+    # (True com o ACK, False depois de esgotar as retransmissões). Cada mensagem tem um timer de
+    # retransmissão calculado a partir do tempo de ACK do par (srtt + 4 * rttvar) e dobrado a cada tentativa
+    def __init__(self, client):
+        self.client = client
+        self.windows = {}
+        self.estimators = {}
+        # índice msg_id -> PendingSend consultado pelo handler de ACK
+        self.pending = client.pending_acks
+
+    def send(self, peer_id: str, message: str, callback=None):
+        msg_id = codec.newMsgId()
+        payload = {
+            "type": "SEND",
+            "msg_id": msg_id,
+            "src": f"{self.client.name}@{self.client.namespace}",
+            "dst": peer_id,
+            "payload": message,
+            "require_ack": True,
+            "ttl": 1
+        }
+
+        future = asyncio.get_running_loop().create_future()
+        if callback is not None:
+            future.add_done_callback(callback)
+
+        entry = PendingSend(msg_id, peer_id, payload, message, future)
+        window = self.windows.get(peer_id)
+        if window is None:
+            window = self.windows[peer_id] = SendWindow()
+
+        if len(window.inflight) < getConfig().send_window and not window.backlog:
+            self.launch(window, entry)
+        else:
+            window.backlog.append(entry)
+        return future
+
+    def inflight(self, peer_id: str):
+        window = self.windows.get(peer_id)
+        return (len(window.inflight), len(window.backlog)) if window else (0, 0)
+
+    def launch(self, window: SendWindow, entry: PendingSend):
+        window.inflight[entry.msg_id] = entry
+        self.pending[entry.msg_id] = entry
+        self.transmit(entry)
+
+    def transmit(self, entry: PendingSend):
+        entry.attempts += 1
+        entry.sent_at = time.perf_counter()
+        if entry.attempts == 1:
+            entry.first_sent = entry.sent_at
+
+        # com o peer desconectado (ou a fila cheia) a tentativa conta do mesmo jeito e o timer tenta de novo
+        record = self.client.peersConnected.get(entry.peer_id)
+        outq = record.outq if record is not None and record.connected() else None
+        if outq is not None:
+            try:
+                outq.sendNowait(self.frameFor(entry, outq), msg_type="SEND")
+            except (asyncio.QueueFull, ConnectionResetError) as e:
+                loggerDebug("SEND %s para %s não enfileirado: %r", entry.msg_id, entry.peer_id, e)
+
+        entry.deadline = entry.sent_at + self.rto(entry.peer_id, entry.attempts)
+        self.schedule(entry)
+
+    def schedule(self, entry: PendingSend):
+        # o timer acorda no prazo da retransmissão ou, se vier antes, no timeout de ACK da especificação
+        wake_at = entry.deadline
+        if not entry.warned:
+            wake_at = min(wake_at, entry.first_sent + getConfig().ack_timeout)
+        entry.timer = asyncio.get_running_loop().call_later(
+            max(0.0, wake_at - time.perf_counter()), self.expire, entry.msg_id
+        )
+
+    def frameFor(self, entry: PendingSend, outq):
+        if entry.frame_outq is not outq:
+            # comprime payloads grandes quando a conexão negociou a feature de compressão
+            compressed = None
+            if codec.COMPRESSION_FEATURE in outq.features:
+                configs = getConfig()
+                compressed = codec.compressPayload(entry.message, configs.compress_threshold, configs.compress_level, outq.binary)
+            entry.frame = codec.encode(entry.payload, outq.binary, compressed)
+            entry.frame_outq = outq
+        return entry.frame
+
+    def rto(self, peer_id: str, attempts: int):
+        # antes do primeiro ACK do par usa o RTT do PING (se houver) e, sem nenhuma medição, o RTO inicial
+        estimator = self.estimators.get(peer_id)
+        if estimator is not None:
+            base = estimator.rto()
+        else:
+            stats = self.client.rtt_table.get(rttKey(f"{self.client.name}@{self.client.namespace}", peer_id))
+            base = INITIAL_RTO if stats is None or stats.count == 0 else (stats.srtt + 4 * stats.rttvar) / 1000
+        base = min(MAX_RTO, max(MIN_RTO, base))
+        return min(MAX_RTO, base * 2 ** (attempts - 1))
+
+    def expire(self, msg_id: str):
+        entry = self.pending.get(msg_id)
+        if entry is None:
+            return
+
+        now = time.perf_counter()
+        if not entry.warned and now - entry.first_sent >= getConfig().ack_timeout:
+            # aviso de timeout do ACK da especificação (5s por padrão), uma vez por mensagem
+            entry.warned = True
+            loggerWarning(f"Timeout de ACK de {entry.peer_id} para msg {msg_id} ({now - entry.first_sent:.1f}s, {entry.attempts} tentativa(s)).")
+        if now < entry.deadline:
+            self.schedule(entry)
+            return
+
+        if entry.attempts > getConfig().max_retransmits:
+            registry.inc(ACK_TIMEOUTS, (entry.peer_id,))
+            loggerWarning(f"Sem ACK de {entry.peer_id} para msg {msg_id} após {entry.attempts} tentativas.")
+            self.finish(entry, False)
+            return
+
+        registry.inc(RETRANSMITS, (entry.peer_id,))
+        loggerDebug("Retransmitindo SEND %s para %s (tentativa %d)", msg_id, entry.peer_id, entry.attempts + 1)
+        self.transmit(entry)
+
+    def ackReceived(self, msg_id: str, peer_id: str):
+        # só o peer destino confirma o SEND: o ACK de outra conexão é ignorado
+        entry = self.pending.get(msg_id)
+        if entry is None or entry.peer_id != peer_id:
+            return False
+
+        # como no algoritmo de Karn, só mensagens não retransmitidas viram amostra do RTO: assim ele
+        # acompanha o par mesmo nas conexões inbound, que não enviam PING
+        if entry.attempts == 1:
+            elapsed = time.perf_counter() - entry.sent_at
+            registry.observe(ACK_SECONDS, elapsed)
+            estimator = self.estimators.get(entry.peer_id)
+            if estimator is None:
+                self.estimators[entry.peer_id] = RtoEstimator(elapsed)
+            else:
+                estimator.add(elapsed)
+        self.finish(entry, True)
+        return True
+
+    def finish(self, entry: PendingSend, acked: bool):
+        if entry.timer is not None:
+            entry.timer.cancel()
+        self.pending.pop(entry.msg_id, None)
+
+        window = self.windows.get(entry.peer_id)
+        if window is not None:
+            window.inflight.pop(entry.msg_id, None)
+
+            # libera a vaga na janela para o próximo SEND que estava esperando
+            limit = getConfig().send_window
+            while window.backlog and len(window.inflight) < limit:
+                self.launch(window, window.backlog.popleft())
+            if not window.inflight and not window.backlog:
+                del self.windows[entry.peer_id]
+
+        if not entry.future.done():
+            entry.future.set_result(acked)
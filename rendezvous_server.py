@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import heapq
+import time
+import codec
+from logger import *
+
+# servidor Rendezvous local (REGISTER / DISCOVER / UNREGISTER como na especificação), para testar a descoberta
+# em escala sem depender do servidor público. Os registros ficam indexados por namespace e a expiração por TTL
+# sai de um heap de prazos, sem varrer a tabela; a resposta do DISCOVER é montada de pedaços JSON já
+# serializados de cada registro e reaproveitada enquanto nada muda no mesmo segundo
+# uso: python rendezvous_server.py [--host 0.0.0.0] [--port 8080]
+
+DEFAULT_TTL = 7200
+MAX_TTL = 86400
+MAX_LINE = codec.MAX_FRAME_SIZE
+
+class Registration:
+    __slots__ = ("namespace", "name", "port", "ttl", "expires_at", "observed_ip", "observed_port", "head")
+
+    def __init__(self, namespace, name, port, ttl, expires_at, observed_ip, observed_port):
+        self.namespace = namespace
+        self.name = name
+        self.port = port
+        self.ttl = ttl
+        self.expires_at = expires_at
+        self.observed_ip = observed_ip
+        self.observed_port = observed_port
+        # JSON do registro sem o '}' final, pronto para receber o "expires_in" de cada resposta
+        self.head = codec.dumps({
+            "ip": observed_ip, "port": port, "name": name, "namespace": namespace, "ttl": ttl,
+            "observed_ip": observed_ip, "observed_port": observed_port
+        })[:-1] + b',"expires_in":'
+
+    def entry(self, now: float):
+        # chamado depois de expire(), então expires_at > now
+        return self.head + b"%d}" % (self.expires_at - now)
+
+class RendezvousRegistry:
+    # tabela de registros: namespace -> {name: Registration}, mais o heap (expires_at, seq, registro) com remoção
+    # preguiçosa (entradas de registros renovados ou removidos são descartadas quando chegam ao topo)
+    def __init__(self, max_ttl=MAX_TTL):
+        self.max_ttl = max_ttl
+        self.namespaces = {}
+        self.count = 0
+        self.heap = []
+        self.seq = 0
+        self.version = 0
+        self.ns_versions = {}
+        self.cache = {}
+        self.stats = {"REGISTER": 0, "DISCOVER": 0, "UNREGISTER": 0, "expired": 0, "errors": 0}
+
+    def __len__(self):
+        return self.count
+
+    def changed(self, namespace: str):
+        self.version += 1
+        self.ns_versions[namespace] = self.ns_versions.get(namespace, 0) + 1
+
+    def register(self, namespace, name, port, ttl, observed_ip, observed_port, now=None):
+        now = time.monotonic() if now is None else now
+        ttl = min(ttl, self.max_ttl)
+        registration = Registration(namespace, name, port, ttl, now + ttl, observed_ip, observed_port)
+
+        names = self.namespaces.get(namespace)
+        if names is None:
+            names = self.namespaces[namespace] = {}
+        if name not in names:
+            self.count += 1
+        names[name] = registration
+        self.changed(namespace)
+
+        self.seq += 1
+        heapq.heappush(self.heap, (registration.expires_at, self.seq, registration))
+        if len(self.heap) > 2 * self.count + 1024:
+            # muitas renovações deixam entradas velhas no heap; reconstrói só com as vigentes
+            self.heap = [item for item in self.heap if self.current(item[2])]
+            heapq.heapify(self.heap)
+        return registration
+
+    def current(self, registration: Registration):
+        names = self.namespaces.get(registration.namespace)
+        return names is not None and names.get(registration.name) is registration
+
+    def unregister(self, namespace, name, port=None):
+        names = self.namespaces.get(namespace)
+        registration = names.get(name) if names else None
+        if registration is None or (port is not None and registration.port != port):
+            return False
+        self.remove(registration)
+        return True
+
+    def remove(self, registration: Registration):
+        names = self.namespaces[registration.namespace]
+        del names[registration.name]
+        if not names:
+            del self.namespaces[registration.namespace]
+        self.count -= 1
+        self.changed(registration.namespace)
+
+    def expire(self, now=None):
+        # remove os registros vencidos no topo do heap; retorna quantos saíram
+        now = time.monotonic() if now is None else now
+        heap = self.heap
+        if not heap or heap[0][0] > now:
+            return 0
+
+        # as versões são atualizadas uma vez por namespace afetado, não por registro
+        namespaces = self.namespaces
+        touched = set()
+        expired = 0
+        while heap and heap[0][0] <= now:
+            registration = heapq.heappop(heap)[2]
+            names = namespaces.get(registration.namespace)
+            if names is not None and names.get(registration.name) is registration:
+                del names[registration.name]
+                touched.add(registration.namespace)
+                expired += 1
+
+        for namespace in touched:
+            if not namespaces[namespace]:
+                del namespaces[namespace]
+            self.changed(namespace)
+        self.count -= expired
+        self.stats["expired"] += expired
+        return expired
+
+    def nextExpiry(self):
+        # prazo do próximo registro a vencer (ou None), descartando entradas velhas do topo
+        heap = self.heap
+        while heap and not self.current(heap[0][2]):
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def discover(self, namespace=None, now=None):
+        # resposta do DISCOVER já serializada; o "expires_in" tem resolução de 1s, então a mesma resposta
+        # serve todos os pedidos do mesmo segundo enquanto a tabela (ou o namespace) não mudar
+        now = time.monotonic() if now is None else now
+        self.expire(now)
+        version = self.version if namespace is None else self.ns_versions.get(namespace, 0)
+        second = int(now)
+        cached = self.cache.get(namespace)
+        if cached is not None and cached[0] == version and cached[1] == second:
+            return cached[2]
+
+        if namespace is None:
+            entries = [r.entry(now) for names in self.namespaces.values() for r in names.values()]
+        else:
+            entries = [r.entry(now) for r in self.namespaces.get(namespace, {}).values()]
+        response = b'{"status":"OK","peers":[' + b",".join(entries) + b"]}\n"
+
+        if len(self.cache) > 4096:
+            self.cache.clear()
+        self.cache[namespace] = (version, second, response)
+        return response
+
+    def handle(self, line: bytes, observed_ip, observed_port):
+        # trata um pedido (linha JSON) e retorna a resposta serializada
+        try:
+            msg = codec.decode(line)
+        except codec.DecodeError:
+            return self.error("JSON inválido")
+
+        kind = msg.get("type")
+        if kind not in ("REGISTER", "DISCOVER", "UNREGISTER"):
+            return self.error(f"Tipo de mensagem desconhecido: {kind}")
+        self.stats[kind] += 1
+
+        if kind == "DISCOVER":
+            namespace = msg.get("namespace")
+            if namespace is not None and not isinstance(namespace, str):
+                return self.error("Campo 'namespace' inválido")
+            return self.discover(namespace)
+
+        namespace, name, port = msg.get("namespace"), msg.get("name"), msg.get("port")
+        if not isinstance(namespace, str) or not namespace or not isinstance(name, str) or not name:
+            return self.error("Campos 'namespace' e 'name' são obrigatórios")
+        if kind == "UNREGISTER":
+            if port is not None and not isinstance(port, int):
+                return self.error("Campo 'port' inválido")
+            if not self.unregister(namespace, name, port):
+                return self.error("Peer não registrado")
+            return codec.encode({"status": "OK"})
+
+        ttl = msg.get("ttl", DEFAULT_TTL)
+        if not isinstance(port, int) or isinstance(port, bool) or not 1 <= port <= 65535:
+            return self.error("Campo 'port' inválido")
+        if not isinstance(ttl, int) or isinstance(ttl, bool) or ttl < 1:
+            return self.error("Campo 'ttl' inválido")
+
+        registration = self.register(namespace, name, port, ttl, observed_ip, observed_port)
+        return codec.encode({
+            "status": "OK", "ttl": registration.ttl,
+            "observed_ip": observed_ip, "observed_port": observed_port
+        })
+
+    def error(self, message: str):
+        self.stats["errors"] += 1
+        return codec.encode({"status": "ERROR", "message": message})
+
+class RendezvousProtocol(asyncio.Protocol):
+    # uma conexão de cliente: pedidos por linha, várias linhas por leitura (pipelining), respostas em ordem
+    # numa única escrita; se o cliente não lê as respostas, a leitura pausa até o buffer de envio esvaziar
+    def __init__(self, server):
+        self.server = server
+        self.buffer = bytearray()
+        self.transport = None
+        self.observed = (None, None)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        peername = transport.get_extra_info("peername")
+        self.observed = (peername[0], peername[1]) if peername else (None, None)
+
+    def data_received(self, data):
+        buffer = self.buffer
+        buffer += data
+        responses = []
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line = bytes(buffer[start:end]).strip()
+            start = end + 1
+            if line:
+                responses.append(self.server.handle(line, *self.observed))
+        del buffer[:start]
+
+        if responses:
+            self.transport.writelines(responses)
+        if len(buffer) > MAX_LINE:
+            self.transport.write(self.server.registry.error("Mensagem maior que o limite"))
+            self.transport.close()
+
+    def pause_writing(self):
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.transport.resume_reading()
+
+class RendezvousServer:
+    def __init__(self, max_ttl=MAX_TTL):
+        self.registry = RendezvousRegistry(max_ttl)
+        self.server = None
+        self.timer = None
+        self.timer_at = None
+
+    async def start(self, host="0.0.0.0", port=8080):
+        loop = asyncio.get_running_loop()
+        self.server = await loop.create_server(lambda: RendezvousProtocol(self), host, port)
+        return self.server
+
+    def address(self):
+        return self.server.sockets[0].getsockname()[:2]
+
+    def handle(self, line: bytes, observed_ip, observed_port):
+        response = self.registry.handle(line, observed_ip, observed_port)
+        self.scheduleExpiry()
+        return response
+
+    def scheduleExpiry(self):
+        # um único timer, reagendado só quando o próximo prazo do heap fica mais cedo que o agendado
+        deadline = self.registry.nextExpiry()
+        if deadline is None or (self.timer is not None and self.timer_at <= deadline):
+            return
+        if self.timer is not None:
+            self.timer.cancel()
+        # o relógio do loop é o time.monotonic() usado nos prazos
+        self.timer_at = deadline
+        self.timer = asyncio.get_running_loop().call_at(deadline, self.expireNow)
+
+    def expireNow(self):
+        self.timer = None
+        expired = self.registry.expire()
+        if expired:
+            loggerDebug("Rendezvous: %d registro(s) expirado(s)", expired)
+        self.scheduleExpiry()
+
+    async def close(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor Rendezvous local do PyP2P")
+    parser.add_argument("--host", default="0.0.0.0", help="endereço de escuta (padrão: 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=8080, help="porta de escuta (padrão: 8080)")
+    parser.add_argument("--max-ttl", type=int, default=MAX_TTL, help=f"TTL máximo aceito, em segundos (padrão: {MAX_TTL})")
+    return parser.parse_args(argv)
+
+async def main(args):
+    setupLogger()
+    server = RendezvousServer(args.max_ttl)
+    await server.start(args.host, args.port)
+    host, port = server.address()
+    print(f"🛰️  Rendezvous escutando em {host}:{port}")
+    loggerInfo(f"Rendezvous local escutando em {host}:{port}")
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+        stats = server.registry.stats
+        print(f"\nRendezvous encerrado: {len(server.registry)} registros, {stats}")
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(parseArgs()))
+    except KeyboardInterrupt:
+        pass
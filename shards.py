@@ -0,0 +1,415 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import types
+import zlib
+import codec
+from logger import *
+from client import Client
+from message_router import sendMessage, publish, printPubSummary, ackReporter
+from metrics import showMetrics
+from peer_connection import connectPeers, dialFailed, reconnectPeers, resetConnections, sendBye
+from state import peerRows, printPeers, namespaceFilter, showConns, showRtt, RttStats
+
+# modo multiprocesso (--workers N) para peers "hub" com milhares de conexões: os N processos abrem a mesma
+# porta P2P com SO_REUSEPORT e o kernel distribui as conexões recebidas entre eles; as conexões discadas
+# são divididas por hash do peer_id. Cada processo é dono das conexões que tem (o seu shard) e roda o seu
+# próprio event loop. O processo principal (worker 0) fica com o CLI, o Rendezvous e o discover, e fala com
+# os demais por um socket Unix local (uma linha JSON por mensagem):
+#   worker -> principal: {"type": "OWN" | "DROP", "peer_id", "direction"}  (conexão aberta / perdida)
+#   principal -> worker: {"type": "CALL", "id", "op", "args"}  ->  {"type": "RESULT", "id", "result"}
+# O principal mantém a rota peer_id -> worker para o /msg, junta as respostas de todos no /pub, /peers,
+# /rtt, /conn e /metrics e resolve conexões duplicadas com o mesmo peer em workers diferentes
+
+SHARD_JOIN_TIMEOUT = 10.0
+SHARD_CALL_TIMEOUT = 30.0
+
+def shardFor(peer_id: str, workers: int):
+    # worker que disca o peer (o mesmo em todas as execuções, ao contrário do hash() do Python)
+    return zlib.crc32(peer_id.encode()) % workers
+
+def closeLocal(client: Client, peer_id: str):
+    # fecha a conexão deste processo com o peer, sem reconexão (outra conexão do nó ficou com ele)
+    record = client.peersConnected.get(peer_id)
+    if record is None or not record.connected():
+        return False
+    outq = record.outq
+    record.writer = None
+    record.outq = None
+    client.removePeer(peer_id)
+    if outq:
+        outq.close()
+    return True
+
+def captureOutput(show):
+    # roda um comando de exibição do CLI e devolve o texto impresso; a captura é por tarefa (contextvar do
+    # socket de controle), então DMs, keep-alive e outras chamadas do worker não entram na resposta
+    async def run(client, **args):
+        from control import runCaptured
+        _, output = await runCaptured(show(client, **args))
+        return output
+    return run
+
+# operações que o principal pede aos workers: (client, **args) -> resultado serializável em JSON
+
+async def opSend(client: Client, target: str, text: str):
+    record = client.peersConnected.get(target)
+    if record is None or not record.connected():
+        return None
+    return await client.sender.send(target, text)
+
+async def opPub(client: Client, destination: str, text: str, msg_id: str):
+    return await publish(destination, text, client, msg_id)
+
+async def opPeers(client: Client, namespace=None):
+    return peerRows(client, namespace)
+
+async def opRtt(client: Client):
+    return [[a, b, stats.snapshot()] for (a, b), stats in client.rtt_table.items()]
+
+async def opDial(client: Client, peers: dict):
+    # endereços anunciados no Rendezvous dos peers que este worker deve discar
+    for peer_id, (ip, port) in peers.items():
+        client.discovered[peer_id] = (ip, port)
+        record = client.peersConnected.get(peer_id)
+        if record is None:
+            client.peersConnected.add(peer_id, ip, port, "WAITING")
+        elif not record.connected():
+            record.address, record.port = ip, port
+            record.status = "WAITING"
+    return await connectPeers(client, list(peers))
+
+async def opClose(client: Client, peer_id: str):
+    return closeLocal(client, peer_id)
+
+async def opReconnect(client: Client):
+    # só as conexões deste worker: o registro no Rendezvous é feito uma vez, pelo processo principal
+    return await resetConnections(client)
+
+SHARD_OPS = {
+    "send": opSend,
+    "pub": opPub,
+    "peers": opPeers,
+    "rtt": opRtt,
+    "dial": opDial,
+    "close": opClose,
+    "conns": captureOutput(showConns),
+    "metrics": captureOutput(showMetrics),
+    "reconnect": opReconnect,
+    "bye": captureOutput(sendBye),
+}
+
+class ShardCoordinator:
+    # lado do processo principal (worker 0): sobe os outros workers e coordena os shards
+    def __init__(self, client: Client, workers: int):
+        self.client = client
+        self.index = 0
+        self.workers = workers
+        self.my_id = f"{client.name}@{client.namespace}"
+        self.directory = tempfile.mkdtemp(prefix="pyp2p_shards_")
+        self.path = os.path.join(self.directory, "ipc.sock")
+        self.server = None
+        self.processes = []
+        self.links = {}
+        self.calls = {}
+        self.next_call = 0
+        self.routes = {}
+        self.tasks = set()
+        self.all_joined = asyncio.Event()
+
+    async def start(self, argv):
+        # argv: argumentos repassados aos workers (o config.json é lido do mesmo diretório)
+        self.server = await asyncio.start_unix_server(self.handleWorker, self.path)
+        script = os.path.abspath(sys.argv[0])
+        for index in range(1, self.workers):
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, script, *argv,
+                "--workers", str(self.workers), "--shard-worker", str(index), "--shard-ipc", self.path
+            )
+            self.processes.append(process)
+        try:
+            await asyncio.wait_for(self.all_joined.wait(), timeout=SHARD_JOIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            loggerWarning(f"Só {len(self.links)} de {self.workers - 1} workers se conectaram ao processo principal.")
+
+    async def handleWorker(self, reader, writer):
+        index = None
+        try:
+            hello = codec.decode(await reader.readline())
+            index = hello.get("worker")
+            self.links[index] = writer
+            loggerInfo(f"Worker {index} conectado ({len(self.links)}/{self.workers - 1})")
+            if len(self.links) == self.workers - 1:
+                self.all_joined.set()
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = codec.decode(line)
+                kind = msg.get("type")
+                if kind == "RESULT":
+                    future = self.calls.pop(msg.get("id"), None)
+                    if future is not None and not future.done():
+                        if "error" in msg:
+                            future.set_exception(RuntimeError(msg["error"]))
+                        else:
+                            future.set_result(msg.get("result"))
+                elif kind == "OWN":
+                    self.ownerEvent(index, msg["peer_id"], msg.get("direction"))
+                elif kind == "DROP":
+                    self.dropEvent(index, msg["peer_id"])
+        except (ConnectionError, codec.DecodeError) as e:
+            loggerError(f"Falha no canal com o worker {index}", e)
+        finally:
+            if index is not None and self.links.get(index) is writer:
+                del self.links[index]
+                loggerWarning(f"Worker {index} desconectado")
+                # as conexões do worker que caiu saem da rota
+                for peer_id in [p for p, (w, _) in self.routes.items() if w == index]:
+                    del self.routes[peer_id]
+            writer.close()
+
+    # ---- rota peer_id -> worker ----
+
+    def peerConnected(self, peer_id: str, direction: str):
+        self.ownerEvent(0, peer_id, direction)
+
+    def peerLost(self, peer_id: str):
+        self.dropEvent(0, peer_id)
+
+    def ownerEvent(self, worker, peer_id: str, direction: str):
+        current = self.routes.get(peer_id)
+        if current is not None and current[0] != worker:
+            # o peer conectou em dois workers (discado por um e recebido por outro): fica a conexão que o
+            # desempate de keepsNewConnection escolheria, e o peer do outro lado escolhe a mesma
+            if current[1] == direction:
+                keep_new = True
+            else:
+                dialer = self.my_id if direction == "outbound" else peer_id
+                keep_new = dialer == min(self.my_id, peer_id)
+            loser = current[0] if keep_new else worker
+            loggerInfo(f"Conexão duplicada com {peer_id} nos workers {current[0]} e {worker}: mantida a do worker {worker if keep_new else current[0]}")
+            self.closeOn(loser, peer_id)
+            if not keep_new:
+                return
+        self.routes[peer_id] = (worker, direction)
+
+    def dropEvent(self, worker, peer_id: str):
+        current = self.routes.get(peer_id)
+        if current is not None and current[0] == worker:
+            del self.routes[peer_id]
+
+    def owner(self, peer_id: str):
+        current = self.routes.get(peer_id)
+        return current[0] if current is not None else None
+
+    def closeOn(self, worker, peer_id: str):
+        if worker == 0:
+            closeLocal(self.client, peer_id)
+        elif worker in self.links:
+            self.spawn(self.call(worker, "close", peer_id=peer_id), f"close de {peer_id} no worker {worker}")
+
+    def spawn(self, coro, what: str, retry=()):
+        # tarefa em segundo plano com referência guardada; se falhar, loga e devolve os peers de 'retry' que
+        # continuam sem conexão em nenhum worker para o gerenciador de reconexão do processo principal
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+
+        def done(task):
+            self.tasks.discard(task)
+            if task.cancelled() or task.exception() is None:
+                return
+            loggerError(f"Falha em {what}", task.exception())
+            for peer_id in retry:
+                record = self.client.peersConnected.get(peer_id)
+                if record is not None and self.owner(peer_id) is None:
+                    dialFailed(self.client, record)
+
+        task.add_done_callback(done)
+        return task
+
+    # ---- chamadas aos workers ----
+
+    async def call(self, worker, op: str, **args):
+        # o próprio processo principal (worker 0) executa a operação direto
+        if worker == 0:
+            return await SHARD_OPS[op](self.client, **args)
+        writer = self.links.get(worker)
+        if writer is None:
+            return None
+        self.next_call += 1
+        call_id = self.next_call
+        future = asyncio.get_running_loop().create_future()
+        self.calls[call_id] = future
+        writer.write(codec.encode({"type": "CALL", "id": call_id, "op": op, "args": args}))
+        try:
+            return await asyncio.wait_for(future, timeout=SHARD_CALL_TIMEOUT)
+        finally:
+            self.calls.pop(call_id, None)
+
+    async def callAll(self, op: str, remote_only=False, **args):
+        # resultado por worker (None para os que falharam)
+        workers = ([] if remote_only else [0]) + sorted(self.links)
+        results = await asyncio.gather(*(self.call(w, op, **args) for w in workers), return_exceptions=True)
+        merged = {}
+        for worker, result in zip(workers, results):
+            if isinstance(result, BaseException):
+                loggerError(f"Operação '{op}' falhou no worker {worker}", result)
+                result = None
+            merged[worker] = result
+        return merged
+
+    def dial(self, peer_ids):
+        # cada peer descoberto é discado pelo worker do seu shard
+        client = self.client
+        assigned = {}
+        for peer_id in peer_ids:
+            # peer que já tem conexão em algum worker (recebida pela porta compartilhada) não é discado de novo
+            if self.owner(peer_id) is not None:
+                continue
+            assigned.setdefault(shardFor(peer_id, self.workers), []).append(peer_id)
+        for worker, peers in assigned.items():
+            if worker == 0 or worker not in self.links:
+                self.spawn(connectPeers(client, peers), f"discagem de {len(peers)} peer(s)", peers)
+            else:
+                addresses = {p: client.discovered[p] for p in peers if p in client.discovered}
+                self.spawn(self.call(worker, "dial", peers=addresses), f"discagem de {len(addresses)} peer(s) no worker {worker}", list(addresses))
+
+    async def stop(self):
+        for task in list(self.tasks):
+            task.cancel()
+        # fechar o canal encerra os workers (que mandam BYE para as conexões que ainda tiverem)
+        for writer in list(self.links.values()):
+            writer.close()
+        for process in self.processes:
+            try:
+                await asyncio.wait_for(process.wait(), timeout=5.0)
+            except asyncio.TimeoutError:
+                process.kill()
+        if self.server is not None:
+            self.server.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+class ShardWorker:
+    # lado dos workers 1..N-1: executa as chamadas do principal e avisa quando ganha ou perde conexões
+    def __init__(self, client: Client, index: int, path: str):
+        self.client = client
+        self.index = index
+        self.path = path
+        self.writer = None
+
+    def peerConnected(self, peer_id: str, direction: str):
+        self.notify({"type": "OWN", "peer_id": peer_id, "direction": direction})
+
+    def peerLost(self, peer_id: str):
+        self.notify({"type": "DROP", "peer_id": peer_id})
+
+    def notify(self, msg: dict):
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write(codec.encode(msg))
+
+    async def run(self):
+        # termina quando o processo principal fecha o canal
+        reader, self.writer = await asyncio.open_unix_connection(self.path)
+        self.notify({"type": "JOIN", "worker": self.index})
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = codec.decode(line)
+                if msg.get("type") == "CALL":
+                    asyncio.create_task(self.execute(msg))
+        finally:
+            self.writer.close()
+            self.writer = None
+
+    async def execute(self, msg: dict):
+        response = {"type": "RESULT", "id": msg.get("id")}
+        try:
+            response["result"] = await SHARD_OPS[msg["op"]](self.client, **msg.get("args", {}))
+        except Exception as e:
+            loggerError(f"Erro na operação '{msg.get('op')}' do worker {self.index}", e)
+            response["error"] = repr(e)
+        self.notify(response)
+
+# ---- comandos do CLI com a visão de todos os workers ----
+
+async def shardSend(coordinator: ShardCoordinator, target: str, text: str):
+    # o /msg vai pelo worker dono da conexão com o peer
+    worker = coordinator.owner(target)
+    if worker is None or worker == 0:
+        return await sendMessage(target, text, coordinator.client)
+
+    task = asyncio.create_task(coordinator.call(worker, "send", target=target, text=text))
+    task.add_done_callback(ackReporter(target))
+    loggerInfo("Mensagem enviada para %s pelo worker %d: %s", target, worker, text)
+    return task
+
+async def shardPub(coordinator: ShardCoordinator, destination: str, text: str):
+    # o mesmo msg_id em todos os workers; cada peer recebe o PUB pela única conexão que tem com o nó
+    results = await coordinator.callAll("pub", destination=destination, text=text, msg_id=codec.newMsgId())
+    counts = {"delivered": 0, "late": 0, "dropped": 0, "failed": 0}
+    latencies = []
+    for result in results.values():
+        if result is None:
+            continue
+        worker_counts, worker_latencies = result
+        for key in counts:
+            counts[key] += worker_counts[key]
+        latencies.extend(worker_latencies)
+    latencies.sort()
+    printPubSummary(counts, latencies)
+    return counts, latencies
+
+async def shardPeers(coordinator: ShardCoordinator, arg):
+    # a tabela do principal tem todos os peers descobertos; a linha do worker dono da conexão prevalece
+    results = await coordinator.callAll("peers", namespace=namespaceFilter(arg))
+    merged = {}
+    for worker, rows in results.items():
+        for row in rows or []:
+            peer_id = row[0]
+            if coordinator.owner(peer_id) == worker:
+                row = list(row)
+                row[6] = f"worker {worker}" + (f", {row[6]}" if row[6] else "")
+                merged[peer_id] = row
+            elif peer_id not in merged or (worker == 0 and merged[peer_id][3] != "CONNECTED"):
+                merged[peer_id] = row
+
+    if not merged and not coordinator.client.peersConnected:
+        print("Nenhuma informação de peers disponível.")
+        return
+    printPeers(list(merged.values()), len(merged))
+
+async def shardRtt(coordinator: ShardCoordinator):
+    # junta as tabelas de RTT de todos os workers (cada par só é medido pelo worker da conexão)
+    results = await coordinator.callAll("rtt")
+    table = {}
+    for rows in results.values():
+        for a, b, snapshot in rows or []:
+            stats = RttStats.fromSnapshot(snapshot)
+            current = table.get((a, b))
+            if current is None or stats.last_seen > current.last_seen:
+                table[(a, b)] = stats
+    await showRtt(types.SimpleNamespace(rtt_table=table))
+
+async def shardShow(coordinator: ShardCoordinator, op: str, show):
+    # /conn e /metrics: a saída de cada worker, começando pelo principal
+    await show(coordinator.client)
+    results = await coordinator.callAll(op, remote_only=True)
+    for worker, output in results.items():
+        print(f"=== Worker {worker} ===")
+        print(output or "(sem resposta)\n", end="")
+
+async def shardReconnect(coordinator: ShardCoordinator):
+    await reconnectPeers(coordinator.client)
+    results = await coordinator.callAll("reconnect", remote_only=True)
+    counts = [r for r in results.values() if r is not None]
+    print(f"🔄 Reconexão pedida também para {len(counts)} worker(s): {sum(counts)} conexões reiniciadas.")
+
+async def shardBye(coordinator: ShardCoordinator):
+    await sendBye(coordinator.client)
+    await coordinator.callAll("bye", remote_only=True)
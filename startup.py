@@ -0,0 +1,47 @@
+import time
+
+class StartupProfile:
+    # tempos da inicialização do cliente (--profile-startup): cada etapa sequencial é medida desde a anterior
+    # e as etapas que rodam em paralelo (bind e REGISTER) guardam o próprio intervalo
+    def __init__(self, started: float, enabled=False):
+        self.enabled = enabled
+        self.started = started
+        self.last = started
+        self.steps = []
+        self.running = []
+        self.reported = False
+
+    def mark(self, step: str):
+        now = time.perf_counter()
+        self.steps.append((step, now - self.last, False))
+        self.last = now
+
+    def span(self, step: str, start: float, end: float):
+        self.steps.append((step, end - start, True))
+
+    async def timed(self, step: str, awaitable):
+        start = time.perf_counter()
+        self.running.append(step)
+        try:
+            return await awaitable
+        finally:
+            end = time.perf_counter()
+            self.running.remove(step)
+            self.span(step, start, end)
+            if self.enabled and self.reported:
+                # etapa em paralelo que terminou depois do cliente já estar pronto
+                print(f"⏱️  {step}: {(end - start) * 1000:.2f} ms")
+
+    def report(self, loop_name: str):
+        # mostra o perfil uma única vez, quando o cliente passa a aceitar comandos
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        total = time.perf_counter() - self.started
+
+        print(f"\n⏱️  Perfil de inicialização (event loop: {loop_name})")
+        for step, seconds, parallel in self.steps:
+            print(f"  {'  ↳ ' if parallel else ''}{step:<36}{seconds * 1000:>9.2f} ms")
+        for step in self.running:
+            print(f"    ↳ {step:<36}{'(em andamento)':>12}")
+        print(f"  {'Total até aceitar comandos':<36}{total * 1000:>9.2f} ms\n")
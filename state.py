@@ -1,52 +1,61 @@
-import asyncio
 import time
+import codec
 from logger import *
+from config import getConfig
 
 MAX_RTT_HISTORY = 50
 
-async def showPeers(arg, client):
-    peers = {}
+def percentile(sorted_values, p):
+    # percentil p (0-100) de uma lista já ordenada, por aproximação do vizinho mais próximo
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def reconnectInfo(client, peer_id):
+    # estado da reconexão do peer (tentativa atual ou tempo até recuperar a conexão), quando houver
+    reconnector = getattr(client, "reconnector", None)
+    return reconnector.describe(peer_id) if reconnector else None
 
+async def showPeers(arg, client):
     # verifica se há peers conhecidos
     if not hasattr(client, "peersConnected") or not client.peersConnected:
         print("Nenhuma informação de peers disponível.")
         return
-    target_ns = None
+    printPeers(peerRows(client, namespaceFilter(arg)), len(client.peersConnected))
+
+def namespaceFilter(arg):
     if arg and arg not in ["*", "all"]:
-        target_ns = arg.lstrip("#")
+        return arg.lstrip("#")
+    return None
 
-    found_any = False
-    
-    for peer_id, data in client.peersConnected.items():
-        # itera sobre os peers conhecidos para exibir informações (filtrando por namespace se necessário)
-        try:
-            name, namespace = peer_id.split("@", 1)
-            
-            if target_ns and namespace != target_ns:
-                continue
-                
-            if namespace not in peers:
-                # cria uma lista dedicada ao namespace para mostrar os peers conectados a ele depois
-                peers[namespace] = []
-            
-            # adiciona o peer à lista do seu namespace
-            peers[namespace].append((name, data["status"], data["address"], data["port"]))
-            found_any = True
-        except ValueError:
-            continue
+def peerRows(client, target_ns=None):
+    # linhas (peer_id, namespace, nome, status, endereço, porta, reconexão) dos peers da tabela;
+    # consulta o índice por namespace quando há filtro, sem percorrer a tabela inteira
+    return [
+        (data.peer_id, data.namespace, data.name, data.status, data.address, data.port, reconnectInfo(client, data.peer_id))
+        for data in client.peersConnected.select(namespace=target_ns)
+    ]
 
-    if not found_any:
+def printPeers(rows, total):
+    if not rows:
         # caso nenhum peer seja encontrado para o namespace solicitado
         print("Nenhum peer encontrado para a consulta.")
         return
 
+    # cria uma lista dedicada a cada namespace para mostrar os peers conectados a ele
+    peers = {}
+    for _, namespace, name, status, address, port, info in rows:
+        peers.setdefault(namespace, []).append((name, status, address, port, info))
+
     # exibe os peers organizados por namespace, com status e endereço   
-    print(f"\n--- Peers Conhecidos ({len(client.peersConnected)}) ---")
+    print(f"\n--- Peers Conhecidos ({total}) ---")
     for nspace, peer_list in peers.items():
         print(f"# {nspace}")
         for p in peer_list:
             status_icon = "🟢" if p[1] == "CONNECTED" else "🟡"
-            print(f"\t{status_icon} {p[0]} [{p[2]}:{p[3]}] ({p[1]})")
+            extra = f" - {p[4]}" if p[4] else ""
+            print(f"\t{status_icon} {p[0]} [{p[2]}:{p[3]}] ({p[1]}{extra})")
     print("-----------------------------------\n")
 
 
@@ -63,11 +72,133 @@ async def showConns(client):
     print(f"⬆️  Outbound (Iniciadas): {len(outbound)}")
     for o in outbound:
         print(f"\t- {o}")
+
+    # estatísticas das filas de saída (profundidade e bytes agrupados por escrita)
+    queues = [(data.peer_id, data.outq) for data in client.peersConnected.select(status="CONNECTED") if data.outq]
+    if queues:
+        print(f"📤 Filas de saída:")
+        for peer_id, outq in queues:
+            stats = outq.snapshot()
+            print(
+                f"\t- {peer_id} [{'binário' if outq.binary else 'json'}]: fila {stats['depth']} (máx {stats['max_depth']}) | "
+                f"{stats['frames']} frames em {stats['flushes']} escritas | "
+                f"{stats['avg_flush_bytes']:.0f} bytes/escrita (máx {stats['max_flush_bytes']})"
+            )
+
+    # estatísticas de compressão de payload (para ajustar o 'compress_threshold')
+    stats = codec.compression_stats
+    if stats["payloads"] or stats["skipped"]:
+        ratio = stats["raw_bytes"] / stats["compressed_bytes"] if stats["compressed_bytes"] else 0.0
+        attempts = stats["payloads"] + stats["skipped"]
+        print(
+            f"🗜️  Compressão: {stats['payloads']} payloads | {stats['raw_bytes']} -> {stats['compressed_bytes']} bytes "
+            f"(razão {ratio:.2f}x) | {stats['seconds'] * 1000:.2f}ms comprimindo "
+            f"({stats['seconds'] / attempts * 1e6:.0f}us/payload) | {stats['skipped']} sem ganho"
+        )
+
+    mesh_time = getattr(client, "mesh_formation_time", None)
+    if mesh_time is not None:
+        print(f"⏱️  Tempo de formação da malha: {mesh_time:.2f}s")
     print("-----------------------\n")
 
 
-async def updateRttTable(rtt_ms, peerPair, client):
-    # atualiza a tabela de RTT com nova medição entre dois peers
+class RttStats:
+    # estatísticas de RTT de um par de peers em tempo constante por amostra: anel com as últimas
+    # MAX_RTT_HISTORY medições (percentis, mínimo e máximo), RTT suavizado (EWMA) e variação (jitter) como no TCP (RFC 6298),
+    # e perda calculada a partir dos PINGs que ficaram sem PONG
+    __slots__ = ("samples", "index", "count", "srtt", "rttvar", "last_seen", "sent", "lost", "pending")
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+
+    def __init__(self):
+        self.samples = [0.0] * MAX_RTT_HISTORY
+        self.index = 0
+        self.count = 0
+        self.srtt = 0.0
+        self.rttvar = 0.0
+        self.last_seen = 0
+        self.sent = 0
+        self.lost = 0
+        self.pending = {}
+
+    def add(self, rtt_ms: float, now: float):
+        # sobrescreve a medição mais antiga do anel, sem deslocar a lista
+        self.samples[self.index] = rtt_ms
+        self.index = (self.index + 1) % MAX_RTT_HISTORY
+
+        if self.count == 0:
+            self.srtt = rtt_ms
+            self.rttvar = rtt_ms / 2
+        else:
+            self.rttvar += self.BETA * (abs(self.srtt - rtt_ms) - self.rttvar)
+            self.srtt += self.ALPHA * (rtt_ms - self.srtt)
+
+        self.count += 1
+        self.last_seen = now
+
+    def pingSent(self, msg_id: str, now: float, timeout: float):
+        # PINGs sem resposta dentro do timeout contam como perdidos
+        self.expire(now, timeout)
+        self.pending[msg_id] = now
+        self.sent += 1
+
+    def pingFailed(self, msg_id: str):
+        # PING que nem chegou a ser enviado não entra na conta de perda
+        if self.pending.pop(msg_id, None) is not None:
+            self.sent -= 1
+
+    def pongReceived(self, msg_id: str, now: float):
+        # retorna o RTT em ms do PING respondido, ou None se o PONG não corresponde a um PING pendente
+        start_time = self.pending.pop(msg_id, None)
+        if start_time is None:
+            return None
+        return max(0.0, (now - start_time) * 1000)
+
+    def expire(self, now: float, timeout: float):
+        for msg_id, start_time in list(self.pending.items()):
+            if now - start_time > timeout:
+                del self.pending[msg_id]
+                self.lost += 1
+
+    def lossRate(self):
+        # PINGs ainda em voo não contam nem como respondidos nem como perdidos
+        finished = self.sent - len(self.pending)
+        return self.lost / finished if finished > 0 else 0.0
+
+    def snapshot(self):
+        # cópia serializável (JSON) das estatísticas, para juntar as tabelas dos processos do nó
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def fromSnapshot(cls, data: dict):
+        stats = cls()
+        for slot in cls.__slots__:
+            setattr(stats, slot, data[slot])
+        return stats
+
+    def window(self):
+        # medições do anel em ordem crescente
+        return sorted(self.samples[:min(self.count, MAX_RTT_HISTORY)])
+
+    def percentiles(self, *ps):
+        window = self.window()
+        return [percentile(window, p) for p in ps]
+
+def rttKey(peer_a: str, peer_b: str):
+    return (peer_a, peer_b) if peer_a <= peer_b else (peer_b, peer_a)
+
+def rttStatsFor(client, peer_id: str) -> RttStats:
+    # estatísticas do par (este peer, peer_id), criadas na primeira medição ou PING
+    key = rttKey(f"{client.name}@{client.namespace}", peer_id)
+    stats = client.rtt_table.get(key)
+    if stats is None:
+        stats = client.rtt_table[key] = RttStats()
+    return stats
+
+def updateRttTable(rtt_ms, peerPair, client):
+    # atualiza a tabela de RTT com nova medição entre dois peers; tudo roda no event loop,
+    # então a atualização (O(1)) não precisa de lock
     if not isinstance(peerPair, (list, tuple)) or len(peerPair) != 2:
         loggerWarning(f"RTT ignorado: Formato de par inválido: {peerPair}")
         return False
@@ -78,53 +209,19 @@ async def updateRttTable(rtt_ms, peerPair, client):
         loggerWarning("RTT ignorado: IDs de peer vazios.")
         return False
 
-    key = tuple(sorted([a, b]))
-
-    # adquire o lock para evitar condições de corrida na tabela de RTT (conflitos de escrita)
-    lock = getattr(client, "rtt_lock", None)
-    if lock is None:
-        client.rtt_lock = asyncio.Lock()
-        lock = client.rtt_lock
-
-    async with lock:
-        table = getattr(client, "rtt_table", None)
-        if table is None:
-            # inicializa a tabela de RTT se ainda não existir
-            client.rtt_table = {}
-            table = client.rtt_table
-
-        if key not in table:
-            table[key] = {
-                "history": [],
-                "avg": 0.0,
-                "min": 0.0,
-                "max": 0.0,
-                "last_seen": 0,
-                "count": 0
-            }
-        
-        entry = table[key]
-        now = time.time()
+    try:
+        val = float(rtt_ms)
+        if val < 0: val = 0.0
+    except ValueError:
+        loggerError(f"Valor de RTT inválido: {rtt_ms}")
+        return False
 
-        try:
-            val = float(rtt_ms)
-            if val < 0: val = 0.0
-        except ValueError:
-            loggerError(f"Valor de RTT inválido: {rtt_ms}")
-            return False
+    key = rttKey(a, b)
+    stats = client.rtt_table.get(key)
+    if stats is None:
+        stats = client.rtt_table[key] = RttStats()
 
-        entry["history"].append(val)
-        
-        if len(entry["history"]) > MAX_RTT_HISTORY:
-            # mantém apenas as últimas N medições na história para evitar crescimento indefinido
-            entry["history"].pop(0)
-
-        # atualiza estatísticas básicas para o par de peers
-        entry["count"] = len(entry["history"])
-        entry["avg"] = sum(entry["history"]) / entry["count"]
-        entry["min"] = min(entry["history"])
-        entry["max"] = max(entry["history"])
-        entry["last_seen"] = now
+    stats.add(val, time.time())
     return True
 
 
@@ -137,31 +234,42 @@ async def showRtt(client):
         print("Certifique-se de estar conectado a outros peers e aguarde alguns segundos.\n")
         return
 
-    lock = getattr(client, "rtt_lock", asyncio.Lock())
-    async with lock:
-        snapshot = {k: v.copy() for k, v in table.items()}
+    timeout = getConfig().timeout_timer
+    now = time.time()
 
-    if not snapshot:
-        print("\n🚫 Tabela de RTT vazia.")
-        return
-
-    print(f"\n📊 Estatísticas de Latência (RTT) - {len(snapshot)} conexões")
-    print(f"{'PAR DE PEERS':<50} | {'MÉDIA':<10} | {'MIN':<10} | {'MAX':<10} | {'ÚLTIMO'}")
-    print("-" * 110)
+    print(f"\n📊 Estatísticas de Latência (RTT) - {len(table)} conexões")
+    print(
+        f"{'PAR DE PEERS':<40} | {'SRTT':<9} | {'P50':<9} | {'P95':<9} | {'P99':<9} | "
+        f"{'MIN':<9} | {'MAX':<9} | {'JITTER':<9} | {'PERDA':<6} | {'ÚLTIMO'}"
+    )
+    print("-" * 140)
 
-    for key, v in snapshot.items():
+    for key, stats in list(table.items()):
         peer_a, peer_b = key
         pair_str = f"{peer_a} <-> {peer_b}"
         
-        if len(pair_str) > 48:
-            pair_str = pair_str[:45] + "..."
+        if len(pair_str) > 38:
+            pair_str = pair_str[:35] + "..."
+
+        stats.expire(now, timeout)
+        if stats.count == 0:
+            print(f"{pair_str:<40} | {'-':<9} | {'-':<9} | {'-':<9} | {'-':<9} | {'-':<9} | {'-':<9} | {'-':<9} | {stats.lossRate():<6.0%} | -")
+            continue
 
-        avg = f"{v['avg']:.2f}ms"
-        mn = f"{v['min']:.2f}ms"
-        mx = f"{v['max']:.2f}ms"
+        # percentis, mínimo e máximo saem da mesma janela (as últimas MAX_RTT_HISTORY medições)
+        window = stats.window()
+        p50, p95, p99 = (f"{percentile(window, p):.2f}ms" for p in (50, 95, 99))
+        srtt = f"{stats.srtt:.2f}ms"
+        mn = f"{window[0]:.2f}ms"
+        mx = f"{window[-1]:.2f}ms"
+        jitter = f"{stats.rttvar:.2f}ms"
+        loss = f"{stats.lossRate():.0%}"
         
-        last_seen = time.strftime("%H:%M:%S", time.localtime(v['last_seen']))
+        last_seen = time.strftime("%H:%M:%S", time.localtime(stats.last_seen))
         
-        print(f"{pair_str:<50} | {avg:<10} | {mn:<10} | {mx:<10} | {last_seen}")
+        print(
+            f"{pair_str:<40} | {srtt:<9} | {p50:<9} | {p95:<9} | {p99:<9} | "
+            f"{mn:<9} | {mx:<9} | {jitter:<9} | {loss:<6} | {last_seen}"
+        )
     
-    print("-" * 110 + "\n")
\ No newline at end of file
+    print("-" * 140 + "\n")